@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.services.payment_service import PaymentService
+
+router = APIRouter()
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit and miss counters of this process's response cache"""
+    return PaymentService.response_cache.stats()
@@ -0,0 +1,26 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from app.core.config import settings
+from app.core.startup import Startup
+from app.db.mongodb import MongoDB
+
+router = APIRouter()
+
+@router.get("/health/live", include_in_schema=False)
+async def live():
+    """The process is up and serving; restart it only when this fails"""
+    return {"status": "ok"}
+
+@router.get("/health/ready", include_in_schema=False)
+async def ready():
+    """Send traffic here once startup has finished and MongoDB answers"""
+    if not Startup.is_ready():
+        return ORJSONResponse({"status": "starting", **Startup.timings()}, status_code=503)
+    try:
+        await asyncio.wait_for(MongoDB.db.command("ping"), settings.config.health.ready_ping_timeout_seconds)
+    except Exception as e:
+        return ORJSONResponse({"status": "unavailable", "detail": f"MongoDB ping failed: {e}"}, status_code=503)
+    return {"status": "ready", **Startup.timings()}
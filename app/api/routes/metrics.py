@@ -0,0 +1,18 @@
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+router = APIRouter()
+
+# Under app.server every worker writes its metrics to files, and whichever worker is scraped reports them all
+if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+else:
+    registry = REGISTRY
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition of every worker's metrics, or this process's when run alone"""
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,29 +1,70 @@
-import base64
-from typing import Optional
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+import json
+from typing import Any, AsyncIterator, List, Optional, Union
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
 
-from app.services.payment_service import PaymentService
-from app.models.schemas.pagination_payment_response import PaginatedPaymentResponse
+from app.core.config import settings
+from app.core.logging import Logger
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
+from app.services.payment_service import ExportFormat, PaymentService
+from app.models.schemas.bulk_payment import BulkItemStatus, BulkPaymentResponse
+from app.models.schemas.pagination_payment_response import PaginatedPartialPaymentResponse, PaginatedPaymentResponse
+from app.models.schemas.partial_payment import PartialPayment
+from app.models.schemas.payment_summary import PaymentSummaryResponse
 from app.models.payment import Payment
+from app.utils.payee_search import SearchMode
+from app.utils.response_cache import CachedResponse
 
 router = APIRouter()
-# logger = Logger.get_logger(__name__)
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+logger = Logger.get_logger(__name__)
+
+def cached_json_response(cached: CachedResponse, if_none_match: Optional[str]) -> Response:
+    if PaymentService.etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(content=cached.body, media_type="application/json", headers={"ETag": cached.etag})
+
+FIELDS_DESCRIPTION = "Comma-separated payment fields to return, e.g. payee_first_name,payee_payment_status,total_due; _id is always included"
+
+def selected_fields(fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return PaymentService.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/payments")
+# The body is rendered by PaymentService; the model only documents it
+@router.get("/payments", response_model=Union[PaginatedPaymentResponse, PaginatedPartialPaymentResponse])
 async def get_payments(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
     payee_payment_status: Optional[str] = Query(None),
     search_payee_name: Optional[str] = Query(None),
+    search_mode: SearchMode = Query(SearchMode.SUBSTRING),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page; takes precedence over page"),
+    approximate_total: bool = Query(False, description="Use a fast estimated total when no filter is applied; it includes rows removed by a CSV re-sync"),
+    due_from: Optional[str] = Query(None, description="Only payments due at or after this date (ISO 8601)"),
+    due_to: Optional[str] = Query(None, description="Only payments due before this date (ISO 8601)"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
     payment_service: PaymentService = Depends()
 ):
+    selected = selected_fields(fields)
     try:
-        return await payment_service.get_payments(
+        cached = await payment_service.get_payments_response(
             page=page,
             page_size=page_size,
             payee_payment_status = payee_payment_status,
-            search_payee_name = search_payee_name
+            search_payee_name = search_payee_name,
+            cursor = cursor,
+            approximate_total = approximate_total,
+            search_mode = search_mode,
+            due_from = due_from,
+            due_to = due_to,
+            fields = selected
         )
+        return cached_json_response(cached, if_none_match)
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -31,18 +72,194 @@ async def get_payments(
         # logger.error(f"Error retrieving payments: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.get("/payment/{payment_id}")
-async def get_payment_by_id(payment_id: str, payment_service: PaymentService = Depends()):
+@router.get("/payments/summary", response_model=PaymentSummaryResponse)
+async def get_payments_summary(
+    payee_payment_status: Optional[str] = Query(None),
+    currency: Optional[str] = Query(None),
+    payment_service: PaymentService = Depends()
+):
+    """Payment counts, due_amount and total_due sums per status, currency and due month"""
+    try:
+        return await payment_service.get_summary(payee_payment_status, currency)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/payments/export")
+async def export_payments(
+    format: ExportFormat = Query(ExportFormat.CSV),
+    gzip: bool = Query(False),
+    payee_payment_status: Optional[str] = Query(None),
+    search_payee_name: Optional[str] = Query(None),
+    search_mode: SearchMode = Query(SearchMode.SUBSTRING),
+    due_from: Optional[str] = Query(None, description="Only payments due at or after this date (ISO 8601)"),
+    due_to: Optional[str] = Query(None, description="Only payments due before this date (ISO 8601)"),
+    payment_service: PaymentService = Depends()
+):
+    filename = f"payments.{format.value}" + (".gz" if gzip else "")
+    if gzip:
+        media_type = "application/gzip"
+    else:
+        media_type = "text/csv" if format == ExportFormat.CSV else "application/x-ndjson"
+    try:
+        chunks = payment_service.export_payments(
+            export_format=format,
+            compress=gzip,
+            search_payee_name=search_payee_name,
+            payee_payment_status=payee_payment_status,
+            search_mode=search_mode,
+            due_from=due_from,
+            due_to=due_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@router.get("/payments/stream")
+async def stream_payments(
+    payee_payment_status: Optional[str] = Query(None),
+    search_payee_name: Optional[str] = Query(None),
+    search_mode: SearchMode = Query(SearchMode.SUBSTRING),
+    due_from: Optional[str] = Query(None, description="Only payments due at or after this date (ISO 8601)"),
+    due_to: Optional[str] = Query(None, description="Only payments due before this date (ISO 8601)"),
+    last_event_id: Optional[str] = Header(None, description="Resume after this event; sent by EventSource on reconnect"),
+    payment_service: PaymentService = Depends()
+):
+    """Server-sent events for created, updated, status_changed and deleted payments matching the filters.
+
+    A `reset` event means events were missed and the list should be fetched again.
+    """
+    # Reserved before the response starts so concurrent connects cannot all pass the limit
+    subscription = PaymentService.event_hub.subscribe()
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "5"})
+    try:
+        events = payment_service.stream_events(
+            subscription,
+            last_event_id=last_event_id,
+            search_payee_name=search_payee_name,
+            payee_payment_status=payee_payment_status,
+            search_mode=search_mode,
+            due_from=due_from,
+            due_to=due_to
+        )
+    except ValueError as e:
+        subscription.release()
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Proxies must pass each event through as soon as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # The stream releases the slot when it ends; this covers a client gone before it started
+        background=BackgroundTask(subscription.release)
+    )
+
+async def limited_body(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    """The request body as it streams in, failing with 413 once it passes max_bytes"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {max_bytes} bytes")
+        yield chunk
+
+
+async def read_bulk_items(request: Request) -> AsyncIterator[Any]:
+    """Yield bulk items from a JSON array body or, for NDJSON, line by line as the body streams in"""
+    bulk_config = settings.config.bulk
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > bulk_config.max_body_bytes:
+        raise HTTPException(status_code=413, detail=f"Body exceeds {bulk_config.max_body_bytes} bytes")
+    # Chunked bodies carry no Content-Length, so the limit is also enforced while reading
+    body = limited_body(request, bulk_config.max_body_bytes)
+
+    if request.headers.get("content-type", "").split(";")[0].strip() not in NDJSON_MEDIA_TYPES:
+        try:
+            items = json.loads(b"".join([chunk async for chunk in body]))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of operations")
+        for item in items:
+            yield item
+        return
+
+    buffer = b""
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(line)
+    if buffer.strip():
+        yield parse_ndjson_line(buffer)
+
+
+def parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+@router.post("/payments/bulk", response_model=BulkPaymentResponse, response_model_exclude_none=True)
+async def bulk_payments(request: Request, payment_service: PaymentService = Depends()):
+    """Apply create/update/delete operations given as a JSON array or as NDJSON, one per line"""
+    bulk_config = settings.config.bulk
+    response = BulkPaymentResponse()
+    results = []
+    chunk = []
+    offset = 0
+    try:
+        async for item in read_bulk_items(request):
+            if offset + len(chunk) >= bulk_config.max_items:
+                response.truncated = True
+                break
+            chunk.append(item)
+            if len(chunk) >= bulk_config.chunk_size:
+                results.extend(await payment_service.bulk_apply(chunk, offset))
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            results.extend(await payment_service.bulk_apply(chunk, offset))
+    except HTTPException:
+        raise
+    except Exception as e:
+        # logger.error(f"Error applying bulk operations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    counters = {
+        BulkItemStatus.CREATED: "created",
+        BulkItemStatus.UPDATED: "updated",
+        BulkItemStatus.DELETED: "deleted",
+    }
+    for result in results:
+        counter = counters.get(result.status, "failed")
+        setattr(response, counter, getattr(response, counter) + 1)
+    response.items = results
+    return response
+
+@router.get("/payment/{payment_id}", response_model=Union[Payment, PartialPayment])
+async def get_payment_by_id(
+    payment_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    payment_service: PaymentService = Depends()
+):
+    selected = selected_fields(fields)
 
     # logger.info(f"Received request to get payment with id={payment_id}")
     try:
-        return await payment_service.get_payment(payment_id)
+        cached = await payment_service.get_payment_response(payment_id, selected)
+        return cached_json_response(cached, if_none_match)
     except ValueError as e:
-        print(e)
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(e)
-        # logger.error(f"Error updating payment: {str(e)}")
+        logger.error(f"Error retrieving payment {payment_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
 @router.put("/payment/{payment_id}")
@@ -50,6 +267,8 @@ async def update_payment(payment_id: str, update_data: dict, payment_service: Pa
     # logger.info(f"Received request to update payment with id={payment_id}")
     try:
         return await payment_service.update_payment(payment_id, update_data)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -76,24 +295,35 @@ async def create_payment(payment_data: Payment, payment_service: PaymentService
         # logger.error(f"Error creating payment: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def read_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    # UploadFile.read runs in a worker thread, so the event loop never blocks on disk
+    chunk_bytes = settings.config.evidence.stream_chunk_bytes
+    while chunk := await file.read(chunk_bytes):
+        yield chunk
+
 @router.post("/payment/{payment_id}/upload_evidence", response_model=str)
 async def upload_evidence(payment_id: str, file: UploadFile = File(...), payment_service: PaymentService = Depends()):
     # logger.info(f"Received request to upload evidence for payment with id={payment_id}")
     try:
-        
-        file_data = base64.b64encode(file.file.read())
-        file_id = await payment_service.upload_evidence(payment_id, file_data, file.filename)
+        file_id = await payment_service.upload_evidence(payment_id, read_upload(file), file.filename)
         return file_id
     except Exception as e:
         # logger.error(f"Error uploading evidence: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/payment/download_evidence/{file_id}", response_model=bytes)
-async def download_evidence(file_id: str, payment_service: PaymentService = Depends()):
+async def download_evidence(
+    file_id: str,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    payment_service: PaymentService = Depends()
+):
     # logger.info(f"Received request to download evidence with file_id={file_id}")
     try:
-        file_data = await payment_service.download_evidence(file_id)
+        file_data = await payment_service.download_evidence(file_id, range, if_none_match)
         return file_data
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         # logger.error(f"Error downloading evidence: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
@@ -0,0 +1,225 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import orjson
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import AdmissionConfig
+from app.core.metrics import LATENCY_BUCKETS
+
+EXEMPT = "exempt"
+
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for a slot", ["priority_class"], multiprocess_mode="livesum")
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests holding a slot", ["priority_class"], multiprocess_mode="livesum")
+ADMISSION_SHED = Counter("admission_shed_total", "Requests answered 503 instead of being queued or run", ["priority_class", "reason"])
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time admitted requests spent waiting for a slot",
+    ["priority_class"],
+    buckets=(0.0005, *LATENCY_BUCKETS)
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class PriorityClass:
+    def __init__(self, name: str, priority: int, max_queue: int, max_wait: float, writes: bool, max_concurrency: Optional[int]):
+        self.name = name
+        self.priority = priority
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.writes = writes
+        self.max_concurrency = max_concurrency
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = 0
+        # Moving average of how long this class holds a slot
+        self.hold_time = 0.01
+        self.queue_depth = ADMISSION_QUEUE_DEPTH.labels(name)
+        self.in_flight = ADMISSION_IN_FLIGHT.labels(name)
+        self.wait_time = ADMISSION_WAIT.labels(name)
+
+
+class AdmissionController:
+    """Concurrency slots handed out by priority class.
+
+    At most `max_concurrency` requests run at once, and read classes leave
+    `reserved_writes` of those to write classes. A request that cannot start waits in its
+    class's bounded queue; freed slots go to the waiting class with the lowest priority
+    number that is allowed to use them. Requests are shed with Overloaded rather than
+    queued when the queue is full or the expected wait is over the class's budget, and
+    waiters are shed when their budget runs out.
+    """
+
+    def __init__(self, config: AdmissionConfig):
+        self.capacity = config.max_concurrency
+        self.reserved_writes = min(config.reserved_writes, config.max_concurrency - 1)
+        self.classes = {
+            name: PriorityClass(name, c.priority, c.max_queue, c.max_wait_ms / 1000, c.writes, c.max_concurrency)
+            for name, c in config.classes.items()
+        }
+        self.by_priority = sorted(self.classes.values(), key=lambda c: c.priority)
+        self.active = 0
+        self.active_reads = 0
+
+    def can_start(self, priority_class: PriorityClass) -> bool:
+        if self.active >= self.capacity:
+            return False
+        if not priority_class.writes and self.active_reads >= self.capacity - self.reserved_writes:
+            return False
+        return priority_class.max_concurrency is None or priority_class.active < priority_class.max_concurrency
+
+    def expected_wait(self, priority_class: PriorityClass) -> float:
+        """Time until as many slots it may use have freed up as there are requests ahead of it.
+
+        Slots free up at the rate the requests holding them finish, each class at its own
+        hold time, so a few long exports barely slow the estimate for a lookup.
+        """
+        ahead = sum(len(c.waiters) for c in self.by_priority if c.priority <= priority_class.priority)
+        if priority_class.max_concurrency is not None and priority_class.active >= priority_class.max_concurrency:
+            # Held back by its own cap: only its own requests finishing let it start
+            holders = [priority_class]
+        elif not priority_class.writes and self.active_reads >= self.capacity - self.reserved_writes:
+            holders = [c for c in self.by_priority if not c.writes]
+        else:
+            holders = self.by_priority
+        rate = sum(c.active / c.hold_time for c in holders)
+        if not rate:
+            return (ahead + 1) * priority_class.hold_time
+        return (ahead + 1) / rate
+
+    def start(self, priority_class: PriorityClass) -> None:
+        self.active += 1
+        if not priority_class.writes:
+            self.active_reads += 1
+        priority_class.active += 1
+        priority_class.in_flight.inc()
+
+    async def acquire(self, priority_class: PriorityClass) -> None:
+        if not priority_class.waiters and self.can_start(priority_class):
+            self.start(priority_class)
+            priority_class.wait_time.observe(0)
+            return
+        if len(priority_class.waiters) >= priority_class.max_queue:
+            raise Overloaded("queue_full")
+        if self.expected_wait(priority_class) > priority_class.max_wait:
+            raise Overloaded("latency_budget")
+
+        waiter = asyncio.get_running_loop().create_future()
+        priority_class.waiters.append(waiter)
+        priority_class.queue_depth.inc()
+        started = time.perf_counter()
+        try:
+            # wait() rather than wait_for(): a slot granted just as the budget runs out is not lost
+            await asyncio.wait((waiter,), timeout=priority_class.max_wait)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release(priority_class)
+            else:
+                self.abandon(priority_class, waiter)
+            raise
+        if not waiter.done():
+            self.abandon(priority_class, waiter)
+            raise Overloaded("wait_timeout")
+        priority_class.wait_time.observe(time.perf_counter() - started)
+
+    def abandon(self, priority_class: PriorityClass, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        priority_class.waiters.remove(waiter)
+        priority_class.queue_depth.dec()
+
+    def release(self, priority_class: PriorityClass, held: Optional[float] = None) -> None:
+        self.active -= 1
+        if not priority_class.writes:
+            self.active_reads -= 1
+        priority_class.active -= 1
+        priority_class.in_flight.dec()
+        if held is not None:
+            priority_class.hold_time += 0.05 * (held - priority_class.hold_time)
+        for waiting_class in self.by_priority:
+            while waiting_class.waiters and self.can_start(waiting_class):
+                waiter = waiting_class.waiters.popleft()
+                waiting_class.queue_depth.dec()
+                self.start(waiting_class)
+                waiter.set_result(None)
+
+
+class AdmissionMiddleware:
+    """Runs every request under an AdmissionController slot and answers 503 when it is shed.
+
+    Requests are classified by route template ("GET /api/v1/payment/{payment_id}") through
+    admission.routes; other reads and writes fall back to the default classes, and paths
+    that match no route pass straight through. Plain ASGI so the slot is held until the
+    last byte of a streamed response has been sent.
+    """
+
+    def __init__(self, app, routes: list, config: AdmissionConfig):
+        self.app = app
+        self.config = config
+        self.controller = AdmissionController(config)
+        # The application's route list; read on the first request, once every router is included
+        self.routes = routes
+        self.matchers: Optional[List[Tuple]] = None
+        self.retry_after = str(config.retry_after_seconds).encode()
+
+    def build_matchers(self) -> List[Tuple]:
+        matchers = []
+        for route in self.routes:
+            path_regex = getattr(route, "path_regex", None)
+            if path_regex is None:
+                continue
+            classes = {}
+            for method in getattr(route, "methods", None) or ():
+                default = self.config.default_read_class if method in ("GET", "HEAD") else self.config.default_write_class
+                name = self.config.routes.get(f"{method} {route.path}", default)
+                classes[method] = None if name == EXEMPT else self.controller.classes[name]
+            matchers.append((path_regex, classes))
+        return matchers
+
+    def classify(self, method: str, path: str) -> Optional[PriorityClass]:
+        if self.matchers is None:
+            self.matchers = self.build_matchers()
+        for path_regex, classes in self.matchers:
+            if path_regex.match(path) and method in classes:
+                return classes[method]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority_class = self.classify(scope["method"], scope["path"])
+        if priority_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(priority_class)
+        except Overloaded as e:
+            ADMISSION_SHED.labels(priority_class.name, e.reason).inc()
+            await self.shed(send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority_class, time.perf_counter() - started)
+
+    async def shed(self, send) -> None:
+        body = orjson.dumps({"detail": "Server is busy, retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
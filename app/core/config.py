@@ -1,16 +1,316 @@
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 from pydantic_settings import BaseSettings
-from typing import List, Dict, Any
-import yaml
+from typing import List, Dict, Any, Optional
+import logging
 import os
+import threading
+import time
+import yaml
+
+
+class ConfigSection(BaseModel):
+    # Snapshots are shared by every request, so they must never be mutated in place
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+
+class AppConfig(ConfigSection):
+    title: str
+    description: str
+
+
+class DataConfig(ConfigSection):
+    file_path: str
+    # Lease on the seed lock; `python -m app.seed` renews it while a load runs
+    seed_lock_ttl_seconds: float = 300.0
+
+
+class ServerConfig(ConfigSection):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # Single process with code reloading, for development only
+    reload: bool = False
+    # Worker processes started by `python -m app.server`; 0 means one per CPU
+    workers: int = 0
+    # Time a stopping worker gets to finish its in-flight requests
+    graceful_timeout_seconds: float = 30.0
+    # Time a new worker gets to become ready during a rolling restart
+    ready_timeout_seconds: float = 60.0
+    # Recycle a worker after this many requests plus up to max_requests_jitter, 0 for never
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    # Recycle a worker whose resident memory grows past this, 0 for never
+    max_memory_mb: int = 0
+    origins: List[str] = ["*"]
+
+
+class MongoDBCollectionsConfig(ConfigSection):
+    payments: str = "payments"
+    upload_evidence: str = "upload_evidence"
+    locks: str = "locks"
+    # Evidence records, and the deduplicated blobs they point at
+    evidence: str = "evidence"
+    evidence_blobs: str = "evidence_blobs"
+    response_cache: str = "response_cache"
+    # Counters bumped after bulk changes so every worker drops its cached responses
+    cache_generations: str = "cache_generations"
+    # Per status, currency and due month rollup behind GET /payments/summary
+    payment_summary: str = "payment_summary"
+    # Progress of schema migrations (app/db/migrations)
+    migrations: str = "migrations"
+    # GridFS bucket name for evidence files (<name>.files / <name>.chunks)
+    evidence_bucket: str = "evidence"
+
+
+class MongoDBIndexesConfig(ConfigSection):
+    reconcile_on_startup: bool = True
+    # Explain the canonical list queries at startup and refuse to start on a COLLSCAN
+    verify_on_startup: bool = False
+    # Drop indexes that are not declared in app/db/indexes.py
+    prune: bool = False
+
+
+class MongoDBConfig(ConfigSection):
+    uri: str
+    database: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    timeout_ms: int = 5000
+    collections: MongoDBCollectionsConfig = MongoDBCollectionsConfig()
+    indexes: MongoDBIndexesConfig = MongoDBIndexesConfig()
+
+
+class PaginationConfig(ConfigSection):
+    # How long an exact list total is reused for the same filter
+    total_count_ttl_seconds: float = 5.0
+    total_count_cache_size: int = 1024
+
+
+class StatusRefreshJobConfig(ConfigSection):
+    enabled: bool = True
+    run_on_startup: bool = True
+    # Delay after UTC midnight before the daily pass, so clocks that drift slightly still agree
+    offset_seconds: float = 5.0
+    lock_ttl_seconds: float = 300.0
+
+
+class SummaryRebuildJobConfig(ConfigSection):
+    # Build the rollup at startup when it is empty and payments exist
+    build_if_empty: bool = True
+    lock_ttl_seconds: float = 300.0
+
+
+class JobsConfig(ConfigSection):
+    status_refresh: StatusRefreshJobConfig = StatusRefreshJobConfig()
+    summary_rebuild: SummaryRebuildJobConfig = SummaryRebuildJobConfig()
+
+
+class IngestConfig(ConfigSection):
+    # Rows parsed per chunk; memory is roughly chunk_size x (max_inflight_chunks + 2) rows
+    chunk_size: int = 50000
+    # Parsed chunks allowed to wait for insertion while the next one is parsed
+    max_inflight_chunks: int = 2
+    insert_batch_size: int = 5000
+    # Defaults to "<csv file>.rejects.csv"
+    reject_file: Optional[str] = None
+    # Columns that identify the same payment across files, for delta sync
+    natural_key_fields: List[str] = ["payee_email", "payee_added_date_utc"]
+
+
+class BulkConfig(ConfigSection):
+    # Items accepted per request; the rest of a streamed body is not read
+    max_items: int = 10000
+    max_body_bytes: int = 50 * 1024 * 1024
+    # Items validated and written per bulk_write
+    chunk_size: int = 1000
+
+
+class ExportConfig(ConfigSection):
+    # Documents per getMore from the export cursor
+    batch_size: int = 1000
+    # Rows buffered before a chunk is sent to the client
+    flush_rows: int = 500
+    gzip_level: int = 6
+
+
+class EvidenceConfig(ConfigSection):
+    # Bytes read per step when streaming uploads in and downloads out
+    stream_chunk_bytes: int = 1024 * 1024
+    # "gridfs" or "local"; local disk is only shared by processes on the same host
+    backend: str = "gridfs"
+    local_path: str = "evidence_store"
+
+
+class CacheConfig(ConfigSection):
+    enabled: bool = True
+    # Per-process tier; other workers see a write once their copy expires
+    ttl_seconds: float = 5.0
+    max_entries: int = 10000
+    # List pages past this one, and cursor pages, are not cached
+    list_max_page: int = 3
+    # "none" or "mongodb"
+    shared_backend: str = "none"
+    shared_ttl_seconds: float = 30.0
+    # Workers look this often for bulk changes made by other processes (CSV loads, status refresh)
+    generation_check_seconds: float = 1.0
+
+
+class UpdateCoalescingConfig(ConfigSection):
+    # Opt in: merge PUT /payment/{id} updates arriving close together into one bulk_write
+    enabled: bool = False
+    # Longest an update waits for others to join its batch
+    window_ms: float = 2.0
+    # Payments per batch; a full batch is written without waiting for the window
+    max_batch: int = 500
+
+
+class EventsConfig(ConfigSection):
+    # "change_stream": a MongoDB change stream (replica set only) feeds every worker, falling
+    # back to local without one; "local": each worker's write paths feed its own streams, so
+    # with several workers a stream only sees the writes of the worker it is connected to
+    source: str = "change_stream"
+    # Events kept for Last-Event-ID resume and for streams that fall behind
+    buffer_size: int = 5000
+    max_subscribers: int = 1000
+    heartbeat_seconds: float = 15.0
+    # Reconnect delay suggested to clients
+    retry_ms: int = 3000
+    # Ask the change stream for pre-images (MongoDB 6.0+ with changeStreamPreAndPostImages on)
+    change_stream_pre_images: bool = False
+
+
+class MetricsConfig(ConfigSection):
+    enabled: bool = True
+    # MongoDB command and connection pool listeners (app/db/monitoring.py)
+    mongodb_commands: bool = True
+    # Commands slower than this are logged with the shape of their filter
+    slow_query_ms: float = 100.0
+
+
+class AdmissionClassConfig(ConfigSection):
+    # Lower goes first when a slot frees up
+    priority: int
+    # Requests allowed to wait; beyond this they are shed at once
+    max_queue: int = 100
+    # Queueing budget: shed when the expected wait is longer, and when a waiter runs out of it
+    max_wait_ms: float = 250.0
+    # Writes may also use the slots reserved for them
+    writes: bool = False
+    # Optional cap on this class alone, e.g. exports holding a connection for seconds
+    max_concurrency: Optional[int] = None
+
+
+class AdmissionConfig(ConfigSection):
+    enabled: bool = True
+    # Requests running at once per process; below mongodb.max_pool_size so background jobs still get connections
+    max_concurrency: int = 80
+    # Slots only write classes may use, so a read burst cannot starve writes
+    reserved_writes: int = 16
+    retry_after_seconds: int = 1
+    classes: Dict[str, AdmissionClassConfig] = {
+        "lookup": AdmissionClassConfig(priority=0, max_queue=200, max_wait_ms=100),
+        "write": AdmissionClassConfig(priority=1, max_queue=100, max_wait_ms=500, writes=True),
+        "list": AdmissionClassConfig(priority=2, max_queue=100, max_wait_ms=250),
+        "export": AdmissionClassConfig(priority=3, max_queue=4, max_wait_ms=1000, max_concurrency=4),
+    }
+    # "METHOD /route/template" -> class, or "exempt" to bypass admission; other routes use the defaults
+    routes: Dict[str, str] = {}
+    default_read_class: str = "list"
+    default_write_class: str = "write"
+
+
+class LogQueueConfig(ConfigSection):
+    # Handlers run on a listener thread instead of on the event loop
+    enabled: bool = True
+    # Records waiting for the listener; beyond this they are dropped and counted, never waited on
+    max_size: int = 10000
+    # The listener thread handles what has queued up at most this often
+    flush_interval_ms: float = 5.0
+    # Fraction of records below WARNING kept, by logger name (children included), for hot paths
+    sample_rates: Dict[str, float] = {}
+    request_id_header: str = "X-Request-ID"
+
+
+class HealthConfig(ConfigSection):
+    # /health/ready fails when MongoDB does not answer a ping within this time
+    ready_ping_timeout_seconds: float = 2.0
+
+
+class MigrationsConfig(ConfigSection):
+    # Usually applied with `python -m app.db.migrations` before a deploy
+    run_on_startup: bool = False
+    batch_size: int = 1000
+    lock_ttl_seconds: float = 300.0
+
+
+class ConfigSnapshot(ConfigSection):
+    app: AppConfig
+    data: DataConfig
+    server: ServerConfig = ServerConfig()
+    mongodb: MongoDBConfig
+    pagination: PaginationConfig = PaginationConfig()
+    jobs: JobsConfig = JobsConfig()
+    ingest: IngestConfig = IngestConfig()
+    bulk: BulkConfig = BulkConfig()
+    export: ExportConfig = ExportConfig()
+    evidence: EvidenceConfig = EvidenceConfig()
+    cache: CacheConfig = CacheConfig()
+    update_coalescing: UpdateCoalescingConfig = UpdateCoalescingConfig()
+    events: EventsConfig = EventsConfig()
+    migrations: MigrationsConfig = MigrationsConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    health: HealthConfig = HealthConfig()
+    log_queue: LogQueueConfig = LogQueueConfig()
+    admission: AdmissionConfig = AdmissionConfig()
+    logging: Dict[str, Any]
+
 
 class Settings(BaseSettings):
     # Load configuration from YAML file
     config_file: str = os.getenv("CONFIG_FILE", "app/config/default.yaml")
-    
+    # Re-read the YAML file when its mtime changes (checked at most every interval)
+    config_reload: bool = False
+    config_reload_interval: float = 1.0
+
+    _snapshot: Optional[ConfigSnapshot] = PrivateAttr(default=None)
+    _mtime: Optional[float] = PrivateAttr(default=None)
+    _checked_at: float = PrivateAttr(default=0.0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self.reload_config(force=True)
+
     @property
-    def config(self) -> Dict[str, Any]:
-        with open(self.config_file, 'r') as f:
-            return yaml.safe_load(f)
-    
+    def config(self) -> ConfigSnapshot:
+        if self.config_reload:
+            now = time.monotonic()
+            if now - self._checked_at >= self.config_reload_interval:
+                self._checked_at = now
+                self.reload_config()
+        return self._snapshot
+
+    def reload_config(self, force: bool = False) -> ConfigSnapshot:
+        with self._lock:
+            mtime = None
+            try:
+                # Inside the try: the file can be missing for a moment while it is replaced
+                mtime = os.stat(self.config_file).st_mtime
+                if not force and mtime == self._mtime:
+                    return self._snapshot
+                with open(self.config_file, 'r') as f:
+                    snapshot = ConfigSnapshot.model_validate(yaml.safe_load(f))
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                # Keep serving the last good snapshot until the file is fixed
+                logging.getLogger(__name__).error(
+                    f"Failed to reload config from '{self.config_file}', keeping previous snapshot: {e}"
+                )
+                if mtime is not None:
+                    self._mtime = mtime
+                return self._snapshot
+            self._snapshot = snapshot
+            self._mtime = mtime
+            return snapshot
+
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,11 +1,273 @@
+import atexit
+import copy
 import logging.config
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+from typing import Deque, Dict, List, Optional
+
+import orjson
+from prometheus_client import Counter
+
 from app.core.config import settings
 
+# app/core/__init__ star-imports this module; without a list the stdlib `logging` it imports
+# would shadow app.core.logging and the dotted path in the logging config would not resolve
+__all__ = ["Logger", "JsonFormatter", "RequestIdMiddleware", "request_id_var"]
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records discarded before reaching a handler", ["reason"])
+
+# Records the listener handles before briefly releasing the GIL
+YIELD_EVERY = 16
+
+# Set for the duration of each HTTP request by RequestIdMiddleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the id of the request they were logged in"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING from the configured loggers and their children"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            # The most specific configured logger name wins
+            prefix = name
+            while prefix not in self.rates and "." in prefix:
+                prefix = prefix.rsplit(".", 1)[0]
+            rate = self._resolved[name] = self.rates.get(prefix, 1.0)
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        LOG_RECORDS_DROPPED.labels("sampled").inc()
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hands records to the listener thread without ever blocking the caller.
+
+    When max_size records are already waiting the record is dropped and counted: losing
+    log lines under overload is preferable to stalling the event loop behind a slow disk.
+    """
+
+    def __init__(self, record_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(record_queue)
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, while the arguments still hold their current
+        # values, and leave formatting to the handlers on the listener side
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+            return
+        self.queue.put_nowait(record)
+
+
+class BatchingQueueListener(QueueListener):
+    """Handles everything queued, then sleeps for `interval` before looking again.
+
+    A listener that wakes on every record competes with the event loop for the GIL once
+    per log call; draining in batches keeps that to one handoff per interval.
+    """
+
+    def __init__(self, record_queue: queue.SimpleQueue, *handlers: logging.Handler, interval: float = 0.005):
+        super().__init__(record_queue, *handlers, respect_handler_level=True)
+        self.interval = interval
+        self._batch: Deque[logging.LogRecord] = deque()
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if not self._batch:
+            time.sleep(self.interval)
+            self._batch.append(self.queue.get(block))
+            try:
+                while True:
+                    self._batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+        elif len(self._batch) % YIELD_EVERY == 0:
+            # Formatting a large batch is one long hold on the GIL; let the event loop in between
+            time.sleep(0)
+        return self._batch.popleft()
+
+
+def reopening_handler(handler: logging.FileHandler) -> WatchedFileHandler:
+    """A handler for the same file and format that reopens it once another process rotates it"""
+    handler.close()
+    watched = WatchedFileHandler(handler.baseFilename, encoding=handler.encoding, delay=True)
+    watched.setFormatter(handler.formatter)
+    watched.setLevel(handler.level)
+    for log_filter in handler.filters:
+        watched.addFilter(log_filter)
+    return watched
+
+
+class RequestIdMiddleware:
+    """Gives every HTTP request an id, taken from the request header when it carries a sane one.
+
+    The id is available to log records through request_id_var and echoed in the response
+    header so clients and proxies can correlate their logs with ours.
+    """
+    VALID_ID = re.compile(rb"[A-Za-z0-9._-]{1,128}")
+
+    def __init__(self, app, header: str = "X-Request-ID"):
+        self.app = app
+        self.header = header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header and self.VALID_ID.fullmatch(value):
+                request_id = value.decode()
+                break
+        request_id = request_id or uuid.uuid4().hex
+        encoded_id = request_id.encode()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, encoded_id)]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
 class Logger:
+    # Handlers from the logging config, served by the listener thread when the queue is enabled
+    handlers: List[logging.Handler] = []
+    listener: Optional[BatchingQueueListener] = None
+    # Set in the pre-fork master before it starts workers: with several processes writing one
+    # file, each rotating it on its own would lose records, so only the master rotates it
+    # (rotate_files) and the others reopen it after a rotation
+    rotated_elsewhere: bool = False
+
     @staticmethod
     def setup_logging():
-        logging.config.dictConfig(settings.config["logging"])
+        Logger.stop_logging()
+        logging.config.dictConfig(copy.deepcopy(settings.config.logging))
+        queue_config = settings.config.log_queue
+        root = logging.getLogger()
+        if Logger.rotated_elsewhere:
+            root.handlers = [
+                reopening_handler(handler) if isinstance(handler, RotatingFileHandler) else handler
+                for handler in root.handlers
+            ]
+        Logger.handlers = root.handlers[:]
+
+        filters = [RequestIdFilter()]
+        if queue_config.sample_rates:
+            # Sampling first, so dropped records cost as little as possible
+            filters.insert(0, SamplingFilter(queue_config.sample_rates))
+
+        if not queue_config.enabled:
+            for handler in Logger.handlers:
+                for log_filter in filters:
+                    handler.addFilter(log_filter)
+            return
+
+        queue_handler = DroppingQueueHandler(queue.SimpleQueue(), queue_config.max_size)
+        for log_filter in filters:
+            queue_handler.addFilter(log_filter)
+        root.handlers = [queue_handler]
+        Logger.listener = BatchingQueueListener(
+            queue_handler.queue, *Logger.handlers, interval=queue_config.flush_interval_ms / 1000
+        )
+        Logger.listener.start()
+
+    @staticmethod
+    def stop_logging():
+        """Write out queued records and hand the handlers back to the root logger"""
+        if Logger.listener is None:
+            return
+        Logger.listener.stop()
+        Logger.listener = None
+        logging.getLogger().handlers = Logger.handlers[:]
+
+    @staticmethod
+    def rotate_files():
+        """Roll over the size-limited log files that have reached their limit"""
+        for handler in Logger.handlers:
+            if not isinstance(handler, RotatingFileHandler) or handler.maxBytes <= 0:
+                continue
+            try:
+                if os.path.getsize(handler.baseFilename) < handler.maxBytes:
+                    continue
+            except OSError:
+                continue
+            handler.acquire()
+            try:
+                handler.doRollover()
+            finally:
+                handler.release()
 
     @staticmethod
     def get_logger(name: str) -> logging.Logger:
         return logging.getLogger(name)
+
+
+# Queued records would otherwise be lost when a process exits without calling stop_logging
+atexit.register(Logger.stop_logging)
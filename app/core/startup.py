@@ -0,0 +1,51 @@
+import time
+from typing import Optional
+
+from prometheus_client import Gauge
+
+from app.core.logging import Logger
+
+logger = Logger.get_logger(__name__)
+
+STARTUP_SECONDS = Gauge("app_startup_seconds", "Time this worker took to become ready, by phase", ["phase"])
+
+
+class Startup:
+    """Times a worker from loading the application to finishing its startup handlers.
+
+    `begin` and `complete` are registered as the first and last startup handlers;
+    /health/ready reports the worker ready once `complete` has run.
+    """
+    # Set when main.py loads this module first, before the rest of the application is imported
+    imported_at: float = time.perf_counter()
+    started_at: Optional[float] = None
+    ready_at: Optional[float] = None
+
+    @classmethod
+    async def begin(cls) -> None:
+        cls.started_at = time.perf_counter()
+
+    @classmethod
+    async def complete(cls) -> None:
+        cls.ready_at = time.perf_counter()
+        timings = cls.timings()
+        STARTUP_SECONDS.labels("import").set(timings["import_seconds"])
+        STARTUP_SECONDS.labels("startup_handlers").set(timings["startup_seconds"])
+        logger.info(
+            f"Worker ready in {timings['total_seconds']:.2f}s "
+            f"({timings['import_seconds']:.2f}s import, {timings['startup_seconds']:.2f}s startup handlers)"
+        )
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return cls.ready_at is not None
+
+    @classmethod
+    def timings(cls) -> dict:
+        ready_at = cls.ready_at or time.perf_counter()
+        started_at = cls.started_at or ready_at
+        return {
+            "import_seconds": started_at - cls.imported_at,
+            "startup_seconds": ready_at - started_at,
+            "total_seconds": ready_at - cls.imported_at,
+        }
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import base64
+from typing import AsyncIterator
+
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_repository import PaymentRepository
+from app.services.payment_service import PaymentService
+
+logger = Logger.get_logger(__name__)
+
+
+async def single_chunk(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def migrate_legacy_evidence(delete_source: bool = False) -> dict:
+    """Move base64 evidence documents into the evidence store under their existing file ids.
+
+    Identical files end up sharing one stored blob. Documents that already have a record
+    are skipped, so the migration can be re-run after an interruption.
+    """
+    repository = PaymentRepository()
+    service = PaymentService()
+    store = service.evidence_store
+    report = {"migrated": 0, "skipped": 0, "deleted": 0}
+    cursor = repository.collection_upload_evidence.find({"evidence_file": {"$exists": True}}).batch_size(10)
+    async for document in cursor:
+        file_id = document["_id"]
+        if await store.get(file_id):
+            report["skipped"] += 1
+        else:
+            filename = document.get("filename") or str(file_id)
+            # Legacy documents were keyed by the payment id they belong to
+            await store.put(
+                file_id,
+                single_chunk(base64.b64decode(document["evidence_file"])),
+                filename,
+                service.get_content_type(filename),
+                file_id=file_id
+            )
+            report["migrated"] += 1
+        if delete_source:
+            await repository.collection_upload_evidence.delete_one({"_id": file_id})
+            report["deleted"] += 1
+    return report
+
+
+async def main(delete_source: bool) -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        report = await migrate_legacy_evidence(delete_source)
+        logger.info(f"Evidence migration finished: {report}")
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move base64 evidence documents into the evidence store")
+    parser.add_argument("--delete-source", action="store_true", help="remove each base64 document once it is migrated")
+    args = parser.parse_args()
+    asyncio.run(main(args.delete_source))
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_repository import PaymentRepository
+from app.utils.payee_search import SearchMode
+
+logger = Logger.get_logger(__name__)
+
+# Indexes each repository relies on, keyed by the collection key under mongodb.collections
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "payments": [
+        # Default list order and keyset pagination
+        IndexModel([("payee_added_date_utc", DESCENDING), ("_id", DESCENDING)], name="added_date_id"),
+        # Status filter with the same sort
+        IndexModel(
+            [("payee_payment_status", ASCENDING), ("payee_added_date_utc", DESCENDING), ("_id", DESCENDING)],
+            name="status_added_date_id"
+        ),
+        IndexModel([("payee_due_date", ASCENDING)], name="due_date"),
+        # Daily status refresh passes (app/jobs/status_refresh.py)
+        IndexModel([("payee_payment_status", ASCENDING), ("payee_due_date", ASCENDING)], name="status_due_date"),
+        IndexModel([("payee_first_name", ASCENDING)], name="first_name"),
+        IndexModel([("payee_last_name", ASCENDING)], name="last_name"),
+        IndexModel([("payee_email", ASCENDING)], name="email"),
+        # CSV delta sync natural key; rows created through the API have none
+        IndexModel(
+            [("sync_key", ASCENDING)],
+            name="sync_key",
+            unique=True,
+            partialFilterExpression={"sync_key": {"$exists": True}}
+        ),
+        # Derived payee search fields (app/utils/payee_search.py), both multikey
+        IndexModel([("search_grams", ASCENDING)], name="search_grams"),
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+    ],
+    # Evidence records are released with their payment (app/storage/evidence_store.py)
+    "evidence": [
+        IndexModel([("payment_id", ASCENDING)], name="payment_id"),
+    ],
+    # Shared response cache tier (app/utils/response_cache.py)
+    "response_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0),
+        IndexModel([("tags", ASCENDING)], name="tags"),
+    ],
+}
+
+# Index options that change behaviour and therefore force a rebuild when they differ
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+class QueryPlanError(RuntimeError):
+    pass
+
+
+def _index_key(index: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    return list(index["key"].items())
+
+
+def _index_options(index: Dict[str, Any]) -> Dict[str, Any]:
+    return {option: index[option] for option in _COMPARED_OPTIONS if option in index}
+
+
+async def reconcile_collection_indexes(collection, declared: List[IndexModel], prune: bool = False) -> Dict[str, List[str]]:
+    """Create missing indexes, rebuild changed ones and optionally drop undeclared ones"""
+    report = {"created": [], "rebuilt": [], "unchanged": [], "dropped": []}
+    existing = {index["name"]: index async for index in collection.list_indexes()}
+    satisfied = set()
+    to_create = []
+
+    for model in declared:
+        wanted = model.document
+        current = existing.get(wanted["name"])
+        if current is None:
+            # An equivalent index may already exist under an auto-generated name
+            current = next(
+                (index for index in existing.values()
+                 if _index_key(index) == _index_key(wanted) and index["name"] not in satisfied),
+                None
+            )
+        if current is None:
+            to_create.append(model)
+            report["created"].append(wanted["name"])
+        elif _index_key(current) != _index_key(wanted) or _index_options(current) != _index_options(wanted):
+            await collection.drop_index(current["name"])
+            to_create.append(model)
+            report["rebuilt"].append(wanted["name"])
+        else:
+            satisfied.add(current["name"])
+            report["unchanged"].append(current["name"])
+
+    if prune:
+        declared_names = {model.document["name"] for model in declared}
+        for name in existing:
+            if name != "_id_" and name not in satisfied and name not in declared_names:
+                await collection.drop_index(name)
+                report["dropped"].append(name)
+
+    if to_create:
+        await collection.create_indexes(to_create)
+    return report
+
+
+async def reconcile_indexes(prune: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    collections = settings.config.mongodb.collections
+    reports = {}
+    for collection_key, declared in INDEX_REGISTRY.items():
+        collection_name = getattr(collections, collection_key)
+        reports[collection_name] = await reconcile_collection_indexes(MongoDB.db[collection_name], declared, prune)
+        logger.info(f"Indexes for '{collection_name}': {reports[collection_name]}")
+    return reports
+
+
+def canonical_query_shapes() -> List[Tuple[str, dict]]:
+    """The query shapes get_payments issues, with placeholder values"""
+    status_query = PaymentRepository.build_query(payee_payment_status="pending")
+    keyset = PaymentRepository.keyset_query((datetime(2024, 1, 1, tzinfo=timezone.utc), "000000000000000000000000"))
+    week_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    unfiltered = PaymentRepository.build_query()
+    return [
+        ("list", unfiltered),
+        ("list by status", status_query),
+        ("search short", PaymentRepository.build_query(search_payee_name="smi")),
+        ("search", PaymentRepository.build_query(search_payee_name="smith")),
+        ("search by status", PaymentRepository.build_query("smith", "pending")),
+        ("search prefix", PaymentRepository.build_query("smi", search_mode=SearchMode.PREFIX)),
+        ("search email", PaymentRepository.build_query("a@b.com", search_mode=SearchMode.EXACT_EMAIL)),
+        ("search fuzzy", PaymentRepository.build_query("smtih", search_mode=SearchMode.FUZZY)),
+        ("due this week", PaymentRepository.build_query(due_from=week_start, due_to=week_start + timedelta(days=7))),
+        ("keyset page", {"$and": [unfiltered, keyset]}),
+        ("keyset page by status", {"$and": [status_query, keyset]}),
+    ]
+
+
+def _plan_stages(plan: Any):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+async def verify_query_plans() -> None:
+    """Explain every canonical list query and fail if any of them scans the whole collection"""
+    repository = PaymentRepository()
+    collection = repository.collection_payment
+    failures = []
+    for name, query in canonical_query_shapes():
+        cursor = collection.find(query).sort(repository.sort_spec()).limit(50)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = set(_plan_stages(winning_plan))
+        if "COLLSCAN" in stages:
+            failures.append(f"{name}: {query}")
+        logger.info(f"Query plan for '{name}': {sorted(stages)}")
+    if failures:
+        raise QueryPlanError("Collection scan in query plan for: " + "; ".join(failures))
+
+
+async def ensure_indexes():
+    index_config = settings.config.mongodb.indexes
+    if index_config.reconcile_on_startup:
+        try:
+            await reconcile_indexes(prune=index_config.prune)
+        except Exception as e:
+            logger.error(f"Failed to reconcile indexes: {e}")
+    if index_config.verify_on_startup:
+        await verify_query_plans()
+
+
+async def main(prune: bool, verify: bool) -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        await reconcile_indexes(prune=prune)
+        if verify:
+            await verify_query_plans()
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB indexes with the declared registry")
+    parser.add_argument("--prune", action="store_true", help="drop indexes that are not declared")
+    parser.add_argument("--verify", action="store_true", help="fail if a canonical query would COLLSCAN")
+    args = parser.parse_args()
+    asyncio.run(main(args.prune, args.verify))
@@ -0,0 +1,62 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.mongodb import MongoDB
+
+
+class LockLost(RuntimeError):
+    pass
+
+
+class DistributedLock:
+    """Lease-based lock stored in MongoDB, shared by every worker and CLI process.
+
+    The lease expires after ttl_seconds so a crashed holder cannot block others forever.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float = 300, owner: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.acquired = False
+
+    @property
+    def collection(self):
+        return MongoDB.db[settings.config.mongodb.collections.locks]
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "acquired_at": now, "expires_at": now + timedelta(seconds=self.ttl_seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Held by someone else: the filter did not match and the upsert hit the existing _id
+            return False
+        self.acquired = True
+        return True
+
+    async def renew(self) -> None:
+        """Extend the lease; raises LockLost when it ran out and another holder has taken the lock"""
+        if not await self.acquire():
+            self.acquired = False
+            raise LockLost(f"Lost the lock {self.name} to another holder")
+
+    async def release(self) -> None:
+        if self.acquired:
+            await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+            self.acquired = False
+
+    async def __aenter__(self) -> bool:
+        return await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.release()
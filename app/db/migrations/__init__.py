@@ -0,0 +1,14 @@
+from app.core.config import settings
+from app.db.migrations.base import Migration
+from app.db.migrations.m0001_typed_payment_fields import TypedPaymentFields
+from app.db.migrations.runner import applied_versions, run_migration, run_migrations
+
+# Every migration, in the order they were written; versions are never reused
+MIGRATIONS = [
+    TypedPaymentFields(),
+]
+
+
+async def migrate_on_startup():
+    if settings.config.migrations.run_on_startup:
+        await run_migrations(MIGRATIONS)
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+from typing import Optional
+
+from app.core.logging import Logger
+from app.db.migrations import MIGRATIONS, applied_versions, run_migrations
+from app.db.mongodb import MongoDB
+
+
+async def main(target: Optional[int], batch_size: Optional[int], list_only: bool) -> None:
+    Logger.setup_logging()
+    logger = Logger.get_logger(__name__)
+    await MongoDB.connect()
+    try:
+        if list_only:
+            applied = await applied_versions()
+            for migration in MIGRATIONS:
+                state = applied.get(migration.version, {})
+                print(f"{migration.version:>4} {migration.name:<32} {state.get('status', 'pending'):<8} "
+                      f"migrated={state.get('migrated', 0)} skipped={state.get('skipped', 0)}")
+            return
+        ran = await run_migrations(MIGRATIONS, target, batch_size)
+        logger.info(f"Applied migrations: {ran or 'none'}")
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--to", dest="target", type=int, help="stop after this version")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--list", action="store_true", help="show each migration and its progress")
+    args = parser.parse_args()
+    asyncio.run(main(args.target, args.batch_size, args.list))
@@ -0,0 +1,22 @@
+from typing import Optional
+
+
+class Migration:
+    """One forward-only change to the documents of a collection.
+
+    query() selects the documents that still need the change and transform() returns the
+    update for one of them (or None to leave it alone). Both must be idempotent: the runner
+    may see a document again after an interruption.
+    """
+    version: int = 0
+    name: str = ""
+    # Key under mongodb.collections
+    collection_key: str = ""
+    # Fields transform() needs; None reads whole documents
+    projection: Optional[dict] = None
+
+    def query(self) -> dict:
+        raise NotImplementedError
+
+    def transform(self, document: dict) -> Optional[dict]:
+        raise NotImplementedError
@@ -0,0 +1,40 @@
+import math
+from decimal import Decimal
+from typing import Optional
+
+from app.db.migrations.base import Migration
+from app.models.payment import AMOUNT_FIELDS, DATE_FIELDS, parse_utc_datetime, to_decimal
+
+# deleted_at is set by CSV re-sync tombstones
+MIGRATED_DATE_FIELDS = (*DATE_FIELDS, "deleted_at")
+NUMBER_TYPES = ["int", "long", "double"]
+
+
+class TypedPaymentFields(Migration):
+    """Dates from formatted strings and epoch seconds to BSON dates; amounts from doubles to Decimal128"""
+    version = 1
+    name = "typed_payment_fields"
+    collection_key = "payments"
+    projection = {field: 1 for field in (*MIGRATED_DATE_FIELDS, *AMOUNT_FIELDS)}
+
+    def query(self) -> dict:
+        return {"$or": [
+            *({field: {"$type": ["string", *NUMBER_TYPES]}} for field in MIGRATED_DATE_FIELDS),
+            *({field: {"$type": NUMBER_TYPES}} for field in AMOUNT_FIELDS),
+        ]}
+
+    def transform(self, document: dict) -> Optional[dict]:
+        changes = {}
+        for field in MIGRATED_DATE_FIELDS:
+            value = document.get(field)
+            if isinstance(value, (str, int, float)):
+                try:
+                    changes[field] = parse_utc_datetime(value)
+                except ValueError:
+                    # Left as is; the runner moves past it and reports it as skipped
+                    continue
+        for field in AMOUNT_FIELDS:
+            value = document.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                changes[field] = to_decimal(value) if isinstance(value, float) else Decimal(value)
+        return {"$set": changes} if changes else None
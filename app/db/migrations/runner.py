@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.locks import DistributedLock
+from app.db.migrations.base import Migration
+from app.db.mongodb import MongoDB
+
+logger = Logger.get_logger(__name__)
+
+LOCK_NAME = "schema_migrations"
+
+
+def migrations_collection():
+    return MongoDB.db[settings.config.mongodb.collections.migrations]
+
+
+async def applied_versions() -> Dict[int, dict]:
+    return {state["_id"]: state async for state in migrations_collection().find({})}
+
+
+async def run_migration(migration: Migration, batch_size: int, lock: Optional[DistributedLock] = None) -> dict:
+    """Apply one migration in batches, recording progress so an interrupted run resumes where it stopped"""
+    state_collection = migrations_collection()
+    collection = MongoDB.db[getattr(settings.config.mongodb.collections, migration.collection_key)]
+    state = await state_collection.find_one({"_id": migration.version}) or {}
+    if state.get("status") == "done":
+        return state
+
+    await state_collection.update_one(
+        {"_id": migration.version},
+        {
+            "$set": {"name": migration.name, "status": "running"},
+            "$setOnInsert": {"started_at": datetime.now(timezone.utc), "migrated": 0, "skipped": 0}
+        },
+        upsert=True
+    )
+    last_id = state.get("last_id")
+    while True:
+        query = migration.query()
+        if last_id is not None:
+            query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+        batch = await collection.find(query, migration.projection).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        operations = []
+        for document in batch:
+            update = migration.transform(document)
+            if update:
+                operations.append(UpdateOne({"_id": document["_id"]}, update))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        last_id = batch[-1]["_id"]
+        await state_collection.update_one(
+            {"_id": migration.version},
+            {"$set": {"last_id": last_id}, "$inc": {"migrated": len(operations), "skipped": len(batch) - len(operations)}}
+        )
+        if lock:
+            # Renew the lease so a long migration is not taken over midway; once another runner
+            # has it, stop here and leave the rest to it (it resumes from last_id)
+            await lock.renew()
+
+    await state_collection.update_one(
+        {"_id": migration.version},
+        {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}}
+    )
+    state = await state_collection.find_one({"_id": migration.version})
+    logger.info(f"Migration {migration.version} '{migration.name}' done: {state.get('migrated')} migrated, {state.get('skipped')} skipped")
+    return state
+
+
+async def run_migrations(migrations: List[Migration], target: Optional[int] = None, batch_size: Optional[int] = None) -> List[int]:
+    """Apply pending migrations in version order under a distributed lock; returns the versions run"""
+    migration_config = settings.config.migrations
+    batch_size = batch_size or migration_config.batch_size
+    lock = DistributedLock(LOCK_NAME, ttl_seconds=migration_config.lock_ttl_seconds)
+    if not await lock.acquire():
+        logger.info("Migrations already running elsewhere, skipping")
+        return []
+    try:
+        applied = await applied_versions()
+        ran = []
+        for migration in sorted(migrations, key=lambda migration: migration.version):
+            if target is not None and migration.version > target:
+                break
+            if applied.get(migration.version, {}).get("status") == "done":
+                continue
+            await run_migration(migration, batch_size, lock)
+            ran.append(migration.version)
+        return ran
+    finally:
+        await lock.release()
@@ -1,5 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.core.config import settings
+from app.db.codecs import CODEC_OPTIONS
+from app.db.monitoring import event_listeners
 
 class MongoDB:
     client: AsyncIOMotorClient = None
@@ -7,14 +9,16 @@ class MongoDB:
 
     @classmethod
     async def connect(cls):
+        mongodb_config = settings.config.mongodb
         cls.client = AsyncIOMotorClient(
-            settings.config["mongodb"]["uri"],
-            maxPoolSize=settings.config["mongodb"]["max_pool_size"],
-            minPoolSize=settings.config["mongodb"]["min_pool_size"],
-            serverSelectionTimeoutMS=settings.config["mongodb"]["timeout_ms"]
+            mongodb_config.uri,
+            maxPoolSize=mongodb_config.max_pool_size,
+            minPoolSize=mongodb_config.min_pool_size,
+            serverSelectionTimeoutMS=mongodb_config.timeout_ms,
+            event_listeners=event_listeners()
         )
         
-        cls.db = cls.client[settings.config["mongodb"]["database"]]
+        cls.db = cls.client.get_database(mongodb_config.database, codec_options=CODEC_OPTIONS)
 
     @classmethod
     async def close(cls):
@@ -0,0 +1,158 @@
+import json
+from typing import Any, Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.core.metrics import LATENCY_BUCKETS
+
+logger = Logger.get_logger(__name__)
+
+COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round trip time as measured by the driver",
+    ["command", "collection"],
+    buckets=LATENCY_BUCKETS
+)
+COMMAND_FAILURES = Counter("mongodb_command_failures_total", "MongoDB commands that returned an error", ["command", "collection"])
+POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0001, 0.0005, *LATENCY_BUCKETS)
+)
+POOL_CHECKOUT_FAILURES = Counter("mongodb_pool_checkout_failures_total", "Connection checkouts that failed", ["reason"])
+POOL_CONNECTIONS_IN_USE = Gauge("mongodb_pool_connections_in_use", "Connections checked out of the pool", multiprocess_mode="livesum")
+
+# Where each command keeps the part that decides which index it can use
+FILTER_KEYS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+MAX_SHAPE_DEPTH = 8
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return command.get("collection", "")
+    target = command.get(command_name)
+    # Database level commands (aggregate: 1, ping: 1) have no collection
+    return target if isinstance(target, str) else ""
+
+
+def value_shape(value: Any, depth: int = 0) -> Any:
+    """The keys and operators of a filter with every value replaced by '?'"""
+    if depth >= MAX_SHAPE_DEPTH:
+        return "..."
+    if isinstance(value, dict):
+        return {key: value_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, (dict, list, tuple)) for item in value):
+        # $and/$or branches and pipeline stages; lists of scalars ($in) are values
+        return [value_shape(item, depth + 1) for item in value]
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> str:
+    key = FILTER_KEYS.get(command_name)
+    if key is None:
+        return "{}"
+    target = command.get(key)
+    if command_name in ("update", "delete"):
+        # Statement filters only; update documents and limits are not part of the shape
+        target = [statement.get("q") for statement in target or []][:1]
+    shape = {key: value_shape(target)}
+    if command.get("sort"):
+        # Sort keys and directions carry no user data
+        shape["sort"] = command["sort"]
+    return json.dumps(shape, default=str)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Per command and collection latency, and a log line for slow commands.
+
+    Callbacks run on the driver's threads, so they only touch thread-safe metrics and
+    single dict operations.
+    """
+
+    def __init__(self):
+        self._started: Dict[Tuple[int, Any], Tuple[str, dict]] = {}
+        self._latency: Dict[Tuple[str, str], Any] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        # The command is only kept by reference until it finishes; its shape is built if it was slow
+        self._started[(event.request_id, event.connection_id)] = (
+            command_collection(event.command_name, event.command),
+            event.command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, True)
+
+    def _finished(self, event, failed: bool) -> None:
+        collection, command = self._started.pop((event.request_id, event.connection_id), ("", None))
+        seconds = event.duration_micros / 1e6
+        latency = self._latency.get((event.command_name, collection))
+        if latency is None:
+            latency = self._latency[(event.command_name, collection)] = COMMAND_LATENCY.labels(event.command_name, collection)
+        latency.observe(seconds)
+        if failed:
+            COMMAND_FAILURES.labels(event.command_name, collection).inc()
+        if command is not None and seconds * 1000 >= settings.config.metrics.slow_query_ms:
+            logger.warning(
+                f"Slow MongoDB {event.command_name} on '{collection}' took {seconds * 1000:.1f}ms: "
+                f"{command_shape(event.command_name, command)}"
+            )
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Connection checkout wait times and connections in use"""
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        POOL_CHECKOUT_WAIT.observe(event.duration)
+        POOL_CONNECTIONS_IN_USE.inc()
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        POOL_CHECKOUT_WAIT.observe(event.duration)
+        POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        POOL_CONNECTIONS_IN_USE.dec()
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        pass
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+
+def event_listeners() -> list:
+    if not (settings.config.metrics.enabled and settings.config.metrics.mongodb_commands):
+        return []
+    return [CommandMetricsListener(), PoolMetricsListener()]
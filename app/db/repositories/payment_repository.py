@@ -1,83 +1,293 @@
-from typing import List
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from pymongo import DESCENDING
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+from pymongo import DESCENDING, ReturnDocument
 
 from app.db.mongodb import MongoDB
 from app.core.config import settings
-from app.models.payment import Payment
-from pymongo.errors import PyMongoError
+from app.core.logging import Logger
+from app.db.repositories.payment_summary_repository import SUMMARY_PROJECTION
+from app.models.payment import Payment, parse_utc_datetime
+from app.utils.payee_search import (
+    SEARCH_PROJECTION,
+    SearchMode,
+    build_search_fields,
+    build_search_query,
+    matches_search,
+)
+from app.utils.ttl_cache import TTLCache
+from pymongo.errors import BulkWriteError, PyMongoError
+
+
+logger = Logger.get_logger(__name__)
+
+# Derived and bookkeeping fields that are never returned to API clients
+INTERNAL_FIELDS_PROJECTION = {**SEARCH_PROJECTION, "sync_key": 0, "content_hash": 0, "sync_run_id": 0, "is_deleted": 0}
 
 
 class PaymentRepository:
+    # Shared by every per-request instance so list totals survive between calls
+    total_count_cache = TTLCache(
+        settings.config.pagination.total_count_ttl_seconds,
+        settings.config.pagination.total_count_cache_size
+    )
+
     def __init__(self):
-        collection_name_payment = settings.config["mongodb"]["collections"]["payments"]
-        collection_name_upload_evidence = settings.config["mongodb"]["collections"]["upload_evidence"]
+        collections = settings.config.mongodb.collections
+        collection_name_payment = collections.payments
+        collection_name_upload_evidence = collections.upload_evidence
         self.collection_payment = MongoDB.db[collection_name_payment]
         self.collection_upload_evidence = MongoDB.db[collection_name_upload_evidence]
+        self._evidence_bucket: Optional[AsyncIOMotorGridFSBucket] = None
+
+    @property
+    def evidence_bucket(self) -> AsyncIOMotorGridFSBucket:
+        # Built on first use: only evidence stored before evidence records existed is read from it
+        if self._evidence_bucket is None:
+            bucket_name = settings.config.mongodb.collections.evidence_bucket
+            self._evidence_bucket = AsyncIOMotorGridFSBucket(MongoDB.db, bucket_name=bucket_name)
+        return self._evidence_bucket
         
-    async def get_payments(self, query: dict = {}, skip: int = 0, limit: int = 50, sort_order: int = DESCENDING) -> List[dict]:
+    @staticmethod
+    def build_query(
+        search_payee_name: Optional[str] = None,
+        payee_payment_status: Optional[str] = None,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[datetime] = None,
+        due_to: Optional[datetime] = None
+    ) -> dict:
+        # Rows removed from the source file by a CSV re-sync are kept as tombstones
+        query = {"is_deleted": {"$ne": True}}
+        if search_payee_name:
+            query.update(build_search_query(search_payee_name, search_mode))
+        if payee_payment_status is not None:
+            query.update({"payee_payment_status": payee_payment_status})
+        if due_from or due_to:
+            # Half-open [due_from, due_to) range on the due_date index
+            due_range = {}
+            if due_from:
+                due_range["$gte"] = due_from
+            if due_to:
+                due_range["$lt"] = due_to
+            query["payee_due_date"] = due_range
+        return query
+
+    @staticmethod
+    def matches(
+        payment: dict,
+        search_payee_name: Optional[str] = None,
+        payee_payment_status: Optional[str] = None,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[datetime] = None,
+        due_to: Optional[datetime] = None
+    ) -> bool:
+        """Whether build_query with the same filters would select this payment, checked in memory"""
+        if payment.get("is_deleted"):
+            return False
+        if search_payee_name and not matches_search(payment, search_payee_name, search_mode):
+            return False
+        if payee_payment_status is not None and payment.get("payee_payment_status") != payee_payment_status:
+            return False
+        if due_from or due_to:
+            due_date = payment.get("payee_due_date")
+            if due_date is None:
+                return False
+            due_date = parse_utc_datetime(due_date)
+            if (due_from and due_date < due_from) or (due_to and due_date >= due_to):
+                return False
+        return True
+
+    async def get_payments(
+        self,
+        query: dict = {},
+        skip: int = 0,
+        limit: int = 50,
+        sort_order: int = DESCENDING,
+        after: Optional[Tuple[Any, str]] = None,
+        projection: Optional[dict] = None
+    ) -> List[dict]:
         try:
-            payments = await self.collection_payment.find(query).sort("payee_added_date_utc", sort_order).skip(skip).limit(limit).to_list(length=limit)
+            if after is not None:
+                # Keyset pagination: seek past the last (payee_added_date_utc, _id) seen
+                # instead of skipping, so deep pages cost the same as the first one
+                query = {"$and": [query, self.keyset_query(after, sort_order)]} if query else self.keyset_query(after, sort_order)
+            payments = await self.collection_payment.find(query, projection or dict(INTERNAL_FIELDS_PROJECTION)).sort(self.sort_spec(sort_order)).skip(skip).limit(limit).to_list(length=limit)
             return payments
         except PyMongoError as e:
-            print(f"An error occurred while retrieving payments: {str(e)}")
+            logger.error(f"An error occurred while retrieving payments: {e}")
             raise e
         
+    async def get_payments_page(
+        self,
+        query: dict = {},
+        skip: int = 0,
+        limit: int = 50,
+        sort_order: int = DESCENDING,
+        after: Optional[Tuple[Any, str]] = None,
+        approximate_total: bool = False,
+        projection: Optional[dict] = None
+    ) -> Tuple[List[dict], int, bool]:
+        """Return (payments, total, total_is_estimate) for one page of a list query.
+
+        `projection` limits the fields fetched for each payment (all public fields by default).
+        The approximate total of an unfiltered list comes from collection metadata, so it also
+        counts rows tombstoned by a CSV re-sync.
+        """
+        if approximate_total and query == self.build_query():
+            total = await self.collection_payment.estimated_document_count()
+            payments = await self.get_payments(query, skip, limit, sort_order, after, projection)
+            return payments, total, True
+
+        cache_key = self.normalize_query(query)
+        total = self.total_count_cache.get(cache_key)
+        if total is not None:
+            payments = await self.get_payments(query, skip, limit, sort_order, after, projection)
+            return payments, total, False
+
+        if after is not None:
+            # The $facet below sorts the whole filtered set before seeking, so a cursor page
+            # stays an index range seek and the total is counted on its own
+            payments, total = await asyncio.gather(
+                self.get_payments(query, skip, limit, sort_order, after, projection),
+                self.count_documents(query)
+            )
+            self.total_count_cache.set(cache_key, total)
+            return payments, total, False
+
+        # Fetch the page and the exact total in a single round trip
+        page_stages = []
+        if skip:
+            page_stages.append({"$skip": skip})
+        page_stages.append({"$limit": limit})
+        page_stages.append({"$project": projection or dict(INTERNAL_FIELDS_PROJECTION)})
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"payee_added_date_utc": sort_order, "_id": sort_order}},
+            {"$facet": {"items": page_stages, "total": [{"$count": "count"}]}}
+        ]
+        try:
+            result = await self.collection_payment.aggregate(pipeline).to_list(length=1)
+        except PyMongoError as e:
+            logger.error(f"An error occurred while retrieving payments: {e}")
+            raise e
+        facet = result[0] if result else {"items": [], "total": []}
+        total = facet["total"][0]["count"] if facet["total"] else 0
+        self.total_count_cache.set(cache_key, total)
+        return facet["items"], total, False
+
+    async def iter_payments(self, query: dict = {}, batch_size: int = 1000, sort_order: int = DESCENDING) -> AsyncIterator[dict]:
+        """Stream every matching payment in list order without holding the result set in memory"""
+        cursor = self.collection_payment.find(query, dict(INTERNAL_FIELDS_PROJECTION))
+        async for payment in cursor.sort(self.sort_spec(sort_order)).batch_size(batch_size):
+            yield payment
+
+    @staticmethod
+    def sort_spec(sort_order: int = DESCENDING) -> List[Tuple[str, int]]:
+        return [("payee_added_date_utc", sort_order), ("_id", sort_order)]
+
+    @staticmethod
+    def normalize_query(query: dict) -> str:
+        return json.dumps(query, sort_keys=True, default=str)
+
+    @staticmethod
+    def keyset_query(after: Tuple[Any, str], sort_order: int = DESCENDING) -> dict:
+        added_date, payment_id = after
+        op = "$lt" if sort_order == DESCENDING else "$gt"
+        return {
+            "$or": [
+                {"payee_added_date_utc": {op: added_date}},
+                {"payee_added_date_utc": added_date, "_id": {op: payment_id}}
+            ]
+        }
+
     async def count_documents(self, query: dict) -> int:
         return await self.collection_payment.count_documents(query)
 
-    async def get_payment(self, payment_id: str) -> dict:
+    async def get_payment(self, payment_id: str, projection: Optional[dict] = None) -> dict:
         result = await self.collection_payment.find_one(
-            {"_id": payment_id,}
+            {"_id": payment_id, "is_deleted": {"$ne": True}},
+            projection or dict(INTERNAL_FIELDS_PROJECTION)
         )
-        result["status"] = "success"
         if not result:
-            result["status"] = "error"
+            return {"status": "error", "message": "Payment not found"}
+        result["status"] = "success"
         
         return result
     
-    async def update_payment(self, payment_id: str, update_data: dict) -> dict:
+    async def find_payments_by_ids(self, payment_ids: List[str], projection: Optional[dict] = None) -> Dict[str, dict]:
+        cursor = self.collection_payment.find(
+            {"_id": {"$in": payment_ids}, "is_deleted": {"$ne": True}},
+            projection or dict(INTERNAL_FIELDS_PROJECTION)
+        )
+        return {payment["_id"]: payment async for payment in cursor}
+
+    async def bulk_write(self, operations: List[Any], chunk_size: int = 1000) -> Dict[int, str]:
+        """Run write models as unordered bulk_writes; returns error messages by operation position"""
+        errors = {}
+        for start in range(0, len(operations), chunk_size):
+            try:
+                await self.collection_payment.bulk_write(operations[start:start + chunk_size], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    errors[start + write_error["index"]] = write_error.get("errmsg", "Write failed")
+        self.total_count_cache.clear()
+        return errors
+
+    async def update_payment(self, payment_id: str, update_data: dict, return_document: ReturnDocument = ReturnDocument.AFTER) -> dict:
         result = await self.collection_payment.find_one_and_update(
-            {"_id": payment_id},
+            {"_id": payment_id, "is_deleted": {"$ne": True}},
             {"$set": update_data},
-            return_document=True
+            projection=dict(INTERNAL_FIELDS_PROJECTION),
+            return_document=return_document
         )
         return result
     
     async def delete_payment(self, payment_id: str) -> dict:
         try:
-            result = await self.collection_payment.delete_one({"_id": payment_id,})
-            if result.deleted_count == 0:
+            # The deleted document is returned under "payment" so callers can update derived data
+            payment = await self.collection_payment.find_one_and_delete({"_id": payment_id}, projection=dict(SUMMARY_PROJECTION))
+            if payment is None:
                 raise ValueError("Payment not found")
+            self.total_count_cache.clear()
             
-            return {"status": "success", "message": "Payment deleted successfully"}
+            return {"status": "success", "message": "Payment deleted successfully", "payment": payment}
         except PyMongoError as e:
             raise ValueError(f"An error occurred while deleting the payment: {str(e)}")
 
+    @staticmethod
+    def build_document(payment_data: Payment) -> dict:
+        # Convert the Payment model instance to a dictionary with its derived search fields
+        payment_dict = payment_data.model_dump(by_alias=True)
+        payment_dict.update(build_search_fields(payment_dict))
+        return payment_dict
+
     async def create_payment(self, payment_data: Payment) -> str:
         try:
-            # Convert the Payment model instance to a dictionary
-            payment_dict = payment_data.model_dump(by_alias=True)
+            payment_dict = self.build_document(payment_data)
             
             result = await self.collection_payment.insert_one(payment_dict)
+            self.total_count_cache.clear()
             return str(result.inserted_id)
         except Exception as e:
-            print(f"An error occurred while creating the payment: {str(e)}")
+            logger.error(f"An error occurred while creating the payment: {e}")
             raise e
 
     
-    async def upload_evidence(self, payment_id: str, file_data: bytes, filename: str) -> str:
+    async def open_evidence(self, file_id: str) -> Optional[AsyncIOMotorGridOut]:
+        """GridFS evidence stored by file id before evidence records existed"""
         try:
-            result = await self.collection_upload_evidence.insert_one(
-                {"_id": payment_id, "evidence_file": file_data, "filename": filename}
-            )
-            return str(result.inserted_id)
-        except PyMongoError as e:
-            print(f"An error occurred while uploading the evidence: {str(e)}")
+            return await self.evidence_bucket.open_download_stream(file_id)
+        except NoFile:
+            return None
 
-    async def download_evidence(self, file_id: str) -> bytes:
+    async def download_legacy_evidence(self, file_id: str) -> dict:
+        """Base64 evidence stored inline before the move to GridFS"""
         try:
-            print(f"Downloading evidence file with id: {file_id}")
+            logger.debug(f"Downloading legacy evidence file with id: {file_id}")
             result = await self.collection_upload_evidence.find_one(
                 {"_id": file_id}
             )
@@ -86,5 +296,5 @@ class PaymentRepository:
                 raise ValueError("File not found")
             return result
         except PyMongoError as e:
-            print(f"An error occurred while downloading the evidence: {str(e)}")
+            logger.error(f"An error occurred while downloading the evidence: {e}")
             raise e
\ No newline at end of file
@@ -0,0 +1,196 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+from app.models.payment import compute_total_due, to_decimal
+
+logger = Logger.get_logger(__name__)
+
+# Payment fields a rollup row depends on
+SUMMARY_FIELDS = ("payee_payment_status", "currency", "payee_due_date", "due_amount", "discount_percent", "tax_percent", "is_deleted")
+SUMMARY_PROJECTION = {field: 1 for field in SUMMARY_FIELDS}
+# Bucket for due dates that are not stored as dates yet
+UNKNOWN_MONTH = "unknown"
+
+SummaryKey = Tuple[str, str, str]
+
+
+def due_month(value) -> str:
+    return value.strftime("%Y-%m") if isinstance(value, datetime) else UNKNOWN_MONTH
+
+
+def summary_key(payment: Optional[dict]) -> Optional[SummaryKey]:
+    """The (status, currency, due month) row a payment counts towards; None when it counts nowhere"""
+    if payment is None or payment.get("is_deleted"):
+        return None
+    return payment.get("payee_payment_status") or "", payment.get("currency") or "", due_month(payment.get("payee_due_date"))
+
+
+def summary_id(key: SummaryKey) -> str:
+    return "|".join(key)
+
+
+def summary_deltas(removed: Iterable[Optional[dict]] = (), added: Iterable[Optional[dict]] = ()) -> Dict[SummaryKey, list]:
+    """Net [count, due_amount, total_due] change per rollup row when `removed` are replaced by `added`"""
+    deltas: Dict[SummaryKey, list] = {}
+    for sign, payments in ((-1, removed), (1, added)):
+        for payment in payments:
+            key = summary_key(payment)
+            if key is None:
+                continue
+            delta = deltas.setdefault(key, [0, Decimal(0), Decimal(0)])
+            delta[0] += sign
+            delta[1] += sign * to_decimal(payment.get("due_amount") or Decimal(0))
+            delta[2] += sign * compute_total_due(payment)
+    # Updates that leave a payment in the same row with the same amounts cancel out
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def status_move_deltas(totals: Dict[SummaryKey, list], status: str) -> Dict[SummaryKey, list]:
+    """Deltas for moving the payments counted in `totals` to `status`, keeping currency and due month"""
+    deltas: Dict[SummaryKey, list] = {}
+    for key, totals_row in totals.items():
+        moved_key = (status, *key[1:])
+        if moved_key == key:
+            continue
+        for target, sign in ((key, -1), (moved_key, 1)):
+            delta = deltas.setdefault(target, [0, Decimal(0), Decimal(0)])
+            for index, value in enumerate(totals_row):
+                delta[index] += sign * value
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def month_expression(field: str) -> dict:
+    return {
+        "$cond": [
+            {"$eq": [{"$type": field}, "date"]},
+            {"$dateToString": {"format": "%Y-%m", "date": field, "timezone": "UTC"}},
+            UNKNOWN_MONTH
+        ]
+    }
+
+
+def total_due_expression() -> dict:
+    """compute_total_due as an aggregation expression, rounding half up to the cent like Decimal.quantize"""
+    def percent(field):
+        return {"$divide": [{"$toDecimal": {"$ifNull": [field, 0]}}, 100]}
+
+    total = {
+        "$multiply": [
+            {"$toDecimal": {"$ifNull": ["$due_amount", 0]}},
+            {"$subtract": [1, percent("$discount_percent")]},
+            {"$add": [1, percent("$tax_percent")]}
+        ]
+    }
+    # Totals are never negative, so truncating after adding half a cent rounds half up
+    return {"$divide": [{"$trunc": {"$add": [{"$multiply": [total, 100]}, Decimal("0.5")]}}, 100]}
+
+
+class PaymentSummaryRepository:
+    """Counts and amount sums of payments per status, currency and due month.
+
+    Rows are kept current with $inc deltas on every write and can be recomputed from
+    the payments collection with rebuild().
+    """
+
+    def __init__(self):
+        collections = settings.config.mongodb.collections
+        self.collection_summary = MongoDB.db[collections.payment_summary]
+        self.collection_payment = MongoDB.db[collections.payments]
+
+    async def apply(self, removed: Iterable[Optional[dict]] = (), added: Iterable[Optional[dict]] = ()) -> None:
+        """Move the rollup from the `removed` pre-images to the `added` post-images"""
+        await self.apply_deltas(summary_deltas(removed, added))
+
+    async def apply_deltas(self, deltas: Dict[SummaryKey, list]) -> None:
+        if not deltas:
+            return
+        operations = [
+            UpdateOne(
+                {"_id": summary_id(key)},
+                {
+                    "$setOnInsert": {"status": key[0], "currency": key[1], "due_month": key[2]},
+                    "$inc": {"count": count, "due_amount": due_amount, "total_due": total_due}
+                },
+                upsert=True
+            )
+            for key, (count, due_amount, total_due) in deltas.items()
+        ]
+        try:
+            await self.collection_summary.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            # The payment write already happened; the next rebuild corrects the rollup
+            logger.error(f"Failed to update the payment summary: {e}")
+
+    async def get_summary(self, status: Optional[str] = None, currency: Optional[str] = None) -> List[dict]:
+        query = {"count": {"$gt": 0}}
+        if status is not None:
+            query["status"] = status
+        if currency is not None:
+            query["currency"] = currency
+        cursor = self.collection_summary.find(query, {"_id": 0})
+        return await cursor.sort([("status", ASCENDING), ("currency", ASCENDING), ("due_month", ASCENDING)]).to_list(length=None)
+
+    async def is_empty(self) -> bool:
+        return await self.collection_summary.find_one({}, {"_id": 1}) is None
+
+    @staticmethod
+    def group_stage() -> dict:
+        """Groups payments into rollup rows, keyed by status, currency and due month"""
+        return {
+            "$group": {
+                "_id": {
+                    "status": {"$ifNull": ["$payee_payment_status", ""]},
+                    "currency": {"$ifNull": ["$currency", ""]},
+                    "due_month": month_expression("$payee_due_date")
+                },
+                "count": {"$sum": 1},
+                "due_amount": {"$sum": {"$toDecimal": {"$ifNull": ["$due_amount", 0]}}},
+                "total_due": {"$sum": total_due_expression()}
+            }
+        }
+
+    async def totals(self, query: dict) -> Dict[SummaryKey, list]:
+        """[count, due_amount, total_due] per rollup row of the payments matching `query`"""
+        pipeline = [{"$match": {**query, "is_deleted": {"$ne": True}}}, self.group_stage()]
+        return {
+            (row["_id"]["status"], row["_id"]["currency"], row["_id"]["due_month"]):
+                [row["count"], to_decimal(row["due_amount"]), to_decimal(row["total_due"])]
+            async for row in self.collection_payment.aggregate(pipeline, allowDiskUse=True)
+        }
+
+    @classmethod
+    def rebuild_pipeline(cls, target: str) -> List[dict]:
+        return [
+            {"$match": {"is_deleted": {"$ne": True}}},
+            cls.group_stage(),
+            {
+                "$project": {
+                    "_id": {"$concat": ["$_id.status", "|", "$_id.currency", "|", "$_id.due_month"]},
+                    "status": "$_id.status",
+                    "currency": "$_id.currency",
+                    "due_month": "$_id.due_month",
+                    "count": 1,
+                    "due_amount": 1,
+                    "total_due": 1
+                }
+            },
+            # Replaces the rollup collection atomically once the pipeline has finished
+            {"$out": target}
+        ]
+
+    async def rebuild(self) -> int:
+        """Recompute every rollup row on the server; returns the number of rows.
+
+        A write that lands while the pipeline runs may end up counted twice or not at all,
+        so this is kept for an empty or drifted rollup and after CSV syncs that tombstone.
+        """
+        pipeline = self.rebuild_pipeline(self.collection_summary.name)
+        await self.collection_payment.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        return await self.collection_summary.count_documents({})
@@ -0,0 +1,194 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from prometheus_client import Counter, Histogram
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_repository import INTERNAL_FIELDS_PROJECTION, PaymentRepository
+from app.db.repositories.payment_summary_repository import SUMMARY_FIELDS
+from app.utils.payee_search import SEARCH_PROJECTION
+
+logger = Logger.get_logger(__name__)
+
+COALESCED_BATCH_SIZE = Histogram(
+    "payment_update_batch_size",
+    "Updates written per coalesced bulk_write",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+COALESCED_CONFLICTS = Counter(
+    "payment_update_conflicts_total",
+    "Coalesced updates retried one by one because the payment changed between read and write"
+)
+
+# Fields never compared in the write guard: derived from guarded name fields, or bookkeeping
+UNGUARDED_FIELDS = {*SEARCH_PROJECTION, *INTERNAL_FIELDS_PROJECTION, "_id"}
+MISSING = object()
+
+
+class PendingUpdates:
+    """$set documents for one payment in arrival order, and the caller waiting on each"""
+    __slots__ = ("updates", "futures")
+
+    def __init__(self):
+        self.updates: List[dict] = []
+        self.futures: List[asyncio.Future] = []
+
+
+def public_fields(document: dict) -> dict:
+    return {field: value for field, value in document.items() if field not in INTERNAL_FIELDS_PROJECTION}
+
+
+class UpdateCoalescer:
+    """Batches single-payment $set updates into one unordered bulk_write.
+
+    Updates wait up to `window_seconds` (or until `max_batch` payments are pending). A
+    flush reads the batch's current documents in one query, merges each payment's updates
+    in arrival order and writes them in one bulk_write. Every caller gets the document as
+    it was just before its own update, exactly as find_one_and_update would have returned
+    it, so the summary deltas and responses built from it are unchanged.
+
+    Each write is guarded on the summary fields and changed fields it read. If another
+    writer got in between, the guard misses and that payment's updates are replayed one
+    by one through PaymentRepository.update_payment.
+    """
+
+    def __init__(self, window_seconds: float, max_batch: int, enabled: bool = True):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self.pending: Dict[str, PendingUpdates] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Flushes in progress, referenced so they are not garbage collected mid-write
+        self._flushes: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_config(cls) -> "UpdateCoalescer":
+        config = settings.config.update_coalescing
+        return cls(config.window_ms / 1000, config.max_batch, enabled=config.enabled)
+
+    async def update(self, payment_id: str, update_data: dict) -> Optional[dict]:
+        """Apply update_data to the payment; returns its document before the update, or None if not found"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self.pending.get(payment_id)
+        if pending is None:
+            pending = self.pending[payment_id] = PendingUpdates()
+        pending.updates.append(update_data)
+        pending.futures.append(future)
+        if len(self.pending) >= self.max_batch:
+            self.flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self.flush_now)
+        return await future
+
+    def flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        task = asyncio.ensure_future(self.flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, batch: Dict[str, PendingUpdates]) -> None:
+        try:
+            await self.write(batch)
+        except Exception as e:
+            logger.error(f"Coalesced update of {len(batch)} payments failed: {e}")
+            for pending in batch.values():
+                for future in pending.futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def resolve(pending: PendingUpdates, current: Optional[dict]) -> None:
+        """Hand each caller the document as it stood before its own update"""
+        previous = public_fields(current) if current is not None else None
+        for update_data, future in zip(pending.updates, pending.futures):
+            if not future.done():
+                future.set_result(previous)
+            if previous is not None:
+                previous = {**previous, **public_fields(update_data)}
+
+    async def write(self, batch: Dict[str, PendingUpdates]) -> None:
+        collection = MongoDB.db[settings.config.mongodb.collections.payments]
+        stored = {
+            document["_id"]: document
+            async for document in collection.find({"_id": {"$in": list(batch)}, "is_deleted": {"$ne": True}})
+        }
+
+        operations: List[UpdateOne] = []
+        written: List[str] = []
+        merged_sets: Dict[str, dict] = {}
+        for payment_id, pending in batch.items():
+            current = stored.get(payment_id)
+            merged = {}
+            for update_data in pending.updates:
+                merged.update(update_data)
+            changed = [field for field, value in merged.items() if current is not None and current.get(field, MISSING) != value]
+            if current is None or not changed:
+                # Missing payments and updates that change nothing need no write
+                self.resolve(pending, current)
+                continue
+            # Pin the values this flush read, so the pre-images handed out are the ones the write applied to
+            guard = {"_id": payment_id, "is_deleted": {"$ne": True}}
+            for field in (*SUMMARY_FIELDS, *changed):
+                if field not in UNGUARDED_FIELDS:
+                    guard[field] = current.get(field)
+            operations.append(UpdateOne(guard, {"$set": merged}))
+            written.append(payment_id)
+            merged_sets[payment_id] = merged
+        if not operations:
+            return
+
+        COALESCED_BATCH_SIZE.observe(len(operations))
+        failed: Dict[str, Exception] = {}
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            matched = result.matched_count
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                failed[written[error["index"]]] = WriteError(error["errmsg"], error["code"], error)
+            matched = e.details["nMatched"]
+
+        for payment_id, error in failed.items():
+            for future in batch[payment_id].futures:
+                if not future.done():
+                    future.set_exception(error)
+        applied = [payment_id for payment_id in written if payment_id not in failed]
+        if matched < len(applied):
+            # Some guards missed; find out which by checking what the documents hold now
+            now = {
+                document["_id"]: document
+                async for document in collection.find({"_id": {"$in": applied}})
+            }
+            conflicted = [
+                payment_id for payment_id in applied
+                if any(now.get(payment_id, {}).get(field, MISSING) != value for field, value in merged_sets[payment_id].items())
+            ]
+            COALESCED_CONFLICTS.inc(len(conflicted))
+            await asyncio.gather(*(self.replay(batch[payment_id], payment_id) for payment_id in conflicted))
+            applied = [payment_id for payment_id in applied if payment_id not in conflicted]
+
+        for payment_id in applied:
+            self.resolve(batch[payment_id], stored[payment_id])
+
+    @staticmethod
+    async def replay(pending: PendingUpdates, payment_id: str) -> None:
+        """Apply one payment's updates in order as separate atomic updates"""
+        repository = PaymentRepository()
+        for update_data, future in zip(pending.updates, pending.futures):
+            try:
+                previous = await repository.update_payment(payment_id, update_data, ReturnDocument.BEFORE)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(previous)
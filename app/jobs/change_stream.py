@@ -0,0 +1,103 @@
+import asyncio
+from typing import Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+from app.services.payment_service import PaymentService
+from app.utils.event_hub import RESET
+
+logger = Logger.get_logger(__name__)
+
+# Server error codes: change streams need a replica set; the resume token is older than the oplog
+NOT_A_REPLICA_SET = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+RETRY_SECONDS = 1.0
+
+
+class ChangeStreamFeed:
+    """Feeds PaymentService.event_hub from a change stream on the payments collection.
+
+    Every worker then streams every write, including those made by other workers, bulk
+    jobs and CSV syncs, instead of only its own. Without a replica set the stream cannot
+    be opened and write paths keep publishing locally.
+    """
+    task: Optional[asyncio.Task] = None
+    resume_token: Optional[dict] = None
+
+    @classmethod
+    async def start(cls):
+        if settings.config.events.source == "change_stream" and cls.task is None:
+            cls.task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        if cls.task:
+            cls.task.cancel()
+            try:
+                await cls.task
+            except asyncio.CancelledError:
+                pass
+            cls.task = None
+        PaymentService.event_hub.local = True
+
+    @classmethod
+    async def _run(cls):
+        hub = PaymentService.event_hub
+        collection = MongoDB.db[settings.config.mongodb.collections.payments]
+        options = {"full_document": "updateLookup"}
+        if settings.config.events.change_stream_pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        while True:
+            try:
+                async with collection.watch(resume_after=cls.resume_token, **options) as stream:
+                    hub.local = False
+                    logger.info("Payment events are fed by a change stream")
+                    async for change in stream:
+                        cls.resume_token = stream.resume_token
+                        cls.publish(change)
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET:
+                    logger.warning(
+                        "Change streams need a replica set; payment events stay local to each worker, "
+                        "so with several workers a stream misses the writes made by the others"
+                    )
+                    hub.local = True
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Changes since the token are gone; streams refetch and the feed starts from now
+                    cls.resume_token = None
+                    hub.publish(RESET, detail={"reason": "change_stream_history_lost"})
+                else:
+                    logger.error(f"Payment change stream failed: {e}")
+            except PyMongoError as e:
+                logger.error(f"Payment change stream failed: {e}")
+            await asyncio.sleep(RETRY_SECONDS)
+
+    @staticmethod
+    def publish(change: dict) -> None:
+        hub = PaymentService.event_hub
+        operation = change["operationType"]
+        payment_id = change.get("documentKey", {}).get("_id")
+        previous = change.get("fullDocumentBeforeChange")
+        if operation == "insert":
+            PaymentService.publish_to_hub(hub, None, change["fullDocument"], payment_id)
+        elif operation in ("update", "replace"):
+            current = change.get("fullDocument")
+            if current is None:
+                # Deleted before the lookup; its delete event follows
+                return
+            status_changed = None
+            if previous is None:
+                # Without pre-images only the update description tells whether the status moved
+                status_changed = "payee_payment_status" in change.get("updateDescription", {}).get("updatedFields", {})
+            PaymentService.publish_to_hub(hub, previous, current, payment_id, status_changed)
+        elif operation == "delete":
+            PaymentService.publish_to_hub(hub, previous, None, payment_id)
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            hub.publish(RESET, detail={"reason": operation})
+            if operation == "invalidate":
+                # The stream has ended and cannot be resumed past this point
+                ChangeStreamFeed.resume_token = None
@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.locks import DistributedLock, LockLost
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository, status_move_deltas
+from app.jobs.summary_rebuild import run_summary_rebuild
+from app.models.payment_status import PaymentStatus
+from app.services.payment_service import PaymentService
+from app.utils.event_hub import RESET
+
+logger = Logger.get_logger(__name__)
+
+LOCK_NAME = "payment_status_refresh"
+
+
+def status_transitions(now: datetime) -> Dict[PaymentStatus, dict]:
+    """update_many filters that move open payments into the status their due date implies today"""
+    start_of_today = datetime.combine(now.astimezone(timezone.utc).date(), time.min, timezone.utc)
+    start_of_tomorrow = start_of_today + timedelta(days=1)
+    return {
+        PaymentStatus.OVERDUE: {
+            "payee_payment_status": {"$in": [PaymentStatus.PENDING.value, PaymentStatus.DUE_NOW.value]},
+            "payee_due_date": {"$lt": start_of_today},
+        },
+        PaymentStatus.DUE_NOW: {
+            "payee_payment_status": {"$in": [PaymentStatus.PENDING.value, PaymentStatus.OVERDUE.value]},
+            "payee_due_date": {"$gte": start_of_today, "$lt": start_of_tomorrow},
+        },
+        PaymentStatus.PENDING: {
+            "payee_payment_status": {"$in": [PaymentStatus.DUE_NOW.value, PaymentStatus.OVERDUE.value]},
+            "payee_due_date": {"$gte": start_of_tomorrow},
+        },
+    }
+
+
+async def refresh_payment_statuses(
+    now: Optional[datetime] = None,
+    summary: Optional[PaymentSummaryRepository] = None,
+    lock: Optional[DistributedLock] = None
+) -> Dict[str, int]:
+    """Move payments between pending, due_now and overdue; running it twice is a no-op.
+
+    With `summary`, the payments about to move are totalled per rollup row first and the
+    rollup is moved by those deltas, alongside the live $inc deltas of other writes. A
+    payment changed by another write between the two steps can leave the rollup off;
+    `python -m app.jobs.summary_rebuild` repairs it.
+
+    With `lock`, its lease is renewed before each transition, and LockLost stops the run
+    once another worker has taken it over, so the two never move the rollup twice.
+    """
+    now = now or datetime.now(timezone.utc)
+    collection = MongoDB.db[settings.config.mongodb.collections.payments]
+    moved = {}
+    for status, query in status_transitions(now).items():
+        if lock:
+            await lock.renew()
+        totals = await summary.totals(query) if summary else {}
+        result = await collection.update_many(query, {"$set": {"payee_payment_status": status.value}})
+        moved[status.value] = result.modified_count
+        if summary:
+            await summary.apply_deltas(status_move_deltas(totals, status.value))
+    return moved
+
+
+async def run_status_refresh(now: Optional[datetime] = None) -> Optional[Dict[str, int]]:
+    """Run the refresh under a distributed lock; returns None when another worker holds it"""
+    job_config = settings.config.jobs.status_refresh
+    lock = DistributedLock(LOCK_NAME, ttl_seconds=job_config.lock_ttl_seconds)
+    if not await lock.acquire():
+        logger.info("Payment status refresh already running elsewhere, skipping")
+        return None
+    try:
+        summary = PaymentSummaryRepository()
+        # Deltas only make sense on top of a built rollup
+        rebuild = await summary.is_empty()
+        try:
+            moved = await refresh_payment_statuses(now, None if rebuild else summary, lock)
+        except LockLost:
+            # Some payments may have moved already, and the new holder finds nothing left to move
+            await PaymentService.clear_caches()
+            raise
+        if any(moved.values()):
+            await PaymentService.clear_caches()
+            # Too many payments move to announce one by one; open event streams refetch instead
+            if PaymentService.event_hub.local:
+                PaymentService.event_hub.publish(RESET, detail={"reason": "status_refresh"})
+        if rebuild:
+            await lock.renew()
+            await run_summary_rebuild()
+        logger.info(f"Payment status refresh moved {moved}")
+        return moved
+    finally:
+        await lock.release()
+
+
+def seconds_until_next_run(now: datetime, offset_seconds: float) -> float:
+    tomorrow = datetime.combine(now.astimezone(timezone.utc).date() + timedelta(days=1), time.min, timezone.utc)
+    return max(0.0, (tomorrow - now).total_seconds() + offset_seconds)
+
+
+class StatusRefreshScheduler:
+    task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def start(cls):
+        if settings.config.jobs.status_refresh.enabled and cls.task is None:
+            cls.task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        if cls.task:
+            cls.task.cancel()
+            try:
+                await cls.task
+            except asyncio.CancelledError:
+                pass
+            cls.task = None
+
+    @classmethod
+    async def _run(cls):
+        job_config = settings.config.jobs.status_refresh
+        run_now = job_config.run_on_startup
+        while True:
+            if run_now:
+                try:
+                    await run_status_refresh()
+                except Exception as e:
+                    logger.error(f"Payment status refresh failed: {e}")
+            await asyncio.sleep(seconds_until_next_run(datetime.now(timezone.utc), job_config.offset_seconds))
+            run_now = True
+
+
+async def main() -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        await run_status_refresh()
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Move payments between pending, due_now and overdue").parse_args()
+    asyncio.run(main())
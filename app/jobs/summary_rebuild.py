@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.locks import DistributedLock
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository
+
+logger = Logger.get_logger(__name__)
+
+LOCK_NAME = "payment_summary_rebuild"
+
+
+async def run_summary_rebuild() -> Optional[int]:
+    """Recompute the payment summary under a distributed lock; returns None when another worker holds it"""
+    job_config = settings.config.jobs.summary_rebuild
+    lock = DistributedLock(LOCK_NAME, ttl_seconds=job_config.lock_ttl_seconds)
+    if not await lock.acquire():
+        logger.info("Payment summary rebuild already running elsewhere, skipping")
+        return None
+    try:
+        rows = await PaymentSummaryRepository().rebuild()
+        logger.info(f"Payment summary rebuilt: {rows} rows")
+        return rows
+    finally:
+        await lock.release()
+
+
+async def ensure_payment_summary():
+    """Build the summary on startup when it has never been built, e.g. right after upgrading"""
+    if not settings.config.jobs.summary_rebuild.build_if_empty:
+        return
+    try:
+        repository = PaymentSummaryRepository()
+        if await repository.is_empty() and await repository.collection_payment.find_one({}, {"_id": 1}):
+            await run_summary_rebuild()
+    except Exception as e:
+        logger.error(f"Payment summary build failed: {e}")
+
+
+async def main() -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        await run_summary_rebuild()
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Recompute the payment summary rollup from the payments collection").parse_args()
+    asyncio.run(main())
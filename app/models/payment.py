@@ -1,18 +1,83 @@
-from datetime import datetime, date
-from typing import Optional
+from datetime import datetime, date, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Optional
 
+from typing_extensions import Annotated
 from bson import ObjectId
+from bson.decimal128 import Decimal128
 from app.models.payment_status import PaymentStatus
-from pydantic import BaseModel, Field, EmailStr, field_validator
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, EmailStr, PlainSerializer, TypeAdapter, field_validator
 from enum import Enum
 
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# Stored as BSON dates and Decimal128 (see app/db/codecs.py)
+DATE_FIELDS = ("payee_added_date_utc", "payee_due_date")
+AMOUNT_FIELDS = ("discount_percent", "tax_percent", "due_amount")
+# Totals are reported to the cent
+CENT = Decimal("0.01")
+
+
+def parse_utc_datetime(value: Any) -> datetime:
+    """UTC datetime, to the second, from a datetime, epoch seconds or an ISO 8601 string"""
+    if isinstance(value, datetime):
+        moment = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    elif isinstance(value, date):
+        moment = datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        moment = datetime.fromtimestamp(value, timezone.utc)
+    elif isinstance(value, str) and value.strip():
+        text = value.strip()
+        if text.lstrip("-").isdigit():
+            # payee_added_date_utc arrives as epoch seconds in the CSV
+            moment = datetime.fromtimestamp(int(text), timezone.utc)
+        else:
+            moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            moment = moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    else:
+        raise ValueError(f"Invalid date: {value!r}")
+    return datetime.fromtimestamp(int(moment.timestamp()), timezone.utc)
+
+
+def format_utc_datetime(value: datetime) -> str:
+    return parse_utc_datetime(value).strftime(DATE_FORMAT)
+
+
+def to_decimal(value: Any) -> Any:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, float):
+        # repr gives the shortest exact form (129.07, not 129.069999...)
+        return Decimal(repr(value))
+    return value
+
+
+def compute_total_due(payment: dict) -> Decimal:
+    """due_amount after discount and tax, rounded half up to the cent"""
+    # to_decimal also covers float amounts not yet migrated
+    discount = to_decimal(payment.get("discount_percent") or Decimal(0)) / 100
+    tax = to_decimal(payment.get("tax_percent") or Decimal(0)) / 100
+    due_amount = to_decimal(payment.get("due_amount") or Decimal(0))
+    return (due_amount * (1 - discount) * (1 + tax)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+# The API keeps its wire format: dates as '%Y-%m-%dT%H:%M:%SZ' strings, amounts as JSON numbers
+UTCDateTime = Annotated[
+    datetime,
+    BeforeValidator(parse_utc_datetime),
+    PlainSerializer(format_utc_datetime, return_type=str, when_used="json")
+]
+Amount = Annotated[Decimal, BeforeValidator(to_decimal), PlainSerializer(float, return_type=float, when_used="json")]
+Percent = Annotated[Amount, Field(ge=0, le=100)]
+NonNegativeAmount = Annotated[Amount, Field(ge=0)]
+
+
 class Payment(BaseModel):
     id: Optional[str] = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     payee_first_name: str
     payee_last_name: str
     payee_payment_status: PaymentStatus = Field(default=PaymentStatus.PENDING)
-    payee_added_date_utc: str = Field(default_factory=lambda: datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'))
-    payee_due_date: str = Field(default_factory=lambda: datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'))
+    payee_added_date_utc: UTCDateTime = Field(default_factory=lambda: parse_utc_datetime(datetime.now(timezone.utc)))
+    payee_due_date: UTCDateTime = Field(default_factory=lambda: parse_utc_datetime(datetime.now(timezone.utc)))
     payee_address_line_1: str
     payee_address_line_2: Optional[str] = None
     payee_city: str
@@ -22,11 +87,24 @@ class Payment(BaseModel):
     payee_phone_number: str
     payee_email: EmailStr
     currency: str
-    discount_percent: Optional[float] = Field(None, ge=0, le=100)
-    tax_percent: Optional[float] = Field(None, ge=0, le=100)
-    due_amount: float = Field(default=0, ge=0) 
-    total_due: Optional[float] = None
+    discount_percent: Optional[Percent] = None
+    tax_percent: Optional[Percent] = None
+    due_amount: NonNegativeAmount = Decimal(0)
+    total_due: Optional[Amount] = None
     evidence_file_url: Optional[str] = None
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+
+# Validators for the typed fields of a partial update
+TYPED_FIELD_ADAPTERS = {
+    field: TypeAdapter(field_type, config=ConfigDict(title=field))
+    for field, field_type in (
+        ("payee_added_date_utc", UTCDateTime),
+        ("payee_due_date", UTCDateTime),
+        ("discount_percent", Optional[Percent]),
+        ("tax_percent", Optional[Percent]),
+        ("due_amount", NonNegativeAmount),
+    )
+}
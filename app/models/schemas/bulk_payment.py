@@ -0,0 +1,43 @@
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class BulkOperationType(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class BulkOperation(BaseModel):
+    op: BulkOperationType
+    # Required for update and delete
+    id: Optional[str] = None
+    # Payment fields for create, fields to set for update
+    data: Optional[dict] = None
+
+
+class BulkItemStatus(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: BulkItemStatus
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkPaymentResponse(BaseModel):
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    # True when the request held more than bulk.max_items items and the rest were not read
+    truncated: bool = False
+    items: List[BulkItemResult] = []
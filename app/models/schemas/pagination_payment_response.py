@@ -1,14 +1,25 @@
-from typing import  List
+from typing import  List, Optional
 
 from pydantic import BaseModel
 
 from app.models.payment import Payment
+from app.models.schemas.partial_payment import PartialPayment
 
 class PaginatedPaymentResponse(BaseModel):
     items: List[Payment]
     total: int
-    page: int
+    # True when total comes from collection metadata instead of an exact count
+    total_is_estimate: bool = False
+    # None when the page was requested by cursor rather than by number
+    page: Optional[int]
     page_size: int
     total_pages: int
     has_next: bool
     has_previous: bool
+    # Pass back as `cursor` to fetch the following page with an index seek
+    next_cursor: Optional[str] = None
+
+
+class PaginatedPartialPaymentResponse(PaginatedPaymentResponse):
+    # Only the fields asked for with ?fields=, plus _id
+    items: List[PartialPayment]
@@ -0,0 +1,15 @@
+from typing import Optional
+
+from pydantic import ConfigDict, Field, create_model
+
+from app.models.payment import Payment
+
+# A Payment returned with ?fields=: the same fields and wire format, each one optional
+PartialPayment = create_model(
+    "PartialPayment",
+    __config__=ConfigDict(populate_by_name=True),
+    **{
+        name: (Optional[field.rebuild_annotation()], Field(None, alias=field.alias))
+        for name, field in Payment.model_fields.items()
+    }
+)
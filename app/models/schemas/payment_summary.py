@@ -0,0 +1,28 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from app.models.payment import Amount
+
+
+class PaymentSummaryGroup(BaseModel):
+    status: str
+    currency: str
+    # "YYYY-MM" of payee_due_date (UTC)
+    due_month: str
+    count: int
+    due_amount: Amount
+    total_due: Amount
+
+
+class CurrencyTotal(BaseModel):
+    currency: str
+    count: int
+    due_amount: Amount
+    total_due: Amount
+
+
+class PaymentSummaryResponse(BaseModel):
+    groups: List[PaymentSummaryGroup]
+    # Amounts are only summed within a currency
+    totals: List[CurrencyTotal]
@@ -0,0 +1,91 @@
+"""Seed or re-sync the payments collection from the CSV file.
+
+Runs once per deploy (the release phase in the Procfile) instead of in every web worker,
+so workers start without pandas or a file load in their way. A distributed lock keeps
+concurrent runs from racing the empty-collection check and inserting the file twice.
+
+    python -m app.seed [file_path] [--sync] [--tombstone]
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.indexes import reconcile_indexes
+from app.db.locks import DistributedLock
+from app.db.mongodb import MongoDB
+
+logger = Logger.get_logger(__name__)
+
+LOCK_NAME = "csv_seed"
+
+
+async def renew_lease(lock: DistributedLock) -> None:
+    """Keep the lease alive; returns once it is lost, to someone else or by running out"""
+    expires_at = time.monotonic() + lock.ttl_seconds
+    while True:
+        await asyncio.sleep(lock.ttl_seconds / 3)
+        try:
+            renewed = await lock.acquire()
+        except PyMongoError as e:
+            if time.monotonic() < expires_at:
+                logger.warning(f"Could not renew the CSV seed lease, retrying: {e}")
+                continue
+            logger.error(f"CSV seed lease expired while it could not be renewed: {e}")
+            return
+        if not renewed:
+            logger.error("CSV seed lease was taken over by another run")
+            return
+        expires_at = time.monotonic() + lock.ttl_seconds
+
+
+async def run_seed(file_path: Optional[str] = None, sync: bool = False, tombstone: bool = False):
+    """Load the file under the seed lock; returns None when it is held elsewhere or nothing was loaded"""
+    lock = DistributedLock(LOCK_NAME, ttl_seconds=settings.config.data.seed_lock_ttl_seconds)
+    if not await lock.acquire():
+        logger.info("CSV seed already running elsewhere, skipping")
+        return None
+    # Imported here: pandas is only needed by the loader, never by the web app
+    from app.utils.csv_load_service import load_and_normalize_csv_data
+    load = asyncio.create_task(load_and_normalize_csv_data(
+        file_path or settings.config.data.file_path,
+        settings.config.mongodb.collections.payments,
+        sync,
+        tombstone
+    ))
+    renewal = asyncio.create_task(renew_lease(lock))
+    try:
+        await asyncio.wait({load, renewal}, return_when=asyncio.FIRST_COMPLETED)
+        if not load.done():
+            # Another run may hold the lock now; loading on would insert the file twice
+            raise RuntimeError("Lost the CSV seed lock, stopped loading")
+        return load.result()
+    finally:
+        for task in (load, renewal):
+            task.cancel()
+        await asyncio.gather(load, renewal, return_exceptions=True)
+        await lock.release()
+
+
+async def main(file_path: Optional[str], sync: bool, tombstone: bool) -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        # Indexes first, so the natural key lookups of a sync and the first queries have them
+        await reconcile_indexes()
+        await run_seed(file_path, sync, tombstone)
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed payments from the CSV file, once across all processes")
+    parser.add_argument("file_path", nargs="?", help="defaults to data.file_path")
+    parser.add_argument("--sync", action="store_true", help="apply the file as a delta against existing data")
+    parser.add_argument("--tombstone", action="store_true", help="with --sync, flag rows missing from the file")
+    args = parser.parse_args()
+    asyncio.run(main(args.file_path, args.sync, args.tombstone))
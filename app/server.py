@@ -0,0 +1,348 @@
+"""Pre-fork server: python -m app.server [--workers N] [--port PORT]
+
+The master binds the listening socket and forks server.workers uvicorn workers that
+accept on it. The master never imports the application: each worker imports it after the
+fork, so every worker runs its own startup and opens its own Motor client.
+
+Signals to the master:
+  SIGHUP            re-read the config and replace workers one at a time, each only after
+                    its replacement is ready
+  SIGTERM, SIGINT   stop accepting, let workers finish in-flight requests, exit
+
+Workers exit on their own after server.max_requests requests or past server.max_memory_mb
+of resident memory, and the master starts a replacement.
+"""
+import argparse
+import os
+import random
+import resource
+import select
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Workers write their metrics to files here so /metrics covers every process. It must be
+# set before prometheus_client is first imported, which importing app.core does.
+OWN_METRICS_DIR = "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+if OWN_METRICS_DIR:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="pms-metrics-")
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from app.core.config import settings
+from app.core.logging import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Master loop wake-up interval; children and signals also wake it
+POLL_SECONDS = 1.0
+# Workers check their memory every this many uvicorn ticks (0.1s each)
+MEMORY_CHECK_TICKS = 50
+# Delay before replacing a worker that exited before becoming ready, doubled up to the cap
+BOOT_BACKOFF_SECONDS = 1.0
+MAX_BOOT_BACKOFF_SECONDS = 30.0
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT)
+
+
+def worker_count(configured: int) -> int:
+    if configured > 0:
+        return configured
+    # CPUs this process may run on, which can be fewer than the machine has
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def exit_code(status: int) -> int:
+    """The exit code of a waitpid status, negative for the signal that killed the process"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Peak rather than current, and in kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn.Server that tells the master when it is ready and recycles itself on memory growth"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int, max_memory_bytes: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+        self.max_memory_bytes = max_memory_bytes
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+    async def on_tick(self, counter: int) -> bool:
+        if await super().on_tick(counter):
+            return True
+        if self.max_memory_bytes and counter % MEMORY_CHECK_TICKS == 0:
+            resident = resident_memory_bytes()
+            if resident > self.max_memory_bytes:
+                logger.info(f"Worker {os.getpid()} uses {resident >> 20}MB, over the limit; recycling")
+                return True
+        return False
+
+
+def run_worker(app: str, sock: socket.socket, ready_fd: int, max_requests: int) -> int:
+    """Serve the application on the inherited socket until stopped or recycled"""
+    for sig in (*STOP_SIGNALS, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    # Terminal hangups and rolling restarts are the master's business
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.set_wakeup_fd(-1)
+    server_config = settings.config.server
+    config = uvicorn.Config(
+        app,
+        timeout_graceful_shutdown=server_config.graceful_timeout_seconds,
+        limit_max_requests=max_requests or None,
+    )
+    server = WorkerServer(config, ready_fd, server_config.max_memory_mb * 1024 * 1024)
+    server.run(sockets=[sock])
+    return 0 if server.started else 1
+
+
+class Worker:
+    __slots__ = ("pid", "ready_fd", "ready", "started_at")
+
+    def __init__(self, pid: int, ready_fd: int):
+        self.pid = pid
+        self.ready_fd = ready_fd
+        self.ready = False
+        self.started_at = time.monotonic()
+
+
+class Master:
+    """Keeps `workers` forked workers running on one listening socket"""
+
+    def __init__(self, app: str, sock: socket.socket, workers: Optional[int] = None):
+        self.app = app
+        self.sock = sock
+        # From the command line; otherwise server.workers, re-read on SIGHUP
+        self.workers_override = workers
+        self.target = self.worker_target()
+        self.workers: Dict[int, Worker] = {}
+        # Workers being replaced or stopped, which are not started again when they exit
+        self.retiring: Dict[int, Worker] = {}
+        self.stopping = False
+        self.restart_requested = False
+        self.boot_backoff = 0.0
+        self.next_spawn_at = 0.0
+        self.signal_read, self.signal_write = os.pipe()
+
+    def worker_target(self) -> int:
+        if self.workers_override is not None:
+            return worker_count(self.workers_override)
+        return worker_count(settings.config.server.workers)
+
+    def check_config(self) -> None:
+        if self.target > 1 and settings.config.events.source == "local":
+            logger.warning(
+                f"events.source is local with {self.target} workers: each /payments/stream only sees "
+                "the writes of the worker it is connected to; use change_stream with a replica set"
+            )
+
+    def install_signals(self) -> None:
+        for fd in (self.signal_read, self.signal_write):
+            os.set_blocking(fd, False)
+        # Signal numbers are written to the pipe, which wakes the select in wait()
+        signal.set_wakeup_fd(self.signal_write, warn_on_full_buffer=False)
+        for sig in (*STOP_SIGNALS, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(sig, lambda signum, frame: None)
+
+    def spawn(self) -> Worker:
+        server_config = settings.config.server
+        max_requests = server_config.max_requests
+        if max_requests:
+            # Jitter keeps workers started together from recycling together
+            max_requests += random.randint(0, server_config.max_requests_jitter)
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            os.close(self.signal_read)
+            os.close(self.signal_write)
+            code = 1
+            try:
+                code = run_worker(self.app, self.sock, ready_write, max_requests)
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} failed")
+            finally:
+                Logger.stop_logging()
+                # Skip the master's atexit handlers and inherited buffers
+                os._exit(code)
+        os.close(ready_write)
+        worker = Worker(pid, ready_read)
+        self.workers[pid] = worker
+        logger.info(f"Started worker {pid}")
+        return worker
+
+    def spawn_missing(self) -> None:
+        while not self.stopping and len(self.workers) < self.target and time.monotonic() >= self.next_spawn_at:
+            self.spawn()
+        for worker in list(self.workers.values())[self.target:]:
+            logger.info(f"Stopping worker {worker.pid}, {self.target} workers are configured")
+            self.retire(worker)
+
+    def retire(self, worker: Worker) -> None:
+        if self.workers.pop(worker.pid, None) is None:
+            # Already exited and reaped
+            return
+        self.retiring[worker.pid] = worker
+        if worker.ready_fd != -1:
+            os.close(worker.ready_fd)
+            worker.ready_fd = -1
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def wait(self, timeout: float) -> None:
+        """Sleep until a signal, a worker's ready message or the timeout; handle what arrived"""
+        pending = {worker.ready_fd: worker for worker in self.workers.values() if worker.ready_fd != -1}
+        readable, _, _ = select.select([self.signal_read, *pending], [], [], timeout)
+        for fd in readable:
+            if fd == self.signal_read:
+                self.handle_signals()
+            else:
+                worker = pending[fd]
+                worker.ready = os.read(fd, 1) == b"1"
+                os.close(fd)
+                worker.ready_fd = -1
+                if worker.ready:
+                    self.boot_backoff = 0.0
+                    logger.info(f"Worker {worker.pid} ready in {time.monotonic() - worker.started_at:.1f}s")
+        self.reap()
+        Logger.rotate_files()
+
+    def handle_signals(self) -> None:
+        try:
+            signums = os.read(self.signal_read, 1024)
+        except BlockingIOError:
+            return
+        for signum in signums:
+            if signum in STOP_SIGNALS:
+                self.stopping = True
+            elif signum == signal.SIGHUP:
+                self.restart_requested = True
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            multiprocess.mark_process_dead(pid)
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.ready_fd != -1:
+                os.close(worker.ready_fd)
+            code = exit_code(status)
+            if worker.ready:
+                logger.info(f"Worker {pid} exited with {code}; replacing it")
+            else:
+                # Failed during startup (database unreachable, bad config): back off rather than spin
+                self.boot_backoff = min(max(self.boot_backoff * 2, BOOT_BACKOFF_SECONDS), MAX_BOOT_BACKOFF_SECONDS)
+                self.next_spawn_at = time.monotonic() + self.boot_backoff
+                logger.error(f"Worker {pid} exited with {code} before it was ready; retrying in {self.boot_backoff:.0f}s")
+
+    def rolling_restart(self) -> None:
+        self.restart_requested = False
+        settings.reload_config(force=True)
+        self.target = self.worker_target()
+        self.check_config()
+        logger.info(f"Rolling restart of {len(self.workers)} workers")
+        for old in list(self.workers.values()):
+            new = self.spawn()
+            deadline = time.monotonic() + settings.config.server.ready_timeout_seconds
+            while not new.ready and new.pid in self.workers and not self.stopping and time.monotonic() < deadline:
+                self.wait(min(POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+            if not new.ready:
+                logger.error(f"Worker {new.pid} did not become ready; keeping the remaining old workers")
+                if new.pid in self.workers:
+                    self.retire(new)
+                return
+            self.retire(old)
+        self.spawn_missing()
+
+    def stop(self) -> None:
+        for worker in list(self.workers.values()):
+            self.retire(worker)
+        deadline = time.monotonic() + settings.config.server.graceful_timeout_seconds + 5
+        while self.retiring and time.monotonic() < deadline:
+            self.wait(POLL_SECONDS)
+        for pid in self.retiring:
+            logger.warning(f"Worker {pid} did not stop in time; killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        self.install_signals()
+        logger.info(f"Master {os.getpid()} starting {self.target} workers")
+        self.check_config()
+        while not self.stopping:
+            self.spawn_missing()
+            self.wait(POLL_SECONDS)
+            if self.restart_requested and not self.stopping:
+                self.rolling_restart()
+        logger.info("Stopping workers")
+        self.stop()
+
+
+def main() -> None:
+    server_config = settings.config.server
+    parser = argparse.ArgumentParser(description="Run the API in pre-forked worker processes")
+    parser.add_argument("--app", default="main:app")
+    parser.add_argument("--host", default=server_config.host)
+    parser.add_argument("--port", type=int, default=server_config.port)
+    parser.add_argument("--workers", type=int, help="overrides server.workers; 0 for one per CPU")
+    args = parser.parse_args()
+
+    if server_config.reload:
+        uvicorn.run(args.app, host=args.host, port=args.port, reload=True)
+        return
+
+    Logger.setup_logging()
+    # The master only logs worker lifecycle; with no queue thread running, forking is safe
+    Logger.stop_logging()
+    # Workers share the master's log files and leave rotating them to it
+    Logger.rotated_elsewhere = True
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    for name in os.listdir(metrics_dir):
+        if name.endswith(".db"):
+            # Left by an earlier run
+            os.remove(os.path.join(metrics_dir, name))
+
+    sock = uvicorn.Config(args.app, host=args.host, port=args.port).bind_socket()
+    try:
+        Master(args.app, sock, args.workers).run()
+    finally:
+        sock.close()
+        if OWN_METRICS_DIR:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
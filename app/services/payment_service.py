@@ -1,70 +1,455 @@
 import base64
-from datetime import datetime
+import csv
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+import io
+import json
 import mimetypes
-from typing import List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import zlib
 
+import orjson
 from fastapi import Response
-from app.models.schemas.pagination_payment_response import PaginatedPaymentResponse
-from app.models.payment import Payment
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from app.core.config import settings
+from app.core.logging import Logger
+from app.models.schemas.bulk_payment import BulkItemResult, BulkItemStatus, BulkOperation, BulkOperationType
+from app.models.payment import DATE_FORMAT, TYPED_FIELD_ADAPTERS, Payment, compute_total_due, parse_utc_datetime, to_decimal
+from app.models.payment_status import PaymentStatus
 from app.db.repositories.payment_repository import PaymentRepository
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository
+from app.db.repositories.update_coalescer import UpdateCoalescer
+from app.storage import EvidenceStore
+from app.utils.cursor import decode_cursor, encode_cursor
+from app.utils.event_hub import (
+    CREATED,
+    DELETED,
+    EVENT_STREAM_RESETS,
+    RESET,
+    STATUS_CHANGED,
+    UPDATED,
+    EventHub,
+    HubEvent,
+    Subscription,
+    sse_frame,
+)
+from app.utils.payee_search import SEARCH_FIELDS, SearchMode, build_search_fields, search_fields_changed
+from app.utils.response_cache import CachedResponse, GenerationMarker, ResponseCache
+
+logger = Logger.get_logger(__name__)
+
+bulk_operation_adapter = TypeAdapter(BulkOperation)
+payments_adapter = TypeAdapter(List[Payment])
+
+# Payment fields in model order and under the names the API returns; used for list items and exports
+PAYMENT_FIELDS = [field.alias or name for name, field in Payment.model_fields.items()]
+# Fields computed on read, and the stored fields each is computed from
+DERIVED_FIELDS = {"total_due": ("due_amount", "discount_percent", "tax_percent")}
+
+# Response cache tags: every cached list page, and everything showing one payment
+LIST_TAG = "payments:list"
+# Stored fields that decide which list pages a payment is on, where, and the totals
+LIST_FIELDS = {"payee_payment_status", "payee_added_date_utc", "search_grams", "search_tokens", "is_deleted"}
+
+# Aware or naive (UTC) datetimes render as '...Z', matching the Payment model's JSON
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+
+def payment_tag(payment_id: str) -> str:
+    return f"payment:{payment_id}"
+
+
+def json_default(value: Any) -> Any:
+    # Amounts are exact Decimals in storage and JSON numbers on the wire
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def render_event(event: HubEvent) -> bytes:
+    """The data line of a stream event; created and updated events carry the payment as list items do"""
+    content = {"type": event.type, **({"payment_id": event.payment_id} if event.payment_id else {}), **(event.detail or {})}
+    if event.current is not None and event.type != DELETED:
+        payment = {**event.current, "total_due": compute_total_due(event.current)}
+        content["payment"] = {field: payment.get(field) for field in PAYMENT_FIELDS}
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
 
 class PaymentService:
+    # Rendered GET responses, shared by every per-request instance
+    response_cache = ResponseCache.from_config()
+    # Bumped by clear_caches, so bulk changes made in other processes reach every worker's caches
+    cache_generation = GenerationMarker("payments", settings.config.cache.generation_check_seconds)
+    # Batches single-payment updates into bulk writes when update_coalescing is enabled
+    update_coalescer = UpdateCoalescer.from_config()
+    # Payment changes for GET /payments/stream, published by the write paths below
+    event_hub = EventHub.from_config(render_event)
+
     def __init__(self):
         self.repository = PaymentRepository()
+        self.summary_repository = PaymentSummaryRepository()
+        self.evidence_store = EvidenceStore()
 
     async def get_payments(
         self,
         page: int = 1,
         page_size: int = 50,
         search_payee_name: Optional[str] = None,
-        payee_payment_status = None
-    ) -> PaginatedPaymentResponse:
+        payee_payment_status = None,
+        cursor: Optional[str] = None,
+        approximate_total: bool = False,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> dict:
+        """One page in the PaginatedPaymentResponse shape, or PaginatedPartialPaymentResponse with `fields`.
+
+        Stored payments were validated when they were written, so items are built straight
+        from the documents instead of being re-validated through Payment on every read.
+        """
         try:
-            skip = (page - 1) * page_size
+            after = decode_cursor(cursor) if cursor else None
+            skip = (page - 1) * page_size if after is None else 0
             
             # Build query based on filters and search
-            query = {}
-            if search_payee_name:
-                query["$or"] = [
-                    {"payee_first_name": {"$regex": search_payee_name, "$options": "i"}},
-                    {"payee_last_name": {"$regex": search_payee_name, "$options": "i"}},
-                    {"payee_email": {"$regex": search_payee_name, "$options": "i"}}
-                ]
-            if payee_payment_status is not None:
-                query.update({"payee_payment_status": payee_payment_status})
+            query = self.repository.build_query(
+                search_payee_name,
+                payee_payment_status,
+                search_mode,
+                parse_utc_datetime(due_from) if due_from else None,
+                parse_utc_datetime(due_to) if due_to else None
+            )
             
-            # Get total count for pagination
-            total_count = await self.repository.count_documents(query)
-
-            # Get paginated results
-            payments = await self.repository.get_payments(skip=skip, limit=page_size, query=query)
+            # Get paginated results and the total together, one extra row tells
+            # whether a next page exists
+            payments, total_count, total_is_estimate = await self.repository.get_payments_page(
+                skip=skip,
+                limit=page_size + 1,
+                query=query,
+                after=after,
+                approximate_total=approximate_total,
+                # The cursor is built from the last row's added date
+                projection=self.stored_projection(fields, "payee_added_date_utc") if fields else None
+            )
+            has_more = len(payments) > page_size
+            payments = payments[:page_size]
 
-            # Process payments
-            for payment in payments:
-                self.calculate_total_due(payment)
-                self.calculate_status(payment)
+            # Process payments; the stored status is kept current by the status refresh job
+            if not fields or "total_due" in fields:
+                for payment in payments:
+                    self.calculate_total_due(payment)
 
             # Calculate pagination metadata
             total_pages = (total_count + page_size - 1) // page_size
-            has_next = page < total_pages
-            has_previous = page > 1
-
-            return PaginatedPaymentResponse(
-                items=[Payment(**payment) for payment in payments],
-                total=total_count,
-                page=page,
-                page_size=page_size,
-                total_pages=total_pages,
-                has_next=has_next,
-                has_previous=has_previous
-            )
+            if after is None:
+                has_next = page < total_pages
+                has_previous = page > 1
+            else:
+                has_next = has_more
+                has_previous = True
+
+            next_cursor = None
+            if has_next and payments:
+                last = payments[-1]
+                next_cursor = encode_cursor(last["payee_added_date_utc"], last["_id"])
+
+            return {
+                "items": [self.trusted_payment(payment, fields) for payment in payments],
+                "total": total_count,
+                "total_is_estimate": total_is_estimate,
+                "page": page if after is None else None,
+                "page_size": page_size,
+                "total_pages": total_pages,
+                "has_next": has_next,
+                "has_previous": has_previous,
+                "next_cursor": next_cursor
+            }
         except Exception as e:
-            print(e)
+            logger.error(f"An error occurred while retrieving payments: {e}")
             raise e
 
+    async def get_payments_response(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        search_payee_name: Optional[str] = None,
+        payee_payment_status = None,
+        cursor: Optional[str] = None,
+        approximate_total: bool = False,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> CachedResponse:
+        """Rendered list page; the first pages of each filter are served from the response cache"""
+        async def load():
+            result = await self.get_payments(
+                page, page_size, search_payee_name, payee_payment_status, cursor, approximate_total, search_mode,
+                due_from, due_to, fields
+            )
+            return self.render(result), [LIST_TAG, *(payment_tag(payment["_id"]) for payment in result["items"])]
+
+        await self.drop_stale_caches()
+        if cursor or page > settings.config.cache.list_max_page:
+            response, _ = await load()
+            return response
+        key = "payments:" + json.dumps(
+            [page, page_size, search_payee_name, payee_payment_status, approximate_total, search_mode.value, due_from, due_to, fields]
+        )
+        return await self.response_cache.get_or_load(key, load)
+
+    async def get_payment_response(self, payment_id: str, fields: Optional[List[str]] = None) -> CachedResponse:
+        async def load():
+            return self.render(await self.get_payment(payment_id, fields)), [payment_tag(payment_id)]
+
+        await self.drop_stale_caches()
+        key = payment_tag(payment_id) + (":" + ",".join(fields) if fields else "")
+        return await self.response_cache.get_or_load(key, load)
+
+    async def get_summary(self, payee_payment_status: Optional[str] = None, currency: Optional[str] = None) -> dict:
+        """Counts and sums per status, currency and due month, read from the maintained rollup"""
+        groups = await self.summary_repository.get_summary(payee_payment_status, currency)
+        totals: Dict[str, dict] = {}
+        for group in groups:
+            total = totals.setdefault(
+                group["currency"],
+                {"currency": group["currency"], "count": 0, "due_amount": Decimal(0), "total_due": Decimal(0)}
+            )
+            total["count"] += group["count"]
+            total["due_amount"] += to_decimal(group["due_amount"])
+            total["total_due"] += to_decimal(group["total_due"])
+        return {"groups": groups, "totals": [totals[currency] for currency in sorted(totals)]}
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+        """Payment fields named in a comma-separated ?fields= value, in model order and with _id; None for all"""
+        if not fields:
+            return None
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - set(PAYMENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add("_id")
+        return [field for field in PAYMENT_FIELDS if field in requested]
+
+    @staticmethod
+    def stored_projection(fields: List[str], *extra_fields: str) -> dict:
+        """Inclusion projection for the stored fields behind `fields`, derived ones replaced by their inputs"""
+        stored = {*fields, *extra_fields}
+        for field in fields:
+            stored.update(DERIVED_FIELDS.get(field, ()))
+        return {field: 1 for field in sorted(stored - DERIVED_FIELDS.keys())}
+
+    @staticmethod
+    def trusted_payment(payment: dict, fields: Optional[List[str]] = None) -> dict:
+        """A stored payment in the field order and names Payment serializes to, without validation"""
+        return {field: payment.get(field) for field in fields or PAYMENT_FIELDS}
+
+    @staticmethod
+    def render(content: Any) -> CachedResponse:
+        return CachedResponse.from_body(orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS))
+
+    @classmethod
+    async def clear_caches(cls) -> None:
+        """After a bulk change: drop cached responses and totals here, in the shared tier and in every worker"""
+        PaymentRepository.total_count_cache.clear()
+        await cls.response_cache.clear()
+        await cls.cache_generation.bump()
+
+    async def drop_stale_caches(self) -> None:
+        if await self.cache_generation.changed():
+            PaymentRepository.total_count_cache.clear()
+            self.response_cache.clear_local()
+
+    async def invalidate_payments(self, payment_ids: List[str], lists: bool = True) -> None:
+        """Drop cached responses showing these payments, and every list page when membership may change"""
+        await self.response_cache.invalidate(
+            tags=[*(payment_tag(payment_id) for payment_id in payment_ids), *([LIST_TAG] if lists else [])]
+        )
+
+    @classmethod
+    def publish_change(cls, previous: Optional[dict], current: Optional[dict], payment_id: Optional[str] = None) -> None:
+        """Announce one payment write to event streams; previous is None for a create, current for a delete"""
+        if not cls.event_hub.local:
+            return
+        cls.publish_to_hub(cls.event_hub, previous, current, payment_id)
+
+    @staticmethod
+    def publish_to_hub(
+        hub: EventHub,
+        previous: Optional[dict],
+        current: Optional[dict],
+        payment_id: Optional[str] = None,
+        status_changed: Optional[bool] = None
+    ) -> None:
+        """Publish a write as created, updated, status_changed or deleted; status_changed is inferred from the images"""
+        payment_id = payment_id or (current or previous or {}).get("_id")
+        if current is None or current.get("is_deleted"):
+            hub.publish(DELETED, payment_id, previous, None)
+            return
+        if previous is None and status_changed is None:
+            hub.publish(CREATED, payment_id, None, current)
+            return
+        previous_status = (previous or {}).get("payee_payment_status")
+        if status_changed is None:
+            status_changed = previous_status != current.get("payee_payment_status")
+        if status_changed:
+            hub.publish(STATUS_CHANGED, payment_id, previous, current, {"previous_status": previous_status})
+        else:
+            hub.publish(UPDATED, payment_id, previous, current)
+
+    def stream_events(
+        self,
+        subscription: Subscription,
+        last_event_id: Optional[str] = None,
+        search_payee_name: Optional[str] = None,
+        payee_payment_status: Optional[str] = None,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """Server-sent events for payments matching the get_payments filters.
+
+        A change is sent when the payment matched the filters before or after it, so clients
+        also see payments leave their view; deletes and resets go to every stream. Frames are
+        only produced as fast as the client reads them, and a client that falls behind the
+        hub's buffer is sent a reset. Filters are checked here, before the response starts.
+        The stream releases `subscription` when it ends.
+        """
+        filters = (
+            search_payee_name,
+            payee_payment_status,
+            search_mode,
+            parse_utc_datetime(due_from) if due_from else None,
+            parse_utc_datetime(due_to) if due_to else None
+        )
+        return self.event_frames(subscription, last_event_id, filters)
+
+    async def event_frames(self, subscription: Subscription, last_event_id: Optional[str], filters: tuple) -> AsyncIterator[bytes]:
+        hub = self.event_hub
+        events_config = settings.config.events
+
+        def wanted(event: HubEvent) -> bool:
+            if event.type in (DELETED, RESET):
+                return True
+            matched = event.matched.get(filters)
+            if matched is None:
+                matched = event.matched[filters] = any(
+                    image is not None and self.repository.matches(image, *filters) for image in (event.previous, event.current)
+                )
+            return matched
+
+        def reset(reason: str) -> bytes:
+            EVENT_STREAM_RESETS.labels(reason).inc()
+            return sse_frame(hub.event_id(hub.seq), RESET, orjson.dumps({"type": RESET, "reason": reason}))
+
+        try:
+            yield f"retry: {events_config.retry_ms}\n\n".encode()
+            seq = hub.position(last_event_id)
+            if seq is None:
+                seq = hub.seq
+                yield reset("unknown_event_id")
+            written_at = time.monotonic()
+            while True:
+                events = hub.since(seq)
+                if events is None:
+                    seq = hub.seq
+                    yield reset("lagged")
+                    written_at = time.monotonic()
+                    continue
+                idle = False
+                if events:
+                    # Everything already published goes out as one chunk
+                    frames = [event.frame for event in events if wanted(event)]
+                    seq = events[-1].seq
+                    if frames:
+                        yield b"".join(frames)
+                        written_at = time.monotonic()
+                        continue
+                else:
+                    idle = not await hub.wait(seq)
+                # Also while every event is filtered out: proxies close connections that stay silent
+                if idle or time.monotonic() - written_at >= hub.heartbeat_seconds:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield b": keep-alive\n\n"
+                    written_at = time.monotonic()
+        finally:
+            subscription.release()
+
+    def export_payments(
+        self,
+        export_format: ExportFormat = ExportFormat.CSV,
+        compress: bool = False,
+        search_payee_name: Optional[str] = None,
+        payee_payment_status = None,
+        search_mode: SearchMode = SearchMode.SUBSTRING,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """Stream the payment set get_payments selects with the same filters as CSV or NDJSON chunks, optionally gzipped.
+
+        Filters are checked here, before the response starts.
+        """
+        query = self.repository.build_query(
+            search_payee_name,
+            payee_payment_status,
+            search_mode,
+            parse_utc_datetime(due_from) if due_from else None,
+            parse_utc_datetime(due_to) if due_to else None
+        )
+        return self.export_chunks(query, export_format, compress)
+
+    async def export_chunks(self, query: dict, export_format: ExportFormat, compress: bool) -> AsyncIterator[bytes]:
+        export_config = settings.config.export
+        compressor = zlib.compressobj(export_config.gzip_level, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=PAYMENT_FIELDS, extrasaction="ignore")
+        if export_format == ExportFormat.CSV:
+            writer.writeheader()
+
+        def drain() -> bytes:
+            data = buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(data) if compressor else data
+
+        rows = 0
+        async for payment in self.repository.iter_payments(query, export_config.batch_size):
+            self.calculate_total_due(payment)
+            if export_format == ExportFormat.CSV:
+                writer.writerow({
+                    field: value.strftime(DATE_FORMAT) if isinstance(value, datetime) else value
+                    for field, value in payment.items()
+                })
+            else:
+                buffer.write(orjson.dumps(self.trusted_payment(payment), default=json_default, option=ORJSON_OPTIONS).decode())
+                buffer.write("\n")
+            rows += 1
+            if rows % export_config.flush_rows == 0:
+                chunk = drain()
+                if chunk:
+                    yield chunk
+
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+
     def calculate_status(self, payment: dict) -> None:
-        today = datetime.now().date()
-        due_date = datetime.strptime(payment["payee_due_date"], '%Y-%m-%dT%H:%M:%SZ').date()
+        # Same UTC day boundary as app/jobs/status_refresh.py
+        today = datetime.now(timezone.utc).date()
+        due_date = parse_utc_datetime(payment["payee_due_date"]).date()
         
         if(payment["payee_payment_status"] != "completed"):
             if due_date == today:
@@ -75,54 +460,313 @@ class PaymentService:
                 payment["payee_payment_status"] = "pending"
         
     def calculate_total_due(self, payment: dict) -> None:
-       
-        discount = payment.get("discount_percent", 0) / 100
-        tax = payment.get("tax_percent", 0) / 100
-
-        due_amount = payment["due_amount"]
-        payment["total_due"] = due_amount * (1 - discount) * (1 + tax)
+        payment["total_due"] = compute_total_due(payment)
             
         
 
-    async def get_payment(self, payment_id: str) -> dict:
-        result = await self.repository.get_payment(payment_id)
+    async def get_payment(self, payment_id: str, fields: Optional[List[str]] = None) -> dict:
+        result = await self.repository.get_payment(payment_id, self.stored_projection(fields) if fields else None)
         if result["status"] == "error":
             raise ValueError(result["message"])
-        self.calculate_total_due(result)
-        self.calculate_status(result) 
-        return result
+        if not fields or "total_due" in fields:
+            self.calculate_total_due(result)
+        return self.trusted_payment(result, fields) if fields else result
+
+    @staticmethod
+    def needs_stored_fields(update_data: dict) -> bool:
+        """Whether deriving the stored status or search fields needs the current document"""
+        status_fields = {"payee_payment_status", "payee_due_date"} & update_data.keys()
+        search_fields = set(SEARCH_FIELDS) & update_data.keys()
+        return len(status_fields) == 1 or 0 < len(search_fields) < len(SEARCH_FIELDS)
+
+    def prepare_update(self, update_data: dict, current: Optional[dict] = None) -> dict:
+        """Type the date and amount fields and add the derived fields a partial update affects"""
+        update_data = {
+            field: TYPED_FIELD_ADAPTERS[field].validate_python(value) if field in TYPED_FIELD_ADAPTERS else value
+            for field, value in update_data.items()
+        }
+        merged = {**(current or {}), **update_data}
+        if "payee_payment_status" in update_data or "payee_due_date" in update_data:
+            # Status is stored, so derive it at write time from the merged due date and status
+            status = {"payee_payment_status": merged["payee_payment_status"], "payee_due_date": merged["payee_due_date"]}
+            self.calculate_status(status)
+            update_data["payee_payment_status"] = status["payee_payment_status"]
+        if search_fields_changed(update_data):
+            update_data.update(build_search_fields(merged))
+        return update_data
+
+    def prepare_create(self, payment_data: Payment) -> Payment:
+        """Derive the initial status of a new payment"""
+        status = {"payee_payment_status": payment_data.payee_payment_status, "payee_due_date": payment_data.payee_due_date}
+        self.calculate_status(status)
+        payment_data.payee_payment_status = PaymentStatus(status["payee_payment_status"])
+        return payment_data
 
     async def update_payment(self, payment_id: str, update_data: dict, file_data: Optional[bytes] = None, filename: Optional[str] = None) -> Payment:
-        self.calculate_status(update_data)         
-        updated_payment = await self.repository.update_payment(payment_id, update_data)
-        if not updated_payment:
+        current = None
+        if self.needs_stored_fields(update_data):
+            current = await self.repository.get_payment(payment_id)
+            if current["status"] == "error":
+                raise ValueError(current["message"])
+        update_data = self.prepare_update(update_data, current)
+        # The pre-image moves the summary rollup; the update is a plain $set, so it gives the result too
+        if self.update_coalescer.enabled:
+            previous = await self.update_coalescer.update(payment_id, update_data)
+        else:
+            previous = await self.repository.update_payment(payment_id, update_data, ReturnDocument.BEFORE)
+        if not previous:
             raise ValueError("Payment not found")
+        updated_payment = {**previous, **update_data}
+        await self.summary_repository.apply(removed=[previous], added=[updated_payment])
+        await self.invalidate_payments([payment_id], lists=bool(LIST_FIELDS & update_data.keys()))
+        self.publish_change(previous, updated_payment, payment_id)
         return Payment(**updated_payment)
 
     async def delete_payment(self, payment_id: str) -> dict:
         result = await self.repository.delete_payment(payment_id)
         if result["status"] == "error":
             raise ValueError(result["message"])
+        previous = result.pop("payment")
+        await self.summary_repository.apply(removed=[previous])
+        await self.invalidate_payments([payment_id])
+        self.publish_change(previous, None, payment_id)
+        await self.evidence_store.release_payments([payment_id])
         return result
 
     async def create_payment(self, payment_data: dict) -> str:
         try:
-            date_string = payment_data.payee_due_date
-            date_obj = datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%S.%fZ')
-            payment_data.payee_due_date = date_obj.strftime('%Y-%m-%dT%H:%M:%SZ')
+            payment_data = self.prepare_create(payment_data)
             payment_id = await self.repository.create_payment(payment_data)
+            await self.summary_repository.apply(added=[payment_data.model_dump()])
+            await self.invalidate_payments([payment_id])
+            self.publish_change(None, {**payment_data.model_dump(by_alias=True), "_id": payment_id})
             return payment_id
         except Exception as e:
-            print(f"An error occurred while creating the payment: {str(e)}")
+            logger.error(f"An error occurred while creating the payment: {e}")
             raise e
 
-    async def upload_evidence(self, payment_id: str, file_data: bytes, filename: str) -> str:
-        file_id = await self.repository.upload_evidence(payment_id, file_data, filename)
-        return file_id
+    async def bulk_apply(self, items: List[Any], offset: int = 0) -> List[BulkItemResult]:
+        """Validate one chunk of bulk items and apply it as unordered bulk writes.
+
+        `items` are decoded JSON values (or the exception raised while decoding them);
+        `offset` is the position of the first item in the whole request.
+        """
+        results: Dict[int, BulkItemResult] = {}
+        operations: Dict[int, BulkOperation] = {}
+        for position, item in enumerate(items):
+            index = offset + position
+            if isinstance(item, Exception):
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, error=str(item))
+                continue
+            try:
+                operation = bulk_operation_adapter.validate_python(item)
+            except ValidationError as e:
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, error=self.format_errors(e))
+                continue
+            if operation.op != BulkOperationType.CREATE and not operation.id:
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, error="id is required")
+            elif operation.op != BulkOperationType.DELETE and not operation.data:
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, id=operation.id, error="data is required")
+            else:
+                operations[index] = operation
+
+        # Validate every create in the chunk with one TypeAdapter call
+        creates = [index for index, operation in operations.items() if operation.op == BulkOperationType.CREATE]
+        payments: Dict[int, Payment] = {}
+        try:
+            payments = dict(zip(creates, payments_adapter.validate_python([operations[index].data for index in creates])))
+        except ValidationError as e:
+            invalid = {}
+            for error in e.errors():
+                invalid.setdefault(creates[error["loc"][0]], []).append(f"{'.'.join(map(str, error['loc'][1:]))}: {error['msg']}")
+            for index, messages in invalid.items():
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, error="; ".join(messages))
+                del operations[index]
+            creates = [index for index in creates if index not in invalid]
+            payments = dict(zip(creates, payments_adapter.validate_python([operations[index].data for index in creates])))
+
+        # One lookup serves both the existence check and the fields derived updates need
+        existing_ids = [operation.id for operation in operations.values() if operation.op != BulkOperationType.CREATE]
+        # Kept up to date as the chunk's operations are queued, None once deleted
+        current: Dict[str, Optional[dict]] = (
+            await self.repository.find_payments_by_ids(existing_ids) if existing_ids else {}
+        )
+
+        writes, write_indexes = [], []
+        updated_fields: Dict[str, set] = {}
+        # (before, after) images of each write for the summary rollup; a chunk may touch an id more than once
+        images = []
+        for index, operation in operations.items():
+            try:
+                if operation.op == BulkOperationType.CREATE:
+                    document = self.repository.build_document(self.prepare_create(payments[index]))
+                    operation.id = document["_id"]
+                    writes.append(InsertOne(document))
+                    images.append((None, document))
+                elif current.get(operation.id) is None:
+                    # Missing, or deleted earlier in this chunk
+                    results[index] = BulkItemResult(index=index, status=BulkItemStatus.NOT_FOUND, id=operation.id)
+                    continue
+                elif operation.op == BulkOperationType.UPDATE:
+                    # Derived from the payment as the chunk's earlier operations leave it
+                    previous = current[operation.id]
+                    update_data = self.prepare_update(operation.data, previous)
+                    updated_fields.setdefault(operation.id, set()).update(update_data)
+                    writes.append(UpdateOne({"_id": operation.id}, {"$set": update_data}))
+                    current[operation.id] = {**previous, **update_data}
+                    images.append((previous, current[operation.id]))
+                else:
+                    writes.append(DeleteOne({"_id": operation.id}))
+                    images.append((current[operation.id], None))
+                    current[operation.id] = None
+            except (KeyError, ValueError) as e:
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, id=operation.id, error=str(e))
+                continue
+            write_indexes.append(index)
+
+        errors = await self.repository.bulk_write(writes, settings.config.bulk.chunk_size) if writes else {}
+        written = [operations[index] for position, index in enumerate(write_indexes) if position not in errors]
+        applied = [image for position, image in enumerate(images) if position not in errors]
+        await self.summary_repository.apply(removed=[before for before, _ in applied], added=[after for _, after in applied])
+        for position, index in enumerate(write_indexes):
+            if position not in errors:
+                self.publish_change(*images[position], operations[index].id)
+        if written:
+            await self.invalidate_payments(
+                [operation.id for operation in written],
+                lists=any(
+                    operation.op != BulkOperationType.UPDATE or LIST_FIELDS & updated_fields[operation.id]
+                    for operation in written
+                )
+            )
+        deleted_ids = [operation.id for operation in written if operation.op == BulkOperationType.DELETE]
+        if deleted_ids:
+            await self.evidence_store.release_payments(deleted_ids)
+        done_status = {
+            BulkOperationType.CREATE: BulkItemStatus.CREATED,
+            BulkOperationType.UPDATE: BulkItemStatus.UPDATED,
+            BulkOperationType.DELETE: BulkItemStatus.DELETED,
+        }
+        for position, index in enumerate(write_indexes):
+            operation = operations[index]
+            if position in errors:
+                results[index] = BulkItemResult(index=index, status=BulkItemStatus.ERROR, id=operation.id, error=errors[position])
+            else:
+                results[index] = BulkItemResult(index=index, status=done_status[operation.op], id=operation.id)
+        return [results[index] for index in sorted(results)]
+
+    @staticmethod
+    def format_errors(error: ValidationError) -> str:
+        return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+
+    async def upload_evidence(self, payment_id: str, chunks: AsyncIterator[bytes], filename: str) -> str:
+        # The content type is resolved once here and served from the record afterwards
+        record = await self.evidence_store.put(payment_id, chunks, filename, self.get_content_type(filename))
+        return record["_id"]
+
+    async def download_evidence(
+        self,
+        file_id: str,
+        range_header: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Response:
+        record = await self.evidence_store.get(file_id)
+        if record is None:
+            # Evidence uploaded before evidence records existed
+            grid_out = await self.repository.open_evidence(file_id)
+            if grid_out is None:
+                return await self.download_legacy_evidence(file_id)
+            return self.ranged_evidence_response(grid_out, grid_out.filename, self.get_content_type(grid_out.filename), range_header)
+
+        # Records are immutable and content addressed, so the digest is a strong validator
+        etag = f'"{record["sha256"]}"'
+        if self.etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        backend = self.evidence_store.backend_for(record["backend"])
+        path = backend.local_path(record["location"])
+        if path:
+            # Served with sendfile where the server supports it; Range is handled by FileResponse
+            return FileResponse(path, media_type=record["content_type"], filename=record["filename"], headers={"ETag": etag})
+        grid_out = await backend.open(record["location"])
+        return self.ranged_evidence_response(grid_out, record["filename"], record["content_type"], range_header, {"ETag": etag})
+
+    def ranged_evidence_response(
+        self,
+        grid_out,
+        filename: str,
+        content_type: str,
+        range_header: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        length = grid_out.length
+        headers = {
+            **(headers or {}),
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+        try:
+            byte_range = self.parse_range(range_header, length)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{length}"})
+
+        start, end = byte_range or (0, length - 1)
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        headers["Content-Length"] = str(max(end - start + 1, 0))
+        grid_out.seek(start)
+        return StreamingResponse(
+            self.stream_evidence(grid_out, end - start + 1),
+            status_code=206 if byte_range else 200,
+            media_type=content_type,
+            headers=headers
+        )
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+        tags = (tag.strip() for tag in if_none_match.split(","))
+        return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+    @staticmethod
+    async def stream_evidence(grid_out, remaining: int) -> AsyncIterator[bytes]:
+        chunk_bytes = settings.config.evidence.stream_chunk_bytes
+        while remaining > 0:
+            chunk = await grid_out.read(min(chunk_bytes, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    @staticmethod
+    def parse_range(range_header: Optional[str], length: int) -> Optional[tuple]:
+        """Parse a single 'bytes=start-end' range; None means the whole file"""
+        if not range_header:
+            return None
+        unit, _, spec = range_header.partition("=")
+        if unit.strip().lower() != "bytes" or "," in spec:
+            # Multipart ranges are not supported; serve the whole file
+            return None
+        first, _, last = spec.strip().partition("-")
+        if first:
+            start = int(first)
+            end = min(int(last), length - 1) if last else length - 1
+        elif last:
+            start = max(length - int(last), 0)
+            end = length - 1
+        else:
+            raise ValueError("Empty range")
+        if start > end or start >= length:
+            raise ValueError("Unsatisfiable range")
+        return start, end
 
-    async def download_evidence(self, file_id: str) -> bytes:
+    async def download_legacy_evidence(self, file_id: str) -> Response:
         try:
-            file_data = await self.repository.download_evidence(file_id)
+            file_data = await self.repository.download_legacy_evidence(file_id)
 
             file_content = base64.b64decode(file_data["evidence_file"])
             
@@ -139,7 +783,7 @@ class PaymentService:
             )
             return response
         except ValueError as e:
-            print(f"An error occurred while downloading the evidence: {str(e)}")
+            logger.warning(f"An error occurred while downloading the evidence: {e}")
             raise e
     def get_content_type(self, filename: str) -> str:
         """Determine content type based on file extension"""
@@ -0,0 +1,2 @@
+from app.storage.backends import BlobBackend, GridFSBlobBackend, LocalBlobBackend, StoredBlob, create_backend
+from app.storage.evidence_store import EvidenceStore
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import uuid
+from typing import AsyncIterator, Optional
+
+import anyio
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.db.mongodb import MongoDB
+
+
+class StoredBlob(BaseModel):
+    sha256: str
+    length: int
+    # Backend specific address: a path under the store root or a GridFS file id
+    location: str
+    # Where the bytes wait until the blob is published at its location, if elsewhere
+    staged: Optional[str] = None
+
+
+class BlobBackend:
+    """Holds evidence bytes; deduplication and reference counts are kept by EvidenceStore"""
+    name = ""
+
+    async def write(self, chunks: AsyncIterator[bytes]) -> StoredBlob:
+        raise NotImplementedError
+
+    async def publish(self, blob: StoredBlob) -> None:
+        """Make a written blob readable at its location, once its blob record is claimed"""
+
+    async def discard(self, blob: StoredBlob) -> None:
+        """Drop a written blob that will not be published"""
+        await self.delete(blob.location)
+
+    async def delete(self, location: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, location: str) -> Optional[str]:
+        """Path on disk the blob can be served from with sendfile, if the backend has one"""
+        return None
+
+    async def open(self, location: str) -> AsyncIOMotorGridOut:
+        raise NotImplementedError
+
+
+class LocalBlobBackend(BlobBackend):
+    """Files on local disk at <root>/<aa>/<bb>/<sha256>, written to a temp file and renamed into place.
+
+    Identical content shares one path, so the rename waits for publish(): by then the blob
+    record is claimed and no release of an earlier copy can unlink the new file.
+    """
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.config.evidence.local_path
+
+    async def write(self, chunks: AsyncIterator[bytes]) -> StoredBlob:
+        digest = hashlib.sha256()
+        length = 0
+        tmp_dir = anyio.Path(self.root, "tmp")
+        await tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / uuid.uuid4().hex
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as file:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    length += len(chunk)
+                    await file.write(chunk)
+        except BaseException:
+            await tmp_path.unlink(missing_ok=True)
+            raise
+        sha256 = digest.hexdigest()
+        location = os.path.join(sha256[:2], sha256[2:4], sha256)
+        return StoredBlob(sha256=sha256, length=length, location=location, staged=str(tmp_path))
+
+    async def publish(self, blob: StoredBlob) -> None:
+        path = anyio.Path(self.root, blob.location)
+        await path.parent.mkdir(parents=True, exist_ok=True)
+        # Identical content may already be there; replacing it with the same bytes is harmless
+        await anyio.Path(blob.staged).replace(path)
+
+    async def discard(self, blob: StoredBlob) -> None:
+        await anyio.Path(blob.staged).unlink(missing_ok=True)
+
+    async def delete(self, location: str) -> None:
+        await anyio.Path(self.root, location).unlink(missing_ok=True)
+
+    def local_path(self, location: str) -> Optional[str]:
+        return os.path.join(self.root, location)
+
+
+class GridFSBlobBackend(BlobBackend):
+    name = "gridfs"
+
+    def __init__(self):
+        self.bucket = AsyncIOMotorGridFSBucket(MongoDB.db, bucket_name=settings.config.mongodb.collections.evidence_bucket)
+
+    async def write(self, chunks: AsyncIterator[bytes]) -> StoredBlob:
+        digest = hashlib.sha256()
+        length = 0
+        file_id = str(ObjectId())
+        grid_in = self.bucket.open_upload_stream_with_id(file_id, file_id)
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                length += len(chunk)
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        return StoredBlob(sha256=digest.hexdigest(), length=length, location=file_id)
+
+    async def delete(self, location: str) -> None:
+        try:
+            await self.bucket.delete(location)
+        except NoFile:
+            pass
+
+    async def open(self, location: str) -> AsyncIOMotorGridOut:
+        return await self.bucket.open_download_stream(location)
+
+
+BACKENDS = {backend.name: backend for backend in (LocalBlobBackend, GridFSBlobBackend)}
+
+
+def create_backend(name: Optional[str] = None) -> BlobBackend:
+    name = name or settings.config.evidence.backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown evidence backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.mongodb import MongoDB
+from app.storage.backends import BlobBackend, StoredBlob, create_backend
+
+# A put waits this long between attempts while a release removes the previous copy of its content
+CLAIM_RETRY_SECONDS = 0.05
+# A blob marked for deletion longer than this belongs to a release that died part way
+STALE_DELETE_SECONDS = 60
+
+
+class EvidenceStore:
+    """Content addressed evidence storage.
+
+    Each upload gets its own record in the evidence collection (file id, payment, filename,
+    content type), while the bytes are stored once per backend and SHA-256 digest in
+    evidence_blobs with a reference count. A blob is removed when its last record is.
+
+    Removal marks the blob record deleting before its bytes go, and a put of the same
+    content waits for such a record to be gone before it claims a new one and publishes
+    its bytes, so the two never race on one location.
+    """
+
+    def __init__(self, backend: Optional[BlobBackend] = None):
+        collections = settings.config.mongodb.collections
+        self.backend = backend or create_backend()
+        self.collection_evidence = MongoDB.db[collections.evidence]
+        self.collection_blobs = MongoDB.db[collections.evidence_blobs]
+        self._backends: Dict[str, BlobBackend] = {self.backend.name: self.backend}
+
+    def backend_for(self, name: str) -> BlobBackend:
+        # Records written before a backend switch are still served from where they live
+        if name not in self._backends:
+            self._backends[name] = create_backend(name)
+        return self._backends[name]
+
+    async def put(
+        self,
+        payment_id: str,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        content_type: str,
+        file_id: Optional[str] = None
+    ) -> dict:
+        blob = await self.backend.write(chunks)
+        now = datetime.now(timezone.utc)
+        blob_id = f"{self.backend.name}:{blob.sha256}"
+        try:
+            stored = await self.claim_blob(blob_id, blob, now)
+        except BaseException:
+            await self.backend.discard(blob)
+            raise
+        if stored["location"] == blob.location:
+            await self.backend.publish(blob)
+        else:
+            # Same content is already stored; keep the existing copy
+            await self.backend.discard(blob)
+
+        record = {
+            "_id": file_id or str(ObjectId()),
+            "payment_id": payment_id,
+            "filename": filename,
+            "content_type": content_type,
+            "blob_id": blob_id,
+            "backend": self.backend.name,
+            "location": stored["location"],
+            "sha256": blob.sha256,
+            "length": blob.length,
+            "created_at": now
+        }
+        await self.collection_evidence.insert_one(record)
+        return record
+
+    async def claim_blob(self, blob_id: str, blob: StoredBlob, now: datetime) -> dict:
+        """Add a reference to the blob record, creating it unless a release is removing it"""
+        deadline = time.monotonic() + STALE_DELETE_SECONDS
+        while True:
+            try:
+                return await self.collection_blobs.find_one_and_update(
+                    {"_id": blob_id, "deleting": {"$ne": True}},
+                    {
+                        "$inc": {"refcount": 1},
+                        "$setOnInsert": {
+                            "backend": self.backend.name,
+                            "sha256": blob.sha256,
+                            "length": blob.length,
+                            "location": blob.location,
+                            "created_at": now
+                        }
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # The record exists and is marked deleting
+                if time.monotonic() > deadline:
+                    stale = datetime.now(timezone.utc) - timedelta(seconds=STALE_DELETE_SECONDS)
+                    await self.collection_blobs.delete_one({"_id": blob_id, "deleting": True, "deleting_at": {"$lt": stale}})
+                await asyncio.sleep(CLAIM_RETRY_SECONDS)
+
+    async def get(self, file_id: str) -> Optional[dict]:
+        return await self.collection_evidence.find_one({"_id": file_id})
+
+    async def release(self, record: dict) -> None:
+        """Drop an evidence record and its blob once nothing else references it"""
+        result = await self.collection_evidence.delete_one({"_id": record["_id"]})
+        if not result.deleted_count:
+            return
+        blob = await self.collection_blobs.find_one_and_update(
+            {"_id": record["blob_id"]},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob and blob["refcount"] <= 0:
+            # Only while still unreferenced: a put of the same content since the decrement keeps it
+            marked = await self.collection_blobs.update_one(
+                {"_id": blob["_id"], "refcount": {"$lte": 0}, "deleting": {"$ne": True}},
+                {"$set": {"deleting": True, "deleting_at": datetime.now(timezone.utc)}}
+            )
+            if marked.modified_count:
+                # Puts of this content wait until the record is gone, so they publish after the unlink
+                await self.backend_for(blob["backend"]).delete(blob["location"])
+                await self.collection_blobs.delete_one({"_id": blob["_id"], "deleting": True})
+
+    async def release_payments(self, payment_ids: List[str]) -> int:
+        released = 0
+        async for record in self.collection_evidence.find({"payment_id": {"$in": payment_ids}}):
+            await self.release(record)
+            released += 1
+        return released
@@ -1,72 +1,379 @@
+import argparse
+import asyncio
+import csv
+import os
+import time
+from datetime import datetime, timezone
+from functools import reduce
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
 import pandas as pd
-from pydantic import ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from app.core.config import settings
 from app.db.mongodb import MongoDB
+from app.db.repositories.payment_summary_repository import SUMMARY_PROJECTION, PaymentSummaryRepository
+from app.jobs.summary_rebuild import run_summary_rebuild
 from app.models.payment import Payment
+from app.services.payment_service import PaymentService
 from app.core.logging import Logger
-from datetime import datetime
+from app.utils.payee_search import SEARCH_PROJECTION, build_search_fields
 
+# Columns are read as raw text; this keeps leading zeros in postal codes, the "+" in phone
+# numbers and country codes like "NA" that pandas would otherwise parse as NaN. Amounts stay
+# text too and are parsed exactly into Decimals by validation.
+CSV_READ_OPTIONS = {"dtype": str, "keep_default_na": False, "na_filter": False, "on_bad_lines": "warn"}
+# Stored with every ingested row so a later file can be applied as a delta
+SYNC_FIELDS = ("sync_key", "content_hash")
+# Written from every row on top of its columns
+DERIVED_FIELDS = (*SYNC_FIELDS, *SEARCH_PROJECTION)
+DUPLICATE_KEY_ERROR = "natural key repeats an earlier row"
 
-async def load_and_normalize_csv_data(file_path: str, collection_name: str):
-    logger = Logger.get_logger(__name__)
-    logger.info(f"Loading data from '{file_path}'")
+payments_adapter = TypeAdapter(List[Payment])
+
+
+class IngestReport(BaseModel):
+    rows_read: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    rows_unchanged: int = 0
+    rows_tombstoned: int = 0
+    rows_rejected: int = 0
+    chunks: int = 0
+    bytes_read: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    reject_file: Optional[str] = None
+
+
+class RejectWriter:
+    """Appends rows that failed validation, with the reason, to a CSV file opened on first use"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write(self, rows: List[dict], errors: List[str]) -> None:
+        if not rows:
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=[*rows[0].keys(), "error"], extrasaction="ignore")
+            self._writer.writeheader()
+        for row, error in zip(rows, errors):
+            self._writer.writerow({**row, "error": error})
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+
+
+def normalize_chunk(df: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """Vectorized normalization and status derivation for one CSV chunk"""
+    df = df.apply(lambda column: column.str.strip())
+    # Empty cells become missing values rather than empty strings
+    df = df.mask(df == "")
+
+    # Identity and fingerprint of the source row, taken from the text before anything is typed
+    source_columns = list(df.columns)
+    key_parts = [df[field].fillna("").astype(str).str.lower() for field in settings.config.ingest.natural_key_fields]
+    df["sync_key"] = reduce(lambda left, right: left + "|" + right, key_parts)
+    df["content_hash"] = pd.util.hash_pandas_object(df[source_columns], index=False).map("{:016x}".format)
 
-    # Check if the collection is empty
-    count = await MongoDB.db[collection_name].count_documents({})
-    if count > 0:
-        logger.info(f"Data already exists in the collection '{collection_name}'. Skipping CSV load.")
-        return
-    
-    # Read CSV data
-    df = pd.read_csv(file_path)
-    
-    # Normalize data (example: ensure all fields conform to the schema)
-    df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-    
-    # # Convert date columns to UTC timestamps and then to string
-    df["payee_due_date"] = pd.to_datetime(df["payee_due_date"], utc=True).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
-    
-    # Convert the `payee_due_date` column to datetime and format it correctly
-    # df["payee_due_date"] = pd.to_datetime(df["payee_due_date"], utc=True)
-
-    # Get today's date in UTC for comparison
-    today = datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    # Update `payee_payment_status` based on conditions
-    df["payee_payment_status"] = df["payee_due_date"].apply(
-        lambda x: "due_now" if x == today else "overdue" if x < today else df["payee_payment_status"]
+    # Unparseable due dates become NaT, which validation rejects
+    due_date = pd.to_datetime(df["payee_due_date"], utc=True, errors="coerce")
+    df["payee_due_date"] = due_date
+
+    # Same rules as PaymentService.calculate_status, on the UTC day boundary
+    start_of_today = pd.Timestamp(now.astimezone(timezone.utc).date(), tz="UTC")
+    start_of_tomorrow = start_of_today + pd.Timedelta(days=1)
+    status = df["payee_payment_status"].str.lower()
+    df["payee_payment_status"] = np.select(
+        [status == "completed", due_date < start_of_today, due_date < start_of_tomorrow],
+        ["completed", "overdue", "due_now"],
+        "pending"
     )
-    # Convert postal code to string
-    df["payee_postal_code"] = df["payee_postal_code"].astype(str)
-    df["payee_phone_number"] = df["payee_phone_number"].astype(str)
-    df["payee_added_date_utc"] = df["payee_added_date_utc"].astype(str)
-    df = df.fillna("country")
-
-    data = []
-    for _, row in df.iterrows():
+    return df
+
+
+def validate_chunk(df: pd.DataFrame, seen_keys: Optional[Set[str]] = None) -> Tuple[List[dict], List[dict], List[str]]:
+    """Validate a whole chunk with one TypeAdapter call, splitting out the rows that fail.
+
+    With seen_keys, rows whose natural key is already in it are rejected as well, and the
+    keys of the rows kept are added to it.
+    """
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    errors = {}
+    valid = records
+    try:
+        payments = payments_adapter.validate_python(records)
+    except ValidationError as e:
+        for error in e.errors():
+            index = error["loc"][0]
+            errors.setdefault(index, []).append(f"{'.'.join(map(str, error['loc'][1:]))}: {error['msg']}")
+        valid = [record for index, record in enumerate(records) if index not in errors]
+        payments = payments_adapter.validate_python(valid)
+
+    # Python mode keeps datetimes and Decimals typed for BSON
+    documents = payments_adapter.dump_python(payments, by_alias=True)
+    for document, record in zip(documents, valid):
+        document.update(build_search_fields(document))
+        document.update({field: record[field] for field in SYNC_FIELDS})
+    if seen_keys is not None:
+        unique = []
+        for index, document in zip((i for i in range(len(records)) if i not in errors), documents):
+            if document["sync_key"] in seen_keys:
+                errors[index] = [DUPLICATE_KEY_ERROR]
+            else:
+                seen_keys.add(document["sync_key"])
+                unique.append(document)
+        documents = unique
+    rejected = [
+        {key: value for key, value in records[index].items() if key not in SYNC_FIELDS}
+        for index in sorted(errors)
+    ]
+    reasons = ["; ".join(errors[index]) for index in sorted(errors)]
+    return documents, rejected, reasons
+
+
+def read_next_chunk(
+    reader,
+    rejects: RejectWriter,
+    now: datetime,
+    seen_keys: Optional[Set[str]] = None
+) -> Optional[Tuple[List[dict], Set[str], int, int]]:
+    """Parse, normalize and validate the next chunk; runs in a worker thread.
+
+    Returns the documents, the fields the file supplies, and the rows read and rejected.
+    """
+    try:
+        df = next(reader)
+    except StopIteration:
+        return None
+    file_fields = {*df.columns, *DERIVED_FIELDS}
+    documents, rejected, reasons = validate_chunk(normalize_chunk(df, now), seen_keys)
+    rejects.write(rejected, reasons)
+    return documents, file_fields, len(df), len(rejected)
+
+
+async def sync_documents(
+    collection,
+    documents: List[dict],
+    file_fields: Set[str],
+    report: "IngestReport",
+    summary: Optional[PaymentSummaryRepository] = None
+) -> None:
+    """Write only the rows whose natural key is new or whose content hash changed.
+
+    Documents must have distinct natural keys. A changed row sets only the fields the file
+    supplies whose value differs from the stored document, so the other fields, and any
+    the file still agrees with, keep what the API wrote.
+    """
+    existing = {
+        stored["sync_key"]: stored
+        async for stored in collection.find({"sync_key": {"$in": [document["sync_key"] for document in documents]}})
+    }
+    operations = []
+    # Pre- and post-images of the rows written, for the summary rollup
+    removed, added = [], []
+    for document in documents:
+        key = document["sync_key"]
+        stored = existing.get(key)
+        if stored is None:
+            operations.append(UpdateOne({"sync_key": key}, {"$setOnInsert": document}, upsert=True))
+            added.append(document)
+            report.rows_inserted += 1
+        elif stored.get("content_hash") != document["content_hash"] or stored.get("is_deleted"):
+            changes = {
+                field: value for field, value in document.items()
+                if field in file_fields and stored.get(field) != value
+            }
+            update = {"$set": changes} if changes else {}
+            if stored.get("is_deleted"):
+                update["$unset"] = {"is_deleted": "", "deleted_at": ""}
+            operations.append(UpdateOne({"sync_key": key}, update))
+            previous = {field: stored.get(field) for field in SUMMARY_PROJECTION}
+            removed.append(previous)
+            # A sync brings a tombstoned row back
+            added.append({**previous, **changes, "is_deleted": None})
+            report.rows_updated += 1
+        else:
+            report.rows_unchanged += 1
+
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        if summary:
+            await summary.apply(removed, added)
+
+
+async def tombstone_missing(collection, present_keys: Set[str], now: datetime) -> int:
+    """Flag previously synced rows whose natural key is not among the file's"""
+    batch_size = settings.config.ingest.insert_batch_size
+    tombstoned = 0
+    missing = []
+
+    async def flag():
+        nonlocal tombstoned
+        result = await collection.update_many(
+            {"sync_key": {"$in": missing}, "is_deleted": {"$ne": True}},
+            {"$set": {"is_deleted": True, "deleted_at": now}}
+        )
+        tombstoned += result.modified_count
+        missing.clear()
+
+    async for stored in collection.find({"sync_key": {"$exists": True}, "is_deleted": {"$ne": True}}, {"_id": 0, "sync_key": 1}):
+        if stored["sync_key"] not in present_keys:
+            missing.append(stored["sync_key"])
+            if len(missing) >= batch_size:
+                await flag()
+    if missing:
+        await flag()
+    return tombstoned
+
+
+async def ingest_csv(
+    file_path: str,
+    collection,
+    now: Optional[datetime] = None,
+    sync: bool = False,
+    tombstone: bool = False,
+    summary: Optional[PaymentSummaryRepository] = None
+) -> IngestReport:
+    """Stream a CSV file into a collection chunk by chunk.
+
+    Parsing and validation of the next chunk run in a thread while the previous chunk is
+    being written. At most ingest.max_inflight_chunks parsed chunks wait to be written,
+    which together with ingest.chunk_size bounds memory use.
+
+    Rows repeating an earlier row's natural key are rejected, since sync_key is unique.
+    With sync=True the file is applied as a delta: rows are matched on their natural key
+    and only new or changed ones are written. With tombstone=True as well, synced rows missing from the file are flagged
+    is_deleted once the whole file has been applied.
+
+    Written rows are added to `summary` as they go; tombstones are not tracked row by
+    row, so the caller rebuilds the summary after a sync that tombstoned anything.
+    """
+    logger = Logger.get_logger(__name__)
+    ingest_config = settings.config.ingest
+    now = now or datetime.now(timezone.utc)
+    report = IngestReport(reject_file=ingest_config.reject_file or f"{file_path}.rejects.csv")
+    rejects = RejectWriter(report.reject_file)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=ingest_config.max_inflight_chunks)
+    file_size = os.path.getsize(file_path)
+    # Natural keys of the rows kept so far, which find repeats and the rows to tombstone
+    seen_keys: Set[str] = set()
+    started = time.perf_counter()
+
+    async def produce(handle):
+        reader = pd.read_csv(handle, chunksize=ingest_config.chunk_size, **CSV_READ_OPTIONS)
+        loop = asyncio.get_running_loop()
         try:
-            # Convert row to dictionary and validate with Pydantic
-            record = Payment(
-                payee_first_name=row["payee_first_name"],
-                payee_last_name=row["payee_last_name"],
-                payee_payment_status=row["payee_payment_status"],
-                payee_added_date_utc=row["payee_added_date_utc"],
-                payee_due_date=row["payee_due_date"],
-                payee_address_line_1=row["payee_address_line_1"],
-                payee_address_line_2=row.get("payee_address_line_2"),
-                payee_city=row["payee_city"],
-                payee_country=row["payee_country"],
-                payee_province_or_state=row.get("payee_province_or_state"),
-                payee_postal_code=row["payee_postal_code"],
-                payee_phone_number=row["payee_phone_number"],
-                payee_email=row["payee_email"],
-                currency=row["currency"],
-                discount_percent=row.get("discount_percent"),
-                tax_percent=row.get("tax_percent"),
-                due_amount=row["due_amount"]
+            while True:
+                chunk = await loop.run_in_executor(None, read_next_chunk, reader, rejects, now, seen_keys)
+                if chunk is None:
+                    break
+                await queue.put((chunk, handle.tell()))
+        except asyncio.CancelledError:
+            # The consumer failed and reads no more; waiting to enqueue the sentinel would hang
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            (documents, file_fields, rows_read, rows_rejected), position = item
+            batch_size = ingest_config.insert_batch_size
+            for start in range(0, len(documents), batch_size):
+                batch = documents[start:start + batch_size]
+                if sync:
+                    await sync_documents(collection, batch, file_fields, report, summary)
+                else:
+                    result = await collection.insert_many(batch, ordered=False)
+                    report.rows_inserted += len(result.inserted_ids)
+                    if summary:
+                        await summary.apply(added=batch)
+            report.chunks += 1
+            report.rows_read += rows_read
+            report.rows_rejected += rows_rejected
+            report.bytes_read = position
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"Ingested chunk {report.chunks}: {report.rows_read} rows read, {report.rows_inserted} inserted, "
+                f"{report.rows_updated} updated, {report.rows_unchanged} unchanged, {report.rows_rejected} rejected, {100 * position / max(file_size, 1):.1f}% of file, "
+                f"{report.rows_read / max(elapsed, 1e-9):.0f} rows/s"
             )
-            data.append(record.dict(by_alias=True))
-        except ValidationError as e:
-            print(f"Validation failed for row: {row.to_dict()} - {e}")
-            
-    # Save normalized data into MongoDB
-    await MongoDB.db[collection_name].insert_many(data)
\ No newline at end of file
+
+    try:
+        with open(file_path, "rb") as handle:
+            producer = asyncio.create_task(produce(handle))
+            try:
+                await consume()
+            finally:
+                if not producer.done():
+                    producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+            producer.result()
+    finally:
+        rejects.close()
+
+    if sync and tombstone:
+        report.rows_tombstoned = await tombstone_missing(collection, seen_keys, now)
+
+    report.elapsed_seconds = time.perf_counter() - started
+    report.rows_per_second = report.rows_read / max(report.elapsed_seconds, 1e-9)
+    if not report.rows_rejected:
+        report.reject_file = None
+    return report
+
+
+async def load_and_normalize_csv_data(
+    file_path: str,
+    collection_name: str,
+    sync: bool = False,
+    tombstone: bool = False
+) -> Optional[IngestReport]:
+    logger = Logger.get_logger(__name__)
+    logger.info(f"Loading data from '{file_path}'")
+
+    # A plain load only seeds an empty collection; sync applies the file as a delta
+    if not sync:
+        count = await MongoDB.db[collection_name].count_documents({})
+        if count > 0:
+            logger.info(f"Data already exists in the collection '{collection_name}'. Skipping CSV load.")
+            return None
+
+    report = await ingest_csv(
+        file_path, MongoDB.db[collection_name], sync=sync, tombstone=tombstone, summary=PaymentSummaryRepository()
+    )
+    if report.rows_tombstoned:
+        await run_summary_rebuild()
+    if report.rows_inserted or report.rows_updated or report.rows_tombstoned:
+        # This runs in its own process: clear_caches reaches the web workers' caches as well
+        await PaymentService.clear_caches()
+    logger.info(f"Finished loading '{file_path}': {report.model_dump()}")
+    return report
+
+
+async def main(file_path: str, sync: bool, tombstone: bool) -> None:
+    Logger.setup_logging()
+    await MongoDB.connect()
+    try:
+        await load_and_normalize_csv_data(file_path, settings.config.mongodb.collections.payments, sync, tombstone)
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load or re-sync payments from a CSV file")
+    parser.add_argument("file_path", nargs="?", default=settings.config.data.file_path)
+    parser.add_argument("--sync", action="store_true", help="apply the file as a delta against existing data")
+    parser.add_argument("--tombstone", action="store_true", help="with --sync, flag rows missing from the file")
+    args = parser.parse_args()
+    asyncio.run(main(args.file_path, args.sync, args.tombstone))
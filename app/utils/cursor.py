@@ -0,0 +1,25 @@
+import base64
+import binascii
+from datetime import timezone
+from typing import Any, Tuple
+
+from bson import json_util
+from bson.json_util import JSONOptions, RELAXED_JSON_OPTIONS
+
+# Extended JSON keeps datetime sort keys typed across the round trip
+CURSOR_JSON_OPTIONS = JSONOptions(json_mode=RELAXED_JSON_OPTIONS.json_mode, tz_aware=True, tzinfo=timezone.utc)
+
+
+def encode_cursor(sort_value: Any, payment_id: str) -> str:
+    """Build an opaque cursor pointing just after the given (sort key, _id) pair"""
+    raw = json_util.dumps([sort_value, payment_id], json_options=CURSOR_JSON_OPTIONS, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, payment_id = json_util.loads(base64.urlsafe_b64decode(padded), json_options=CURSOR_JSON_OPTIONS)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return sort_value, payment_id
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+
+EVENT_SUBSCRIBERS = Gauge("event_stream_subscribers", "Open payment event streams", multiprocess_mode="livesum")
+EVENTS_PUBLISHED = Counter("event_stream_published_total", "Payment events published to the hub", ["type"])
+EVENT_STREAM_RESETS = Counter(
+    "event_stream_resets_total",
+    "Streams told to refetch instead of receiving the events they missed",
+    ["reason"]
+)
+
+CREATED = "created"
+UPDATED = "updated"
+STATUS_CHANGED = "status_changed"
+DELETED = "deleted"
+# Clients should refetch the list: events were missed, or too many payments changed to send one by one
+RESET = "reset"
+
+
+def sse_frame(event_id: str, event_type: str, data: bytes) -> bytes:
+    return b"id: " + event_id.encode() + b"\nevent: " + event_type.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class HubEvent:
+    """One published change; its frame is rendered on first delivery and shared by every stream"""
+    __slots__ = ("id", "seq", "type", "payment_id", "previous", "current", "detail", "matched", "_frame", "_render")
+
+    def __init__(
+        self,
+        event_id: str,
+        seq: int,
+        event_type: str,
+        payment_id: Optional[str],
+        previous: Optional[dict],
+        current: Optional[dict],
+        detail: Optional[dict],
+        render: Callable[["HubEvent"], bytes]
+    ):
+        self.id = event_id
+        self.seq = seq
+        self.type = event_type
+        self.payment_id = payment_id
+        self.previous = previous
+        self.current = current
+        self.detail = detail
+        # Whether the event passes a stream's filters, by filters; streams with the same filters check once
+        self.matched: Dict[Hashable, bool] = {}
+        self._frame: Optional[bytes] = None
+        self._render = render
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            self._frame = sse_frame(self.id, self.type, self._render(self))
+        return self._frame
+
+
+class Subscription:
+    """A stream slot reserved on a hub; release() may be called more than once"""
+    __slots__ = ("hub", "active")
+
+    def __init__(self, hub: "EventHub"):
+        self.hub = hub
+        self.active = True
+
+    def release(self) -> None:
+        if self.active:
+            self.active = False
+            self.hub.subscribers -= 1
+            EVENT_SUBSCRIBERS.dec()
+
+
+class EventHub:
+    """In-process publish/subscribe for payment changes, backed by a ring buffer.
+
+    Publishing never waits: the event is appended to the buffer and waiting streams are
+    woken. Each stream reads the buffer from its own position, so a slow client only holds
+    back itself, and one that falls further behind than the buffer is sent a reset. Event
+    ids are "<hub id>-<sequence>": an id from another worker or an earlier run is known to
+    be unknown, and the stream resets rather than replaying the wrong events.
+    """
+
+    def __init__(self, buffer_size: int, max_subscribers: int, heartbeat_seconds: float, render: Callable[[HubEvent], bytes]):
+        self.id = uuid.uuid4().hex[:12]
+        self.events: Deque[HubEvent] = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.max_subscribers = max_subscribers
+        self.heartbeat_seconds = heartbeat_seconds
+        self.subscribers = 0
+        self.render = render
+        # Whether this process's write paths publish; off while a change stream feeds the hub
+        self.local = True
+        # Shared by every waiting stream; resolved by the next publish or the heartbeat timer
+        self._waiter: Optional[asyncio.Future] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def from_config(cls, render: Callable[[HubEvent], bytes]) -> "EventHub":
+        config = settings.config.events
+        return cls(config.buffer_size, config.max_subscribers, config.heartbeat_seconds, render)
+
+    def subscribe(self) -> Optional[Subscription]:
+        """Reserve a stream slot, or None when max_subscribers streams are open"""
+        if self.subscribers >= self.max_subscribers:
+            return None
+        self.subscribers += 1
+        EVENT_SUBSCRIBERS.inc()
+        return Subscription(self)
+
+    def publish(
+        self,
+        event_type: str,
+        payment_id: Optional[str] = None,
+        previous: Optional[dict] = None,
+        current: Optional[dict] = None,
+        detail: Optional[dict] = None
+    ) -> None:
+        self.seq += 1
+        self.events.append(
+            HubEvent(self.event_id(self.seq), self.seq, event_type, payment_id, previous, current, detail, self.render)
+        )
+        EVENTS_PUBLISHED.labels(event_type).inc()
+        self.wake()
+
+    def wake(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiter is not None:
+            if not self._waiter.done():
+                self._waiter.set_result(None)
+            self._waiter = None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}-{seq}"
+
+    def position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence a stream starts after: now for a new client, or None for an id this hub never issued"""
+        if not last_event_id:
+            return self.seq
+        hub_id, _, seq = last_event_id.strip().rpartition("-")
+        if hub_id != self.id or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def since(self, seq: int) -> Optional[List[HubEvent]]:
+        """Events after seq, or None when some of them have already left the buffer"""
+        if seq >= self.seq:
+            return []
+        first = self.seq - len(self.events) + 1
+        if seq + 1 < first:
+            return None
+        return list(itertools.islice(self.events, seq + 1 - first, None))
+
+    async def wait(self, seq: int) -> bool:
+        """Wait for an event after seq; False when the heartbeat came first"""
+        if self.seq > seq:
+            return True
+        if self._waiter is None:
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            # One timer for every idle stream rather than a timeout per stream
+            self._timer = loop.call_later(self.heartbeat_seconds, self.wake)
+        # Shielded: a stream closing must not cancel the waiter the others share
+        await asyncio.shield(self._waiter)
+        return self.seq > seq
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import math
+import re
+from enum import Enum
+from typing import Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+
+SEARCH_FIELDS = ("payee_first_name", "payee_last_name", "payee_email")
+# Longest n-gram stored per field; any substring up to this length is an exact lookup
+MAX_GRAM = 3
+# Fuzzy matching compares bigrams; a match must share this fraction of the term's bigrams
+FUZZY_GRAM = 2
+FUZZY_THRESHOLD = 0.5
+# Derived fields are internal and never returned to API clients
+SEARCH_PROJECTION = {"search_grams": 0, "search_tokens": 0}
+
+_TOKEN_SPLIT = re.compile(r"[\W_]+")
+
+
+class SearchMode(str, Enum):
+    SUBSTRING = "substring"
+    PREFIX = "prefix"
+    EXACT_EMAIL = "exact_email"
+    FUZZY = "fuzzy"
+
+
+def normalize(value: Optional[str]) -> str:
+    return str(value).strip().lower() if value is not None else ""
+
+
+def ngrams(text: str, min_size: int = 1, max_size: int = MAX_GRAM) -> Set[str]:
+    return {
+        text[start:start + size]
+        for size in range(min_size, max_size + 1)
+        for start in range(len(text) - size + 1)
+    }
+
+
+def tokens(payment: dict) -> Set[str]:
+    result = set()
+    for field in ("payee_first_name", "payee_last_name"):
+        result.update(token for token in _TOKEN_SPLIT.split(normalize(payment.get(field))) if token)
+    email = normalize(payment.get("payee_email"))
+    if email:
+        local_part, _, domain = email.partition("@")
+        result.update({email, local_part, domain})
+        result.update(token for token in _TOKEN_SPLIT.split(local_part) if token)
+    result.discard("")
+    return result
+
+
+def build_search_fields(payment: dict) -> Dict[str, List[str]]:
+    """Derived, lowercased fields that let every search mode use an index"""
+    grams = set()
+    for field in SEARCH_FIELDS:
+        grams.update(ngrams(normalize(payment.get(field))))
+    return {"search_grams": sorted(grams), "search_tokens": sorted(tokens(payment))}
+
+
+def search_fields_changed(update_data: dict) -> bool:
+    return any(field in update_data for field in SEARCH_FIELDS)
+
+
+def _fields_regex(pattern: str) -> dict:
+    return {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in SEARCH_FIELDS]}
+
+
+def build_search_query(term: str, mode: SearchMode = SearchMode.SUBSTRING) -> dict:
+    term = normalize(term)
+    if not term:
+        return {}
+
+    if mode == SearchMode.PREFIX:
+        # Anchored, case-sensitive regex on lowercased tokens is an index range scan
+        return {"search_tokens": {"$regex": "^" + re.escape(term)}}
+
+    if mode == SearchMode.EXACT_EMAIL:
+        return {
+            "search_tokens": term,
+            "payee_email": {"$regex": "^" + re.escape(term) + "$", "$options": "i"}
+        }
+
+    if mode == SearchMode.FUZZY:
+        size = min(FUZZY_GRAM, len(term))
+        grams = sorted(ngrams(term, size, size))
+        required = max(1, math.ceil(len(grams) * FUZZY_THRESHOLD))
+        return {
+            "search_grams": {"$in": grams},
+            "$expr": {"$gte": [{"$size": {"$setIntersection": [{"$ifNull": ["$search_grams", []]}, grams]}}, required]}
+        }
+
+    # Substring: every substring up to MAX_GRAM characters is stored, so short terms
+    # are an exact lookup. Longer terms narrow candidates by their trigrams and then
+    # confirm the match on the original fields.
+    if len(term) <= MAX_GRAM:
+        return {"search_grams": term}
+    query = {"search_grams": {"$all": sorted(ngrams(term, MAX_GRAM, MAX_GRAM))}}
+    query.update(_fields_regex(re.escape(term)))
+    return query
+
+
+def matches_search(payment: dict, term: str, mode: SearchMode = SearchMode.SUBSTRING) -> bool:
+    """Whether build_search_query(term, mode) would select this payment, checked in memory"""
+    term = normalize(term)
+    if not term:
+        return True
+    if mode == SearchMode.PREFIX:
+        return any(token.startswith(term) for token in tokens(payment))
+    if mode == SearchMode.EXACT_EMAIL:
+        return normalize(payment.get("payee_email")) == term
+    if mode == SearchMode.FUZZY:
+        size = min(FUZZY_GRAM, len(term))
+        grams = ngrams(term, size, size)
+        required = max(1, math.ceil(len(grams) * FUZZY_THRESHOLD))
+        return len(grams & set(build_search_fields(payment)["search_grams"])) >= required
+    return any(term in normalize(payment.get(field)) for field in SEARCH_FIELDS)
+
+
+async def backfill_search_fields(collection, batch_size: int = 1000, rebuild: bool = False) -> int:
+    """Populate the derived search fields on documents written before they existed"""
+    query = {} if rebuild else {"search_tokens": {"$exists": False}}
+    projection = {field: 1 for field in SEARCH_FIELDS}
+    updated = 0
+    batch: List[UpdateOne] = []
+    async for payment in collection.find(query, projection).batch_size(batch_size):
+        batch.append(UpdateOne({"_id": payment["_id"]}, {"$set": build_search_fields(payment)}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def main(batch_size: int, rebuild: bool) -> None:
+    Logger.setup_logging()
+    logger = Logger.get_logger(__name__)
+    await MongoDB.connect()
+    try:
+        collection = MongoDB.db[settings.config.mongodb.collections.payments]
+        updated = await backfill_search_fields(collection, batch_size, rebuild)
+        logger.info(f"Backfilled search fields on {updated} payments")
+    finally:
+        await MongoDB.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill derived payee search fields")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rebuild", action="store_true", help="recompute fields on every document")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.rebuild))
@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from bson import Binary
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.logging import Logger
+from app.db.mongodb import MongoDB
+
+logger = Logger.get_logger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedResponse":
+        return cls(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+# A loader returns the rendered response and the tags that invalidate it
+Loader = Callable[[], Awaitable[Tuple[CachedResponse, Iterable[str]]]]
+
+
+class SharedCache:
+    """A cache tier shared by every worker process; entries carry tags for invalidation"""
+
+    async def get(self, key: str) -> Optional[Tuple[CachedResponse, Set[str]]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: CachedResponse, ttl_seconds: float, tags: Set[str]) -> None:
+        raise NotImplementedError
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MongoSharedCache(SharedCache):
+    """Entries in a MongoDB collection, expired by a TTL index on expires_at"""
+
+    @property
+    def collection(self):
+        return MongoDB.db[settings.config.mongodb.collections.response_cache]
+
+    async def get(self, key: str) -> Optional[Tuple[CachedResponse, Set[str]]]:
+        document = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        if not document:
+            return None
+        return CachedResponse(bytes(document["body"]), document["etag"]), set(document["tags"])
+
+    async def set(self, key: str, value: CachedResponse, ttl_seconds: float, tags: Set[str]) -> None:
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                "body": Binary(value.body),
+                "etag": value.etag,
+                "tags": sorted(tags),
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+            },
+            upsert=True
+        )
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        await self.collection.delete_many({"$or": [{"_id": {"$in": list(keys)}}, {"tags": {"$in": list(tags)}}]})
+
+    async def clear(self) -> None:
+        await self.collection.delete_many({})
+
+
+SHARED_BACKENDS = {"mongodb": MongoSharedCache}
+
+
+class GenerationMarker:
+    """A counter in MongoDB that a process bumps after a bulk change, for every worker to see.
+
+    Workers read it at most every check_seconds, so what they cached before another
+    process's bump is dropped within that time instead of when it expires.
+    """
+
+    def __init__(self, name: str, check_seconds: float):
+        self.name = name
+        self.check_seconds = check_seconds
+        self._seen: Optional[int] = None
+        self._next_check = 0.0
+
+    @property
+    def collection(self):
+        return MongoDB.db[settings.config.mongodb.collections.cache_generations]
+
+    async def bump(self) -> None:
+        await self.collection.update_one({"_id": self.name}, {"$inc": {"generation": 1}}, upsert=True)
+
+    async def changed(self) -> bool:
+        """Whether the counter moved since it was last read; False until the next read is due"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_seconds
+        try:
+            document = await self.collection.find_one({"_id": self.name})
+        except PyMongoError as e:
+            logger.error(f"Reading cache generation {self.name} failed: {e}")
+            return False
+        generation = document["generation"] if document else 0
+        changed = self._seen is not None and generation != self._seen
+        self._seen = generation
+        return changed
+
+
+class ResponseCache:
+    """Read-through cache of rendered responses.
+
+    A bounded LRU+TTL tier lives in each process, optionally backed by a shared tier. Concurrent
+    misses for the same key wait on a single load. Entries are invalidated by key or by tag; a
+    load that overlaps an invalidation is returned to the callers already waiting on it, but
+    not stored or joined by later callers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int = 10000,
+        shared: Optional[SharedCache] = None,
+        shared_ttl_seconds: Optional[float] = None,
+        enabled: bool = True
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds or ttl_seconds
+        self.enabled = enabled and ttl_seconds > 0
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse, Set[str]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache":
+        cache_config = settings.config.cache
+        shared_backend = SHARED_BACKENDS.get(cache_config.shared_backend)
+        return cls(
+            cache_config.ttl_seconds,
+            cache_config.max_entries,
+            shared=shared_backend() if shared_backend else None,
+            shared_ttl_seconds=cache_config.shared_ttl_seconds,
+            enabled=cache_config.enabled
+        )
+
+    async def get_or_load(self, key: str, loader: Loader) -> CachedResponse:
+        if not self.enabled:
+            value, _ = await loader()
+            return value
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._discard(key)
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._inflight.pop(key) if self._inflight.get(key) is done else None)
+        else:
+            self.collapsed += 1
+        # Shielded so one caller going away does not cancel the load the others wait on
+        return await asyncio.shield(future)
+
+    async def _load(self, key: str, loader: Loader) -> CachedResponse:
+        generation = self._generation
+        shared_entry = await self._shared_call("get", key) if self.shared else None
+        if shared_entry is not None:
+            self.shared_hits += 1
+            value, tags = shared_entry
+        else:
+            self.misses += 1
+            value, tags = await loader()
+            tags = set(tags)
+            if self.shared and generation == self._generation:
+                await self._shared_call("set", key, value, self.shared_ttl_seconds, tags)
+        if generation == self._generation:
+            self._store(key, value, tags)
+        return value
+
+    def _store(self, key: str, value: CachedResponse, tags: Set[str]) -> None:
+        self._discard(key)
+        tags = tags | {key}
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        keys, tags = set(keys), set(tags)
+        self._generation += 1
+        # A load in flight may have read before the write; callers from now on start their own.
+        # Its tags are only known once it finishes, so invalidating a tag detaches every load
+        if tags:
+            self._inflight.clear()
+        for key in keys:
+            self._inflight.pop(key, None)
+        for tag in tags:
+            keys.update(self._tags.get(tag, ()))
+        self.invalidations += sum(self._discard(key) for key in keys)
+        if self.shared:
+            await self._shared_call("invalidate", keys, tags)
+
+    def clear_local(self) -> None:
+        """Drop this process's entries and detach its loads in flight, leaving the shared tier"""
+        self._generation += 1
+        self._inflight.clear()
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+
+    async def clear(self) -> None:
+        self.clear_local()
+        if self.shared:
+            await self._shared_call("clear")
+
+    async def _shared_call(self, method: str, *args):
+        # The shared tier is an optimisation; when it is unavailable requests fall through to MongoDB
+        try:
+            return await getattr(self.shared, method)(*args)
+        except PyMongoError as e:
+            logger.error(f"Shared response cache {method} failed: {e}")
+            return None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses + self.collapsed
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "invalidations": self.invalidations,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0
+        }
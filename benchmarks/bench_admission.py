@@ -0,0 +1,108 @@
+"""Latency of cheap lookups during a burst of slow list requests, with and without admission control.
+
+The app's handlers stand in for MongoDB with a semaphore the size of the connection pool:
+lookups hold a connection for 2ms, list pages for 20ms. A burst of list requests arrives
+with lookups mixed in. Without admission control everything queues on the pool in
+arrival order; with it, lookups go ahead of lists and lists beyond the budget get 503.
+
+    python -m benchmarks.bench_admission [--requests 3000] [--pool 20]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.core.admission import AdmissionMiddleware
+from app.core.config import AdmissionClassConfig, AdmissionConfig
+from benchmarks.common import print_table, summarize
+
+
+def build_app(pool_size: int, admission: bool) -> FastAPI:
+    app = FastAPI()
+    pool = asyncio.Semaphore(pool_size)
+
+    @app.get("/api/v1/payment/{payment_id}")
+    async def get_payment(payment_id: str):
+        async with pool:
+            await asyncio.sleep(0.002)
+        return {"_id": payment_id}
+
+    @app.get("/api/v1/payments")
+    async def get_payments():
+        async with pool:
+            await asyncio.sleep(0.02)
+        return {"items": []}
+
+    if admission:
+        config = AdmissionConfig(
+            max_concurrency=pool_size,
+            reserved_writes=0,
+            classes={
+                "lookup": AdmissionClassConfig(priority=0, max_queue=1000, max_wait_ms=100),
+                "list": AdmissionClassConfig(priority=2, max_queue=200, max_wait_ms=250),
+            },
+            routes={"GET /api/v1/payment/{payment_id}": "lookup"},
+            default_write_class="list",
+        )
+        app.add_middleware(AdmissionMiddleware, routes=app.routes, config=config)
+    return app
+
+
+async def call(app, path: str) -> int:
+    status = 0
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def burst(app, requests: int, lookup_every: int):
+    samples = {"lookup": [], "list": []}
+    shed = {"lookup": 0, "list": 0}
+
+    async def one(i):
+        kind = "lookup" if i % lookup_every == 0 else "list"
+        path = f"/api/v1/payment/{i}" if kind == "lookup" else "/api/v1/payments"
+        # Arrivals spread over the first half second rather than all at once
+        await asyncio.sleep(i / requests * 0.5)
+        start = time.perf_counter()
+        status = await call(app, path)
+        if status == 503:
+            shed[kind] += 1
+        else:
+            samples[kind].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return samples, shed
+
+
+async def main(args) -> None:
+    rows = {}
+    for admission in (False, True):
+        label = "with admission" if admission else "without admission"
+        samples, shed = await burst(build_app(args.pool, admission), args.requests, args.lookup_every)
+        for kind in ("lookup", "list"):
+            rows[f"{kind} {label}"] = summarize(samples[kind])
+        print(f"{label}: shed {shed['lookup']} lookups and {shed['list']} list requests")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--pool", type=int, default=20)
+    parser.add_argument("--lookup-every", type=int, default=5, help="one request in this many is a lookup")
+    asyncio.run(main(parser.parse_args()))
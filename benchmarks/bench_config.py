@@ -0,0 +1,45 @@
+"""Per-request config overhead of /api/v1/payments.
+
+Every request builds a PaymentRepository, which reads the config twice. This
+compares re-parsing the YAML file on each read (the old property) with the
+cached snapshot, with and without mtime-based hot reload.
+
+    python -m benchmarks.bench_config [iterations]
+"""
+import sys
+
+import yaml
+
+from app.core.config import Settings
+from benchmarks.common import print_table, summarize, time_calls
+
+
+def main(iterations: int = 5000) -> None:
+    cached = Settings(config_reload=False)
+    reloading = Settings(config_reload=True, config_reload_interval=0)
+
+    def parse_per_read():
+        for _ in range(2):
+            with open(cached.config_file, 'r') as f:
+                yaml.safe_load(f)["mongodb"]["collections"]["payments"]
+
+    def cached_snapshot():
+        for _ in range(2):
+            cached.config.mongodb.collections.payments
+
+    def reloading_snapshot():
+        for _ in range(2):
+            reloading.config.mongodb.collections.payments
+
+    rows = {
+        "yaml parse per read (before)": summarize(time_calls(parse_per_read, iterations)),
+        "cached snapshot": summarize(time_calls(cached_snapshot, iterations)),
+        "cached snapshot + mtime check": summarize(time_calls(reloading_snapshot, iterations)),
+    }
+    print_table(rows)
+    saved = rows["yaml parse per read (before)"]["mean_us"] - rows["cached snapshot"]["mean_us"]
+    print(f"\nper-request overhead removed: {saved:.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
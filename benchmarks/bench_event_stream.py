@@ -0,0 +1,80 @@
+"""Fan-out of payment events to many open streams, as dashboards subscribed to /payments/stream.
+
+--subscribers streams read PaymentService.stream_events (half of them filtered on a status)
+while --events updates are published at --rate per second through PaymentService.publish_change.
+Reports the time from publish to a frame reaching each stream, and the CPU spent per
+event, which replaces a count plus find per dashboard per poll.
+
+    python -m benchmarks.bench_event_stream [--subscribers 1000] [--events 2000] [--rate 500]
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+from app.services.payment_service import PaymentService
+from benchmarks.common import print_table, summarize
+from benchmarks.inmemory import connect_in_memory
+
+STATUSES = ("pending", "due_now", "overdue", "completed")
+
+
+def payment(i: int) -> dict:
+    return {
+        "_id": f"p{i % 500}", "payee_first_name": "Ada", "payee_last_name": f"Lovelace{i}",
+        "payee_payment_status": STATUSES[i % len(STATUSES)], "payee_email": "ada@example.com",
+        "currency": "USD", "due_amount": Decimal(100 + i), "discount_percent": Decimal(5), "tax_percent": Decimal(10),
+    }
+
+
+async def run(subscribers: int, events: int, rate: float):
+    service = PaymentService()
+    published = {}
+    samples = []
+    delivered = 0
+
+    async def consume(index: int):
+        nonlocal delivered
+        status = STATUSES[index % len(STATUSES)] if index % 2 else None
+        async for chunk in service.stream_events(PaymentService.event_hub.subscribe(), payee_payment_status=status):
+            now = time.perf_counter()
+            for line in chunk.split(b"\n"):
+                if line.startswith(b"id: "):
+                    seq = int(line.rsplit(b"-", 1)[1])
+                    samples.append(now - published[seq])
+                    delivered += 1
+
+    consumers = [asyncio.create_task(consume(i)) for i in range(subscribers)]
+    await asyncio.sleep(0.1)
+    hub = PaymentService.event_hub
+    cpu = time.process_time()
+    for i in range(events):
+        published[hub.seq + 1] = time.perf_counter()
+        PaymentService.publish_change(payment(i), payment(i + 1))
+        await asyncio.sleep(1 / rate)
+    await asyncio.sleep(0.5)
+    cpu = time.process_time() - cpu
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    return samples, delivered, cpu
+
+
+async def main(args) -> None:
+    # Nothing is read or written; the service only needs a database to construct
+    connect_in_memory()
+    rows = {}
+    for subscribers in args.subscribers:
+        samples, delivered, cpu = await run(subscribers, args.events, args.rate)
+        label = f"{subscribers} streams"
+        rows[label] = summarize(samples)
+        print(f"{label}: {delivered} frames delivered, {cpu / args.events * 1e6:.0f}us CPU per published event")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""Concurrent evidence uploads and downloads through the ASGI app.
+
+Uploads and downloads run concurrently against a real MongoDB while a probe task
+measures event-loop stalls, which is what blocked workers show up as.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_evidence [--size-mb 50 --concurrency 8]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.db.codecs import CODEC_OPTIONS
+from app.db.mongodb import MongoDB
+from benchmarks.common import percentile
+
+
+async def loop_lag_probe(samples: list, stop: asyncio.Event, interval: float = 0.01) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def main(size_mb: int, concurrency: int) -> None:
+    from main import app
+
+    MongoDB.client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    MongoDB.db = MongoDB.client.get_database("pms_bench", codec_options=CODEC_OPTIONS)
+    payload = os.urandom(size_mb * 1024 * 1024)
+    lag, stop = [], asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(lag, stop))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def upload(i: int) -> str:
+            response = await client.post(
+                f"/api/v1/payment/bench-{i}/upload_evidence",
+                files={"file": (f"invoice-{i}.pdf", payload, "application/pdf")}
+            )
+            response.raise_for_status()
+            return response.json()
+
+        start = time.perf_counter()
+        file_ids = await asyncio.gather(*(upload(i) for i in range(concurrency)))
+        upload_seconds = time.perf_counter() - start
+
+        async def download(file_id: str) -> int:
+            response = await client.get(f"/api/v1/payment/download_evidence/{file_id}")
+            response.raise_for_status()
+            return len(response.content)
+
+        start = time.perf_counter()
+        sizes = await asyncio.gather(*(download(file_id) for file_id in file_ids))
+        download_seconds = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    total_mb = size_mb * concurrency
+    assert all(size == len(payload) for size in sizes)
+    print(f"uploads:   {concurrency} x {size_mb} MB in {upload_seconds:.2f}s ({total_mb / upload_seconds:.1f} MB/s)")
+    print(f"downloads: {concurrency} x {size_mb} MB in {download_seconds:.2f}s ({total_mb / download_seconds:.1f} MB/s)")
+    print(f"event loop lag: p50 {percentile(lag, 50) * 1e3:.1f} ms, p99 {percentile(lag, 99) * 1e3:.1f} ms, "
+          f"max {max(lag, default=0) * 1e3:.1f} ms")
+    MongoDB.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.size_mb, args.concurrency))
@@ -0,0 +1,121 @@
+"""Request latency under concurrent load with logging off, handled inline, and queued.
+
+A one-route ASGI app logs two records per request while `concurrency` requests are in
+flight. "inline" runs a RotatingFileHandler on the event loop as the old configuration
+did; "queued" is the QueueHandler/QueueListener pipeline from app/core/logging.py with
+the same handler behind it. A small maxBytes forces frequent rollovers, and --write-delay-ms
+simulates a slow or contended disk by sleeping in every write.
+
+    python -m benchmarks.bench_logging [--requests 20000] [--concurrency 64] [--write-delay-ms 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from fastapi import FastAPI
+
+from app.core.logging import LOG_RECORDS_DROPPED, BatchingQueueListener, DroppingQueueHandler, JsonFormatter, RequestIdMiddleware
+from benchmarks.bench_metrics import call
+from benchmarks.common import print_table, summarize
+
+logger = logging.getLogger("bench.requests")
+logger.propagate = False
+
+
+class SlowRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, *args, delay_seconds: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay_seconds = delay_seconds
+
+    def emit(self, record):
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        super().emit(record)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/payment/{payment_id}")
+    async def get_payment(payment_id: str):
+        logger.info("Fetching payment %s", payment_id)
+        logger.info("Fetched payment", extra={"payment_id": payment_id, "cache": "miss"})
+        return {"_id": payment_id}
+
+    app.add_middleware(RequestIdMiddleware)
+    return app
+
+
+def file_handler(directory: str, delay_seconds: float) -> logging.Handler:
+    handler = SlowRotatingFileHandler(
+        os.path.join(directory, "bench.log"), maxBytes=1024 * 1024, backupCount=2, delay_seconds=delay_seconds
+    )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+async def time_concurrent(app, requests: int, concurrency: int):
+    samples = []
+    numbers = iter(range(requests))
+
+    async def worker():
+        for i in numbers:
+            start = time.perf_counter()
+            await call(app, f"/api/v1/payment/{i}")
+            samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def run_case(app, mode: str, args, directory: str):
+    logger.handlers = []
+    listener = None
+    if mode == "off":
+        logger.setLevel(logging.WARNING)
+    else:
+        logger.setLevel(logging.INFO)
+        handler = file_handler(directory, args.write_delay_ms / 1000)
+        if mode == "inline":
+            logger.addHandler(handler)
+        else:
+            queue_handler = DroppingQueueHandler(queue.SimpleQueue(), args.queue_size)
+            logger.addHandler(queue_handler)
+            listener = BatchingQueueListener(queue_handler.queue, handler)
+            listener.start()
+    await time_concurrent(app, 500, args.concurrency)
+    started = time.perf_counter()
+    samples = await time_concurrent(app, args.requests, args.concurrency)
+    elapsed = time.perf_counter() - started
+    if listener:
+        listener.stop()
+    for handler in logger.handlers:
+        handler.close()
+    return samples, elapsed
+
+
+async def main(args) -> None:
+    app = build_app()
+    rows = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("off", "inline", "queued"):
+            dropped_before = LOG_RECORDS_DROPPED.labels("queue_full")._value.get()
+            samples, elapsed = await run_case(app, mode, args, directory)
+            dropped = LOG_RECORDS_DROPPED.labels("queue_full")._value.get() - dropped_before
+            rows[f"logging {mode}"] = summarize(samples)
+            print(f"logging {mode}: {len(samples) / elapsed:.0f} req/s, {dropped:.0f} records dropped")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="sleep in every handler write")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
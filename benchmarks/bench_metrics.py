@@ -0,0 +1,87 @@
+"""Per-request cost of the metrics middleware and per-command cost of the MongoDB listener.
+
+Requests are driven straight through the ASGI interface of a one-route app, with and
+without MetricsMiddleware, so only the framework and instrumentation are measured.
+Listener callbacks are fed synthetic driver events.
+
+    python -m benchmarks.bench_metrics [iterations]
+"""
+import asyncio
+import sys
+import time
+from datetime import timedelta
+
+from fastapi import FastAPI
+from pymongo import monitoring
+
+from app.core.metrics import MetricsMiddleware
+from app.db.monitoring import CommandMetricsListener
+from benchmarks.common import print_table, summarize, time_calls
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/payment/{payment_id}")
+    async def get_payment(payment_id: str):
+        return {"_id": payment_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def time_requests(app, iterations: int):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await call(app, f"/api/v1/payment/{i}")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def listener_round_trip(listener: CommandMetricsListener, command: dict):
+    def run():
+        listener.started(monitoring.CommandStartedEvent(command, "pms", 1, ("localhost", 27017), 1))
+        listener.succeeded(monitoring.CommandSucceededEvent(
+            timedelta(microseconds=800), {"ok": 1}, "find", 1, ("localhost", 27017), 1
+        ))
+    return run
+
+
+async def main(iterations: int) -> None:
+    plain, instrumented = build_app(False), build_app(True)
+    # Warm up routing and label children
+    await time_requests(plain, 100)
+    await time_requests(instrumented, 100)
+
+    command = {"find": "payments", "filter": {"is_deleted": {"$ne": True}}, "limit": 51, "$db": "pms"}
+    rows = {
+        "request without middleware": summarize(await time_requests(plain, iterations)),
+        "request with MetricsMiddleware": summarize(await time_requests(instrumented, iterations)),
+        "command listener started+succeeded": summarize(time_calls(listener_round_trip(CommandMetricsListener(), command), iterations)),
+    }
+    print_table(rows)
+    overhead = rows["request with MetricsMiddleware"]["p50_us"] - rows["request without middleware"]["p50_us"]
+    print(f"middleware overhead at p50: {overhead:.1f}us per request")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args or [20000])))
@@ -0,0 +1,92 @@
+"""Page 1 vs page 10,000 latency for offset and keyset pagination.
+
+Needs a running MongoDB; documents are seeded into a scratch database.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_pagination [--docs N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+
+from app.db.codecs import CODEC_OPTIONS
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_repository import PaymentRepository
+from benchmarks.common import print_table, summarize
+
+
+async def seed(collection, docs: int) -> None:
+    # Reseed scratch data left over from before dates were stored as BSON dates
+    legacy = await collection.find_one({"payee_added_date_utc": {"$type": "string"}})
+    if await collection.estimated_document_count() >= docs and not legacy:
+        return
+    await collection.drop()
+    batch = []
+    base = 1_600_000_000
+    for i in range(docs):
+        batch.append({
+            "_id": str(ObjectId()),
+            "payee_first_name": f"first{i}",
+            "payee_last_name": f"last{i}",
+            "payee_payment_status": random.choice(["pending", "overdue", "due_now", "completed"]),
+            "payee_added_date_utc": datetime.fromtimestamp(base + random.randint(0, 100_000_000), timezone.utc),
+            "payee_due_date": datetime(2025, 1, 1, tzinfo=timezone.utc),
+            "due_amount": Decimal("100.00"),
+        })
+        if len(batch) == 10_000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    await collection.create_index([("payee_added_date_utc", DESCENDING), ("_id", DESCENDING)])
+
+
+async def time_async(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(docs: int, page_size: int, deep_page: int, iterations: int) -> None:
+    MongoDB.client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    MongoDB.db = MongoDB.client.get_database("pms_bench", codec_options=CODEC_OPTIONS)
+    repository = PaymentRepository()
+    await seed(repository.collection_payment, docs)
+
+    # The keyset position of the deep page is the last row of the page before it
+    skip = (deep_page - 1) * page_size
+    boundary = await repository.get_payments(skip=skip - 1, limit=1)
+    after = (boundary[0]["payee_added_date_utc"], boundary[0]["_id"])
+
+    rows = {
+        "offset page 1": summarize(await time_async(
+            lambda: repository.get_payments(skip=0, limit=page_size), iterations)),
+        f"offset page {deep_page}": summarize(await time_async(
+            lambda: repository.get_payments(skip=skip, limit=page_size), iterations)),
+        "keyset page 1": summarize(await time_async(
+            lambda: repository.get_payments(limit=page_size, after=None), iterations)),
+        f"keyset page {deep_page}": summarize(await time_async(
+            lambda: repository.get_payments(limit=page_size, after=after), iterations)),
+    }
+    print_table(rows)
+    MongoDB.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=600_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--deep-page", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.page_size, args.deep_page, args.iterations))
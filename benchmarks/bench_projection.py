@@ -0,0 +1,55 @@
+"""Client-side cost of one list page with all fields vs a ?fields= projection.
+
+MongoDB returns only the projected fields, so the client decodes less BSON and renders
+less JSON. Each case decodes the BSON a server would send for one page (full documents,
+or only PaymentService.stored_projection of the list UI's fields), computes total_due and
+renders the items with orjson. Documents are real CSV rows in their stored shape.
+
+    python -m benchmarks.bench_projection [page_size] [iterations]
+"""
+import sys
+
+import bson
+
+from app.db.codecs import CODEC_OPTIONS
+from app.db.repositories.payment_repository import INTERNAL_FIELDS_PROJECTION
+from app.services.payment_service import PaymentService
+from benchmarks.bench_serialization import load_documents, time_cpu
+from benchmarks.common import print_table, summarize
+
+LIST_UI_FIELDS = "payee_first_name,payee_last_name,payee_payment_status,payee_due_date,total_due"
+
+
+def wire_page(documents: list, projection: dict = None) -> bytes:
+    if projection is None:
+        documents = [{field: value for field, value in document.items() if field not in INTERNAL_FIELDS_PROJECTION} for document in documents]
+    else:
+        documents = [{field: document[field] for field in projection if field in document} for document in documents]
+    return b"".join(bson.encode(document, codec_options=CODEC_OPTIONS) for document in documents)
+
+
+def render_page(data: bytes, fields: list = None) -> bytes:
+    service = PaymentService.__new__(PaymentService)
+    payments = bson.decode_all(data, CODEC_OPTIONS)
+    for payment in payments:
+        service.calculate_total_due(payment)
+    return PaymentService.render({"items": [PaymentService.trusted_payment(payment, fields) for payment in payments]}).body
+
+
+def main(page_size: int = 100, iterations: int = 500) -> None:
+    documents = load_documents(page_size)
+    fields = PaymentService.parse_fields(LIST_UI_FIELDS)
+    cases = {
+        "all fields": (wire_page(documents), None),
+        f"fields={LIST_UI_FIELDS.count(',') + 1} list UI fields": (wire_page(documents, PaymentService.stored_projection(fields)), fields),
+    }
+    results = {}
+    for name, (data, selected) in cases.items():
+        results[name] = summarize(time_cpu(lambda: render_page(data, selected), iterations))
+        print(f"{name}: {len(data)} BSON bytes in, {len(render_page(data, selected))} JSON bytes out per page")
+    print_table(results)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,86 @@
+"""Payee search latency versus collection size: legacy unanchored $regex vs indexed search fields.
+
+Needs a running MongoDB; each size is seeded into its own scratch collection.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_search [--sizes 10000 100000 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import string
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+
+from app.utils.payee_search import SEARCH_FIELDS, SearchMode, build_search_fields, build_search_query
+from benchmarks.common import print_table, summarize
+
+TERMS = ["smi", "smith", "son@", "gmail.com", "zzqx"]
+
+
+def random_word(length: int) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length)).capitalize()
+
+
+async def seed(collection, size: int) -> None:
+    if await collection.estimated_document_count() == size:
+        return
+    await collection.drop()
+    batch = []
+    for _ in range(size):
+        first, last = random_word(random.randint(4, 9)), random.choice([random_word(7), "Smith", "Johnson"])
+        payment = {
+            "_id": str(ObjectId()),
+            "payee_first_name": first,
+            "payee_last_name": last,
+            "payee_email": f"{first.lower()}.{last.lower()}@{random.choice(['gmail.com', 'example.org'])}",
+        }
+        payment.update(build_search_fields(payment))
+        batch.append(payment)
+        if len(batch) == 10_000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    await collection.create_index([("search_grams", ASCENDING)])
+    await collection.create_index([("search_tokens", ASCENDING)])
+
+
+async def time_query(collection, query: dict, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await collection.find(query).limit(50).to_list(length=50)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(sizes, iterations: int) -> None:
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    db = client["pms_bench"]
+    for size in sizes:
+        collection = db[f"search_{size}"]
+        await seed(collection, size)
+        rows = {}
+        for term in TERMS:
+            legacy = {"$or": [{field: {"$regex": re.escape(term), "$options": "i"}} for field in SEARCH_FIELDS]}
+            rows[f"regex '{term}'"] = summarize(await time_query(collection, legacy, iterations))
+            rows[f"substring '{term}'"] = summarize(await time_query(collection, build_search_query(term), iterations))
+            rows[f"prefix '{term}'"] = summarize(
+                await time_query(collection, build_search_query(term, SearchMode.PREFIX), iterations)
+            )
+        print(f"\n{size} documents")
+        print_table(rows)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.iterations))
@@ -0,0 +1,75 @@
+"""CPU cost of turning one page of stored payments into a JSON response body.
+
+Compares the validated path (Payment(**doc) per row, PaginatedPaymentResponse,
+jsonable_encoder and json.dumps, as FastAPI did for GET /payments) with the
+trusted path (field projection of the stored dicts and orjson). Documents are
+real rows from the CSV run through the ingest normalization, so they have the
+stored shape. Times are process CPU time, so pages per second is per core.
+
+    python -m benchmarks.bench_serialization [page_size] [iterations]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.models.payment import Payment
+from app.models.schemas.pagination_payment_response import PaginatedPaymentResponse
+from app.services.payment_service import PaymentService
+from app.utils.csv_load_service import CSV_READ_OPTIONS, normalize_chunk, validate_chunk
+from benchmarks.common import print_table, summarize
+
+
+def load_documents(count: int) -> list:
+    df = pd.read_csv(settings.config.data.file_path, nrows=count, **CSV_READ_OPTIONS)
+    documents, _, _ = validate_chunk(normalize_chunk(df, datetime.now(timezone.utc)))
+    return documents
+
+
+def page_metadata(page_size: int) -> dict:
+    return {
+        "total": 10000, "total_is_estimate": False, "page": 1, "page_size": page_size,
+        "total_pages": 10000 // page_size, "has_next": True, "has_previous": False, "next_cursor": "abc"
+    }
+
+
+def validated(documents: list, page_size: int) -> bytes:
+    response = PaginatedPaymentResponse(items=[Payment(**document) for document in documents], **page_metadata(page_size))
+    return json.dumps(
+        jsonable_encoder(response), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def trusted(documents: list, page_size: int) -> bytes:
+    page = {"items": [PaymentService.trusted_payment(document) for document in documents], **page_metadata(page_size)}
+    return PaymentService.render(page).body
+
+
+def time_cpu(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.process_time()
+        fn()
+        samples.append(time.process_time() - start)
+    return samples
+
+
+def main(page_size: int = 100, iterations: int = 500) -> None:
+    documents = load_documents(page_size)
+    assert json.loads(validated(documents, page_size)) == json.loads(trusted(documents, page_size))
+
+    results = {}
+    for name, fn in (("validated (Payment + jsonable_encoder)", validated), ("trusted (dict + orjson)", trusted)):
+        results[name] = summarize(time_cpu(lambda: fn(documents, page_size), iterations))
+    print_table(results)
+    for name, stats in results.items():
+        print(f"{name}: {1e6 / stats['mean_us']:.0f} pages/s per core at {page_size} rows")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
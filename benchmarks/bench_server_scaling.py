@@ -0,0 +1,134 @@
+"""Throughput of GET /payments as python -m app.server runs 1, 2, ... worker processes.
+
+For each worker count the server is started with a scratch config, load comes from
+--clients client processes (one client process cannot saturate several workers), and the
+server is stopped with SIGTERM. Needs a running MongoDB holding payments, e.g. the
+database benchmarks.load_test --backend mongod leaves behind.
+
+    python -m benchmarks.load_test --backend mongod --rows 100000 --scenarios list_first_page
+    python -m benchmarks.bench_server_scaling --mongodb-uri mongodb://localhost:27017 [--workers 1 2 4]
+
+Requires httpx.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+try:
+    import httpx
+except ImportError:
+    raise SystemExit("The scaling benchmark needs httpx: pip install httpx")
+import yaml
+
+from benchmarks.report import print_scenarios, scenario_stats
+
+API = "/api/v1"
+STARTUP_TIMEOUT_SECONDS = 120
+
+
+def write_config(args, workers: int) -> str:
+    with open(os.getenv("CONFIG_FILE", "app/config/default.yaml")) as f:
+        config = yaml.safe_load(f)
+    config["server"].update({"port": args.port, "workers": workers, "reload": False})
+    config["mongodb"].update({"uri": args.mongodb_uri, "database": args.database})
+    if args.no_cache:
+        config["cache"]["enabled"] = False
+    fd, path = tempfile.mkstemp(suffix=".yaml")
+    with os.fdopen(fd, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with {server.returncode} during startup")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("Server did not become ready")
+
+
+def client_process(base_url: str, requests: int, concurrency: int) -> Tuple[List[float], int]:
+    async def run():
+        samples: List[float] = []
+        errors = 0
+        remaining = iter(range(requests))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            async def worker():
+                nonlocal errors
+                for _ in remaining:
+                    start = time.perf_counter()
+                    try:
+                        failed = (await client.get(f"{API}/payments", params={"page_size": 20})).status_code >= 400
+                    except httpx.HTTPError:
+                        failed = True
+                    samples.append(time.perf_counter() - start)
+                    errors += failed
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, errors
+
+    return asyncio.run(run())
+
+
+def measure(args, workers: int) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    config_path = write_config(args, workers)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--port", str(args.port)],
+        env={**os.environ, "CONFIG_FILE": config_path},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base_url, server)
+        # Let every worker finish startup, not just the one that answered
+        time.sleep(args.warmup)
+        per_client = args.requests // args.clients
+        with multiprocessing.Pool(args.clients) as pool:
+            started = time.perf_counter()
+            results = pool.starmap(client_process, [(base_url, per_client, args.concurrency)] * args.clients)
+            elapsed = time.perf_counter() - started
+        samples = [sample for client_samples, _ in results for sample in client_samples]
+        return scenario_stats(samples, sum(errors for _, errors in results), elapsed)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        os.remove(config_path)
+
+
+def main(args) -> None:
+    scenarios = {}
+    for workers in args.workers:
+        stats = measure(args, workers)
+        scenarios[f"{workers} workers"] = stats
+        print(f"{workers} workers: {stats['throughput_rps']:.0f} req/s, {stats['errors']} errors")
+    print_scenarios(scenarios)
+
+
+if __name__ == "__main__":
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongodb-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="pms_load_test")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, max(cpus // 2, 1), cpus}))
+    parser.add_argument("--clients", type=int, default=max(cpus // 2, 1), help="client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds after the first ready response")
+    parser.add_argument("--no-cache", action="store_true", help="measure the database path, not cached pages")
+    main(parser.parse_args())
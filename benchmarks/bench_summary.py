@@ -0,0 +1,91 @@
+"""Payment summary from the maintained rollup vs grouping the payments collection per request.
+
+Needs a running MongoDB; documents are seeded into a scratch database. The rollup is
+built twice, once from $inc deltas and once with the server-side rebuild, and the two
+are checked to agree before anything is timed.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_summary [--docs N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.db.codecs import CODEC_OPTIONS
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository
+from benchmarks.common import print_table, summarize
+
+CURRENCIES = ["USD", "CAD", "EUR", "GBP", "INR"]
+STATUSES = ["pending", "overdue", "due_now", "completed"]
+
+
+def random_payment() -> dict:
+    return {
+        "_id": str(ObjectId()),
+        "payee_payment_status": random.choice(STATUSES),
+        "currency": random.choice(CURRENCIES),
+        "payee_due_date": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=random.randint(0, 730)),
+        "due_amount": Decimal(random.randint(100, 1_000_000)) / 100,
+        "discount_percent": Decimal(random.randint(0, 5000)) / 100,
+        "tax_percent": Decimal(random.randint(0, 2500)) / 100,
+    }
+
+
+async def seed(repository: PaymentSummaryRepository, docs: int) -> None:
+    """Insert the payments and feed every batch to the rollup as the CSV loader does"""
+    await repository.collection_payment.drop()
+    await repository.collection_summary.drop()
+    for start in range(0, docs, 10_000):
+        batch = [random_payment() for _ in range(min(10_000, docs - start))]
+        await repository.collection_payment.insert_many(batch, ordered=False)
+        await repository.apply(added=batch)
+
+
+async def time_async(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(docs: int, iterations: int) -> None:
+    MongoDB.client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    MongoDB.db = MongoDB.client.get_database("pms_bench_summary", codec_options=CODEC_OPTIONS)
+    repository = PaymentSummaryRepository()
+    await seed(repository, docs)
+
+    incremental = await repository.get_summary()
+    start = time.perf_counter()
+    rows = await repository.rebuild()
+    print(f"rebuild of {docs} payments: {rows} rows in {time.perf_counter() - start:.2f}s")
+    rebuilt = await repository.get_summary()
+    assert incremental == rebuilt, "incremental rollup and rebuild disagree"
+
+    # The same grouping without $out, as a per-request aggregation would run it
+    group_pipeline = repository.rebuild_pipeline(repository.collection_summary.name)[:-1]
+    print_table({
+        "aggregate payments per request": summarize(await time_async(
+            lambda: repository.collection_payment.aggregate(group_pipeline, allowDiskUse=True).to_list(length=None),
+            max(1, iterations // 10)
+        )),
+        "read rollup": summarize(await time_async(repository.get_summary, iterations)),
+        "read rollup, one currency": summarize(await time_async(lambda: repository.get_summary(currency="EUR"), iterations)),
+    })
+    MongoDB.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.iterations))
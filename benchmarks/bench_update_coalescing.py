@@ -0,0 +1,64 @@
+"""Bursts of single-payment updates through PaymentService.update_payment, one round trip each vs coalesced.
+
+Needs a running MongoDB; payment_information.csv is loaded into a scratch database. Each burst sends
+--updates concurrent address updates spread over --payments ids, so several land on the
+same payment, as processor status callbacks do.
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_update_coalescing [--updates 5000]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.db.codecs import CODEC_OPTIONS
+from app.db.mongodb import MongoDB
+from app.db.repositories.update_coalescer import UpdateCoalescer
+from app.services.payment_service import PaymentService
+from app.utils.csv_load_service import ingest_csv
+from benchmarks.common import print_table, summarize
+
+
+async def burst(updates: int, ids: list, concurrency: int):
+    samples = []
+    numbers = iter(range(updates))
+
+    async def worker():
+        for i in numbers:
+            start = time.perf_counter()
+            await PaymentService().update_payment(ids[i % len(ids)], {"payee_address_line_2": f"Suite {i}"})
+            samples.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def main(args) -> None:
+    MongoDB.client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    MongoDB.db = MongoDB.client.get_database("pms_bench_coalescing", codec_options=CODEC_OPTIONS)
+    await MongoDB.db.payments.drop()
+    await ingest_csv("payment_information.csv", MongoDB.db.payments)
+    ids = [payment["_id"] async for payment in MongoDB.db.payments.find({}, {"_id": 1}).limit(args.payments)]
+
+    rows = {}
+    for window_ms in (None, 1, 5):
+        enabled = window_ms is not None
+        PaymentService.update_coalescer = UpdateCoalescer((window_ms or 0) / 1000, args.max_batch, enabled=enabled)
+        samples, elapsed = await burst(args.updates, ids, args.concurrency)
+        label = f"coalesced, {window_ms}ms window" if enabled else "one update per call"
+        rows[label] = summarize(samples)
+        print(f"{label}: {len(samples) / elapsed:.0f} updates/s")
+    print_table(rows)
+    MongoDB.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-batch", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
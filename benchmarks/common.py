@@ -0,0 +1,39 @@
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6 if samples else 0.0,
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p95_us": percentile(samples, 95) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+    }
+
+
+def time_calls(fn: Callable[[], object], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_table(rows: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'case':<40} {'n':>8} {'mean_us':>12} {'p50_us':>12} {'p95_us':>12} {'p99_us':>12}")
+    for name, stats in rows.items():
+        print(
+            f"{name:<40} {stats['n']:>8} {stats['mean_us']:>12.1f} {stats['p50_us']:>12.1f} "
+            f"{stats['p95_us']:>12.1f} {stats['p99_us']:>12.1f}"
+        )
@@ -0,0 +1,140 @@
+"""Synthetic payments in the schema of payment_information.csv, from thousands to tens of millions of rows.
+
+Rows are generated and written a chunk at a time, so memory stays flat whatever the row
+count. The same seed always produces the same file. Emails embed the row number, which
+keeps the CSV sync natural key (email, added date) unique. --invalid-rate mixes in rows
+that validation rejects, to exercise the reject path.
+
+    python -m benchmarks.generate_data payments_1m.csv --rows 1000000 [--seed 42]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Python strings; fancy indexing copies pointers and + concatenates element-wise without the
+# padding fixed width '<U' arrays grow to on every concatenation
+TEXT = object
+
+COLUMNS = [
+    "payee_first_name", "payee_last_name", "payee_payment_status", "payee_added_date_utc", "payee_due_date",
+    "payee_address_line_1", "payee_address_line_2", "payee_city", "payee_country", "payee_province_or_state",
+    "payee_postal_code", "payee_phone_number", "payee_email", "currency", "discount_percent", "tax_percent",
+    "due_amount",
+]
+
+FIRST_NAMES = np.array([
+    "Andrea", "Nicholas", "April", "James", "Maria", "David", "Linda", "Robert", "Patricia", "Michael",
+    "Jennifer", "William", "Elizabeth", "Richard", "Barbara", "Joseph", "Susan", "Thomas", "Jessica", "Charles",
+    "Sarah", "Christopher", "Karen", "Daniel", "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark",
+    "Margaret", "Donald", "Sandra", "Steven", "Ashley", "Paul", "Kimberly", "Andrew", "Emily", "Joshua",
+    "Donna", "Kenneth", "Michelle", "Kevin", "Dorothy", "Brian", "Carol", "George", "Amanda", "Edward",
+], dtype=TEXT)
+LAST_NAMES = np.array([
+    "Mendoza", "Palmer", "Jones", "Smith", "Johnson", "Williams", "Brown", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore",
+    "Jackson", "Martin", "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez",
+    "Lewis", "Robinson", "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen",
+    "Hill", "Flores", "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell",
+], dtype=TEXT)
+STATUSES = np.array(["pending", "overdue", "due_now", "completed"], dtype=TEXT)
+STREETS = np.array(["Harris", "Kristy", "Sanders", "Maple", "Oak", "Pine", "Cedar", "Elm", "Lake", "Hill"], dtype=TEXT)
+STREET_SUFFIXES = np.array(["Junctions", "Dale", "Islands", "Street", "Avenue", "Road", "Lane", "Court"], dtype=TEXT)
+UNITS = np.array(["", "Apt. ", "Suite "], dtype=TEXT)
+CITIES = np.array([
+    "East Jacqueline", "East William", "New Rachelport", "Port Daniel", "Lake Maria", "South Thomas",
+    "North Karen", "West Paul", "Springfield", "Riverside",
+], dtype=TEXT)
+COUNTRIES = np.array(["CA", "US", "DJ", "VC", "GB", "IN", "NA", "DE", "FR", "AU"], dtype=TEXT)
+STATES = np.array(["South Carolina", "Texas", "Ontario", "California", "New York", "Quebec", "Florida", ""], dtype=TEXT)
+DOMAINS = np.array(["gmail.com", "hotmail.com", "yahoo.com", "example.com", "singh.com"], dtype=TEXT)
+CURRENCIES = np.array(["USD", "CAD", "EUR", "GBP", "INR"], dtype=TEXT)
+CURRENCY_WEIGHTS = np.array([0.6, 0.15, 0.1, 0.1, 0.05])
+TAX_RATES = np.array(["0", "5", "7.25", "13", "20"], dtype=TEXT)
+
+ADDED_FROM = int(pd.Timestamp("2020-01-01", tz="UTC").timestamp())
+DUE_DATES = pd.date_range("2024-01-01", periods=3 * 365, freq="D").strftime("%Y-%m-%d").to_numpy()
+
+
+def pick(rng: np.random.Generator, values: np.ndarray, rows: int, p=None) -> np.ndarray:
+    return values[rng.choice(len(values), size=rows, p=p)]
+
+
+def formatted(numbers: np.ndarray, spec: str = "") -> np.ndarray:
+    return np.array([format(number, spec) for number in numbers.tolist()], dtype=TEXT)
+
+
+def digits(rng: np.random.Generator, low: int, high: int, rows: int, spec: str = "") -> np.ndarray:
+    return formatted(rng.integers(low, high, size=rows), spec)
+
+
+def cents(rng: np.random.Generator, low: int, high: int, rows: int) -> np.ndarray:
+    """Decimal strings with two places between low and high hundredths"""
+    return np.array([f"{value // 100}.{value % 100:02d}" for value in rng.integers(low, high, size=rows).tolist()], dtype=TEXT)
+
+
+def formatted_emails(first: np.ndarray, last: np.ndarray, start: int) -> np.ndarray:
+    return np.array(
+        [f"{first_name}.{last_name}{number}".lower() for number, (first_name, last_name) in enumerate(zip(first.tolist(), last.tolist()), start)],
+        dtype=TEXT
+    )
+
+
+def generate_chunk(rng: np.random.Generator, start: int, rows: int, invalid_rate: float = 0.0) -> dict:
+    """One chunk of rows as column arrays of strings, in COLUMNS order"""
+    first = pick(rng, FIRST_NAMES, rows)
+    last = pick(rng, LAST_NAMES, rows)
+    units = pick(rng, UNITS, rows)
+    due_amount = cents(rng, 100, 500_000, rows)
+    if invalid_rate > 0:
+        due_amount = np.where(rng.random(rows) < invalid_rate, "-" + due_amount, due_amount)
+    return {
+        "payee_first_name": first,
+        "payee_last_name": last,
+        "payee_payment_status": pick(rng, STATUSES, rows),
+        # Dates as the source file has them: added as epoch seconds at midnight, due as a plain date
+        "payee_added_date_utc": formatted(ADDED_FROM + rng.integers(0, 5 * 365, size=rows) * 86400),
+        "payee_due_date": pick(rng, DUE_DATES, rows),
+        "payee_address_line_1": digits(rng, 1, 99999, rows) + " " + pick(rng, STREETS, rows) + " " + pick(rng, STREET_SUFFIXES, rows),
+        "payee_address_line_2": np.where(units == "", units, units + digits(rng, 1, 999, rows)),
+        "payee_city": pick(rng, CITIES, rows),
+        "payee_country": pick(rng, COUNTRIES, rows),
+        "payee_province_or_state": pick(rng, STATES, rows),
+        "payee_postal_code": digits(rng, 0, 99999, rows, "05d"),
+        "payee_phone_number": "+1" + digits(rng, 2_000_000_000, 9_999_999_999, rows),
+        # The row number keeps the natural key unique
+        "payee_email": formatted_emails(first, last, start) + "@" + pick(rng, DOMAINS, rows),
+        "currency": pick(rng, CURRENCIES, rows, p=CURRENCY_WEIGHTS),
+        "discount_percent": cents(rng, 0, 3000, rows),
+        "tax_percent": pick(rng, TAX_RATES, rows),
+        "due_amount": due_amount,
+    }
+
+
+def generate_csv(path: str, rows: int, seed: int = 42, chunk_rows: int = 250_000, invalid_rate: float = 0.0, quiet: bool = False) -> None:
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    with open(path, "w", newline="") as handle:
+        handle.write(",".join(COLUMNS) + "\n")
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            chunk = generate_chunk(rng, start, count, invalid_rate)
+            # No generated value contains a comma, quote or newline, so rows need no CSV quoting
+            rows_text = zip(*(chunk[column].tolist() for column in COLUMNS))
+            handle.write("\n".join(map(",".join, rows_text)))
+            handle.write("\n")
+            if not quiet:
+                done = start + count
+                print(f"{done}/{rows} rows, {done / (time.perf_counter() - started):.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic payments in the payment_information.csv schema")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of rows with a negative due_amount")
+    args = parser.parse_args()
+    generate_csv(args.path, args.rows, args.seed, args.chunk_rows, args.invalid_rate)
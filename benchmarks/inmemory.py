@@ -0,0 +1,63 @@
+"""In-memory stand-in for MongoDB, so the load test runs without a server.
+
+mongomock_motor keeps collections in process memory behind Motor's async API. It is
+not a performance model of MongoDB: use it to compare the application's own costs
+between runs, and a real mongod for anything involving query plans or I/O.
+
+mongomock differs from the server in a few places the application relies on, patched
+here for the benchmark only:
+- inserted documents are checked with default codec options, which reject Decimal
+- $type does not accept a list of types
+- GridFS needs a real database, so evidence uses the local blob backend
+"""
+import asyncio
+import tempfile
+
+import bson
+
+from app.core.config import settings
+from app.db.codecs import CODEC_OPTIONS
+from app.db.mongodb import MongoDB
+
+
+def patch_mongomock() -> None:
+    import mongomock.collection
+    import mongomock.filtering
+
+    encode = bson.BSON.encode.__func__
+
+    def encode_with_codec(cls, document, check_keys=False, codec_options=CODEC_OPTIONS):
+        return encode(cls, document, check_keys, CODEC_OPTIONS)
+
+    mongomock.collection.BSON.encode = classmethod(encode_with_codec)
+
+    type_op = mongomock.filtering._type_op
+
+    def type_op_with_lists(value, types):
+        if isinstance(types, list):
+            return any(type_op(value, single) for single in types)
+        return type_op(value, types)
+
+    mongomock.filtering._type_op = type_op_with_lists
+    mongomock.filtering._filterer_inst._operator_map["$type"] = type_op_with_lists
+
+
+def connect_in_memory(database: str = "pms_bench") -> None:
+    """Point MongoDB.db at a fresh in-memory database; call from inside the running loop"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("The in-memory backend needs mongomock-motor: pip install mongomock-motor")
+
+    patch_mongomock()
+    MongoDB.client = AsyncMongoMockClient()
+    # Run the blocking mongomock calls on this loop rather than the one current at import
+    MongoDB.client._AsyncMongoMockClient__io_loop = asyncio.get_running_loop()
+    MongoDB.db = MongoDB.client[database]
+
+    # Settings are only re-read from disk when config_reload is on, so this copy sticks
+    evidence = settings.config.evidence.model_copy(update={
+        "backend": "local",
+        "local_path": tempfile.mkdtemp(prefix="pms_bench_evidence_"),
+    })
+    settings._snapshot = settings.config.model_copy(update={"evidence": evidence})
@@ -0,0 +1,195 @@
+"""End to end load test: synthetic data, CSV ingest, then the API under concurrent requests.
+
+Requests go through the ASGI app in process (no network or server in the way), against
+either a local mongod or the in-memory stand-in in benchmarks/inmemory.py. With
+--base-url they go over HTTP to a running server instead, which must already hold data.
+
+Each scenario sends --requests requests from --concurrency concurrent clients and
+reports p50/p95/p99 latency and throughput; ingest reports rows per second. The JSON
+report can be compared with an earlier one through benchmarks.report.
+
+    python -m benchmarks.load_test --backend memory --rows 20000 --output after.json --baseline before.json
+    python -m benchmarks.load_test --backend mongod --mongodb-uri mongodb://localhost:27017 --rows 1000000
+    python -m benchmarks.load_test --base-url http://localhost:8000 --scenarios list_first_page,get
+
+Requires httpx (and mongomock-motor for the in-memory backend).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+try:
+    import httpx
+except ImportError:
+    raise SystemExit("The load test needs httpx: pip install httpx")
+
+from app.core.config import settings
+from app.db.mongodb import MongoDB
+from benchmarks.generate_data import FIRST_NAMES, LAST_NAMES, STATUSES, generate_csv
+from benchmarks.report import compare, print_comparison, print_scenarios, run_metadata, scenario_stats, write_report
+
+API = "/api/v1"
+EVIDENCE = os.urandom(64 * 1024)
+
+
+async def run_scenario(send: Callable[[int], Awaitable[httpx.Response]], requests: int, concurrency: int) -> Dict[str, float]:
+    """Send requests numbered 0..requests-1 from `concurrency` workers; 4xx/5xx and exceptions count as errors"""
+    samples: List[float] = []
+    errors = 0
+    numbers = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(numbers)) < requests:
+            start = time.perf_counter()
+            try:
+                failed = (await send(i)).status_code >= 400
+            except Exception:
+                failed = True
+            samples.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return scenario_stats(samples, errors, time.perf_counter() - started)
+
+
+async def collect_pages(client: httpx.AsyncClient, count: int):
+    """Payment ids and next_cursor values from walking the list, up to `count` ids"""
+    ids, cursors, cursor = [], [], None
+    while len(ids) < count:
+        params = {"page_size": 100, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get(f"{API}/payments", params=params)).raise_for_status().json()
+        ids.extend(item["_id"] for item in page["items"])
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+        cursors.append(cursor)
+    return ids[:count], cursors
+
+
+def build_scenarios(client: httpx.AsyncClient, ids: List[str], cursors: List[str], file_ids: List[str]) -> Dict[str, Callable]:
+    names = list(LAST_NAMES)
+    statuses = list(STATUSES)
+
+    async def upload(i):
+        response = await client.post(
+            f"{API}/payment/{ids[i % len(ids)]}/upload_evidence",
+            files={"file": (f"evidence_{i}.pdf", EVIDENCE[: 1024 + i % len(EVIDENCE)], "application/pdf")}
+        )
+        if response.status_code < 400:
+            file_ids.append(response.json())
+        return response
+
+    return {
+        "list_first_page": lambda i: client.get(f"{API}/payments", params={"page_size": 50}),
+        "list_cursor": lambda i: client.get(f"{API}/payments", params={"page_size": 100, "cursor": cursors[i % len(cursors)]}),
+        "list_status": lambda i: client.get(f"{API}/payments", params={"payee_payment_status": statuses[i % len(statuses)]}),
+        "search": lambda i: client.get(f"{API}/payments", params={"search_payee_name": names[i % len(names)]}),
+        "get": lambda i: client.get(f"{API}/payment/{ids[i % len(ids)]}"),
+        "update": lambda i: client.put(f"{API}/payment/{ids[i % len(ids)]}", json={"payee_address_line_2": f"Suite {i}"}),
+        "upload_evidence": upload,
+        # Runs after upload_evidence, over the files it stored
+        "download_evidence": lambda i: client.get(f"{API}/payment/download_evidence/{file_ids[i % len(file_ids)]}"),
+    }
+
+
+async def connect(args) -> None:
+    if args.backend == "memory":
+        from benchmarks.inmemory import connect_in_memory
+        connect_in_memory()
+        return
+
+    from app.db.indexes import ensure_indexes
+    # A scratch database, never the configured one: it is dropped before every run
+    mongodb = settings.config.mongodb.model_copy(update={"uri": args.mongodb_uri, "database": args.database})
+    settings._snapshot = settings.config.model_copy(update={"mongodb": mongodb})
+    await MongoDB.connect()
+    await MongoDB.client.drop_database(args.database)
+    await ensure_indexes()
+
+
+async def ingest(args) -> Dict[str, float]:
+    from app.db.repositories.payment_summary_repository import PaymentSummaryRepository
+    from app.utils.csv_load_service import ingest_csv
+
+    path = args.csv
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="pms_bench_"), "payments.csv")
+        started = time.perf_counter()
+        generate_csv(path, args.rows, seed=args.seed, quiet=True)
+        print(f"generated {args.rows} rows in {time.perf_counter() - started:.1f}s")
+    report = await ingest_csv(path, MongoDB.db[settings.config.mongodb.collections.payments], summary=PaymentSummaryRepository())
+    print(f"ingested {report.rows_inserted} rows in {report.elapsed_seconds:.1f}s, {report.rows_per_second:.0f} rows/s")
+    return {"rows": report.rows_read, "rejected": report.rows_rejected, "seconds": report.elapsed_seconds, "rows_per_second": report.rows_per_second}
+
+
+async def main(args) -> int:
+    report = {"metadata": run_metadata(
+        backend="http" if args.base_url else args.backend,
+        rows=args.rows,
+        concurrency=args.concurrency,
+        requests=args.requests,
+    )}
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        await connect(args)
+        report["ingest"] = await ingest(args)
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+    async with client:
+        ids, cursors = await collect_pages(client, args.ids)
+        if not ids:
+            raise SystemExit("No payments to test against")
+        cursors = cursors or [""]
+        file_ids: List[str] = []
+        scenarios = build_scenarios(client, ids, cursors, file_ids)
+        selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+        report["scenarios"] = {}
+        for name in selected:
+            if name == "download_evidence" and not file_ids:
+                print("skipping download_evidence: no evidence was uploaded")
+                continue
+            report["scenarios"][name] = await run_scenario(scenarios[name], args.requests, args.concurrency)
+            print(f"{name}: done")
+
+    if not args.base_url:
+        await MongoDB.close()
+
+    print_scenarios(report["scenarios"])
+    if args.output:
+        write_report(args.output, report)
+        print(f"report written to {args.output}")
+    if args.baseline:
+        from benchmarks.report import load_report
+        baseline = load_report(args.baseline)
+        rows = compare(baseline, report, args.threshold)
+        print_comparison(rows, baseline, report)
+        return 1 if any(row["regressed"] for row in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the payments API")
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="memory")
+    parser.add_argument("--mongodb-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="pms_load_test", help="scratch database for --backend mongod; dropped first")
+    parser.add_argument("--base-url", help="test a running server over HTTP instead of the app in process")
+    parser.add_argument("--rows", type=int, default=20_000, help="synthetic rows to generate and ingest")
+    parser.add_argument("--csv", help="ingest this file instead of generating one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ids", type=int, default=1000, help="payments the get, update and evidence scenarios cycle through")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", help="comma separated subset, in the order to run them")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against this earlier report and exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,116 @@
+"""Load test reports: per scenario latency percentiles and throughput, saved as JSON.
+
+Reports carry the commit, interpreter and backend they were taken on, so two of them
+can be compared later; the comparison fails when a scenario's p95 or throughput got
+worse by more than the threshold.
+
+    python -m benchmarks.report baseline.json current.json [--threshold 0.10]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.common import percentile
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(**extra) -> dict:
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        **extra,
+    }
+
+
+def scenario_stats(samples: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """Percentiles in milliseconds over all requests, throughput in requests per wall clock second"""
+    return {
+        "n": len(samples),
+        "errors": errors,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples, default=0.0) * 1000,
+        "throughput_rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def print_scenarios(scenarios: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'scenario':<24} {'n':>8} {'errors':>7} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'req/s':>10}")
+    for name, stats in scenarios.items():
+        print(
+            f"{name:<24} {stats['n']:>8} {stats['errors']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+            f"{stats['p99_ms']:>9.2f} {stats['throughput_rps']:>10.1f}"
+        )
+
+
+def write_report(path: str, report: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> List[dict]:
+    """One row per scenario in both reports; `regressed` when p95 rose or throughput fell by more than threshold"""
+    rows = []
+    for name, after in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        p95_change = after["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        throughput_change = after["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        rows.append({
+            "scenario": name,
+            "p95_ms": (before["p95_ms"], after["p95_ms"]),
+            "p95_change": p95_change,
+            "throughput_rps": (before["throughput_rps"], after["throughput_rps"]),
+            "throughput_change": throughput_change,
+            "regressed": p95_change > threshold or throughput_change < -threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: List[dict], baseline: dict, current: dict) -> None:
+    print(f"baseline {baseline['metadata'].get('commit')} ({baseline['metadata'].get('backend')}) -> "
+          f"current {current['metadata'].get('commit')} ({current['metadata'].get('backend')})")
+    if baseline["metadata"].get("backend") != current["metadata"].get("backend"):
+        print("warning: reports were taken on different backends")
+    print(f"{'scenario':<24} {'p95_ms':>20} {'change':>8} {'req/s':>22} {'change':>8}")
+    for row in rows:
+        print(
+            f"{row['scenario']:<24} {row['p95_ms'][0]:>9.2f} -> {row['p95_ms'][1]:>7.2f} {row['p95_change']:>+8.1%} "
+            f"{row['throughput_rps'][0]:>10.1f} -> {row['throughput_rps'][1]:>8.1f} {row['throughput_change']:>+8.1%}"
+            f"{'  REGRESSED' if row['regressed'] else ''}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two load test reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative change before failing")
+    args = parser.parse_args()
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows, baseline, current)
+    sys.exit(1 if any(row["regressed"] for row in rows) else 0)
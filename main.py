@@ -1,66 +1,76 @@
-import pandas as pd
+# First, so startup timing includes importing the rest of the application
+from app.core.startup import Startup
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 from app.db.mongodb import MongoDB
-from app.api.routes import payments
-from app.utils.csv_load_service import load_and_normalize_csv_data
+from app.db.indexes import ensure_indexes
+from app.db.migrations import migrate_on_startup
+from app.jobs.change_stream import ChangeStreamFeed
+from app.jobs.status_refresh import StatusRefreshScheduler
+from app.jobs.summary_rebuild import ensure_payment_summary
+from app.api.routes import cache, health, metrics, payments
 from app.core import Logger
+from app.core.logging import RequestIdMiddleware
+from app.core.admission import AdmissionMiddleware
+from app.core.metrics import MetricsMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 def create_app() -> FastAPI:
 
     app = FastAPI(
-        title=settings.config["app"]["title"],
-        description=settings.config["app"]["description"],
+        title=settings.config.app.title,
+        description=settings.config.app.description,
+        default_response_class=ORJSONResponse,
     )
     
+    if settings.config.admission.enabled:
+        # Inside CORS so shed responses still carry CORS headers
+        app.add_middleware(AdmissionMiddleware, routes=app.routes, config=settings.config.admission)
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=settings.config["server"]["origins"],
+        allow_origins=settings.config.server.origins,
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(RequestIdMiddleware, header=settings.config.log_queue.request_id_header)
+    if settings.config.metrics.enabled:
+        # Added last so it is outermost and times the whole middleware stack
+        app.add_middleware(MetricsMiddleware)
     
 
 
     # Setup logging
     Logger.setup_logging()
 
-    # Register startup and shutdown events
+    # Register startup and shutdown events; CSV seeding runs once per deploy with `python -m app.seed`
+    app.add_event_handler("startup", Startup.begin)
     app.add_event_handler("startup", MongoDB.connect)
-    app.add_event_handler("startup", load_csv_data)
+    app.add_event_handler("startup", ensure_indexes)
+    app.add_event_handler("startup", migrate_on_startup)
+    app.add_event_handler("startup", ensure_payment_summary)
+    app.add_event_handler("startup", StatusRefreshScheduler.start)
+    app.add_event_handler("startup", ChangeStreamFeed.start)
+    app.add_event_handler("startup", Startup.complete)
+    app.add_event_handler("shutdown", StatusRefreshScheduler.stop)
+    app.add_event_handler("shutdown", ChangeStreamFeed.stop)
     app.add_event_handler("shutdown", MongoDB.close)
+    app.add_event_handler("shutdown", Logger.stop_logging)
 
     # Register routes
     app.include_router(payments.router, prefix="/api/v1", tags=["payments"])
+    app.include_router(cache.router, prefix="/api/v1", tags=["cache"])
+    # Scraped by Prometheus at the conventional path, outside the versioned API
+    app.include_router(metrics.router, tags=["metrics"])
+    app.include_router(health.router, tags=["health"])
     # app.include_router(files.router, prefix="/api/v1", tags=["files"])
     
     return app
 
 
-async def load_csv_data():
-    try:
-        file_path = settings.config["data"]["file_path"]
-        collection_name = settings.config["mongodb"]["collections"]["payments"]
-
-        logger.info(f"Loading data from '{file_path}'")    
-        await load_and_normalize_csv_data(file_path, collection_name)
-    except Exception as e:
-        logger.error(f"Failed to load data from '{file_path}': {e}")
-
 app = create_app()
-logger = Logger.get_logger(__name__)
 
 
-# if __name__ == "__main__":
-#     import uvicorn
-    
-#     uvicorn.run(
-#         "main:app",
-#         host=settings.config["server"]["host"],
-#         port=settings.config["server"]["port"],
-#         reload=settings.config["server"]["reload"],
-#         workers=settings.config["server"]["workers"]
-#     )
\ No newline at end of file
+# Served by `python -m app.server`, which runs server.workers processes; see app/server.py
@@ -17,6 +17,8 @@ setup(
         "python-magic>=0.4.27",
         "pandas>=2.2.0",
         "PyYAML>=6.0.1",
+        "orjson>=3.10.0",
+        "prometheus_client>=0.21.0",
     ],
     extras_require={
         "dev": [
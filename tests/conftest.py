@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+from bson.codec_options import CodecOptions
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.config import settings
+from app.db.mongodb import MongoDB
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository, summary_deltas
+from benchmarks.inmemory import patch_mongomock
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    """A fresh in-memory database behind MongoDB.db"""
+    # GridFS needs a real database, so evidence goes to the local blob backend
+    evidence = settings.config.evidence.model_copy(update={"backend": "local", "local_path": str(tmp_path / "evidence")})
+    monkeypatch.setattr(settings, "_snapshot", settings.config.model_copy(update={"evidence": evidence}))
+    patch_mongomock()
+    MongoDB.client = AsyncMongoMockClient()
+    # Run the blocking mongomock calls on the test's loop
+    MongoDB.client._AsyncMongoMockClient__io_loop = asyncio.get_running_loop()
+    # Timezone-aware dates like CODEC_OPTIONS; mongomock rejects an explicit tzinfo, UTC is its default
+    MongoDB.db = MongoDB.client.get_database("pms_test", codec_options=CodecOptions(tz_aware=True))
+    yield MongoDB.db
+    MongoDB.client = MongoDB.db = None
+
+
+@pytest.fixture
+async def client(db):
+    """The API over the in-memory database; startup handlers are not run"""
+    from main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def summary_in_python(monkeypatch):
+    """Rollup totals and rebuilds computed in Python: mongomock cannot run their pipelines ($toDecimal)"""
+    async def totals(self, query):
+        return summary_deltas(added=[payment async for payment in self.collection_payment.find({**query, "is_deleted": {"$ne": True}})])
+
+    async def rebuild(self):
+        rows = await totals(self, {})
+        await self.collection_summary.delete_many({})
+        await self.apply_deltas(rows)
+        return len(rows)
+
+    monkeypatch.setattr(PaymentSummaryRepository, "totals", totals)
+    monkeypatch.setattr(PaymentSummaryRepository, "rebuild", rebuild)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, Overloaded
+from app.core.config import AdmissionClassConfig, AdmissionConfig
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(AdmissionConfig(
+        max_concurrency=4,
+        reserved_writes=1,
+        classes={
+            "lookup": AdmissionClassConfig(priority=0, max_queue=2, max_wait_ms=100),
+            "write": AdmissionClassConfig(priority=1, max_queue=10, max_wait_ms=500, writes=True),
+            "list": AdmissionClassConfig(priority=2, max_queue=10, max_wait_ms=500),
+            "export": AdmissionClassConfig(priority=3, max_queue=2, max_wait_ms=1000, max_concurrency=1),
+        },
+    ))
+
+
+async def fill(controller, name: str, count: int) -> None:
+    for _ in range(count):
+        await controller.acquire(controller.classes[name])
+
+
+async def test_reads_leave_reserved_slots_to_writes(controller):
+    await fill(controller, "list", 3)
+    waiting = asyncio.ensure_future(controller.acquire(controller.classes["list"]))
+    await asyncio.sleep(0)
+    assert not waiting.done()
+
+    await controller.acquire(controller.classes["write"])
+    assert controller.active == 4
+    waiting.cancel()
+
+
+async def test_freed_slot_goes_to_the_lowest_priority_number(controller):
+    classes = controller.classes
+    await fill(controller, "list", 3)
+    await controller.acquire(classes["write"])
+    order = []
+
+    async def wait(name):
+        await controller.acquire(classes[name])
+        order.append(name)
+
+    waiters = [asyncio.ensure_future(wait(name)) for name in ("list", "lookup")]
+    await asyncio.sleep(0)
+    controller.release(classes["list"])
+    controller.release(classes["list"])
+    await asyncio.gather(*waiters)
+    assert order == ["lookup", "list"]
+
+
+async def test_full_queue_is_shed(controller):
+    lookup = controller.classes["lookup"]
+    await fill(controller, "lookup", 3)
+    waiters = [asyncio.ensure_future(controller.acquire(lookup)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as shed:
+        await controller.acquire(lookup)
+    assert shed.value.reason == "queue_full"
+    for waiter in waiters:
+        waiter.cancel()
+
+
+async def test_waiter_is_shed_when_its_budget_runs_out(controller):
+    lookup = controller.classes["lookup"]
+    await fill(controller, "lookup", 3)
+    lookup.max_wait = 0.01
+
+    with pytest.raises(Overloaded) as shed:
+        await controller.acquire(lookup)
+    assert shed.value.reason == "wait_timeout"
+    assert not lookup.waiters
+
+
+async def test_long_exports_do_not_shed_quick_lookups(controller):
+    classes = controller.classes
+    await fill(controller, "export", 1)
+    await fill(controller, "lookup", 2)
+    # Exports hold their slot for seconds, lookups for milliseconds
+    for _ in range(200):
+        controller.start(classes["export"])
+        controller.release(classes["export"], held=5.0)
+        controller.start(classes["lookup"])
+        controller.release(classes["lookup"], held=0.002)
+    waiting = asyncio.ensure_future(controller.acquire(classes["list"]))
+    await asyncio.sleep(0)
+
+    assert controller.expected_wait(classes["lookup"]) < classes["lookup"].max_wait
+    # The export is at its own cap, so another one waits for it alone
+    assert controller.expected_wait(classes["export"]) > classes["export"].max_wait
+    with pytest.raises(Overloaded) as shed:
+        await controller.acquire(classes["export"])
+    assert shed.value.reason == "latency_budget"
+    waiting.cancel()
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.models.schemas.bulk_payment import BulkItemStatus
+from app.services.payment_service import PaymentService
+
+pytestmark = pytest.mark.anyio
+
+NEXT_MONTH = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=30)
+LAST_MONTH = NEXT_MONTH - timedelta(days=60)
+
+
+def payment_data(**fields) -> dict:
+    return {
+        "payee_first_name": "Ada",
+        "payee_last_name": "Lovelace",
+        "payee_due_date": NEXT_MONTH.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "payee_address_line_1": "1 Main St",
+        "payee_city": "London",
+        "payee_country": "GB",
+        "payee_postal_code": "N1 9GU",
+        "payee_phone_number": "+442071234567",
+        "payee_email": "ada@example.com",
+        "currency": "GBP",
+        "due_amount": 100,
+        **fields,
+    }
+
+
+@pytest.fixture
+async def service(db):
+    await db.payments.insert_many([
+        {
+            **payment_data(),
+            "_id": payment_id,
+            "payee_payment_status": "pending",
+            "payee_due_date": NEXT_MONTH,
+            "due_amount": Decimal("100"),
+        }
+        for payment_id in ("p1", "p2", "p3")
+    ])
+    return PaymentService()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    changes = []
+    monkeypatch.setattr(PaymentService, "publish_change", classmethod(lambda cls, *change: changes.append(change)))
+    return changes
+
+
+def statuses(results) -> list:
+    return [(result.status, result.id) for result in results]
+
+
+async def test_mixed_chunk_reports_each_item(service, db, published):
+    results = await service.bulk_apply([
+        {"op": "create", "data": payment_data(payee_email="grace@example.com")},
+        {"op": "update", "id": "p1", "data": {"payee_city": "Leeds"}},
+        {"op": "delete", "id": "p2"},
+        {"op": "update", "id": "nope", "data": {"payee_city": "Leeds"}},
+        {"op": "create", "data": payment_data(payee_email="not an email")},
+        {"op": "delete"},
+        ValueError("Expecting value"),
+    ], offset=10)
+
+    created_id = results[0].id
+    assert [result.index for result in results] == list(range(10, 17))
+    assert statuses(results)[:4] == [
+        (BulkItemStatus.CREATED, created_id),
+        (BulkItemStatus.UPDATED, "p1"),
+        (BulkItemStatus.DELETED, "p2"),
+        (BulkItemStatus.NOT_FOUND, "nope"),
+    ]
+    assert [result.status for result in results[4:]] == [BulkItemStatus.ERROR] * 3
+    assert "payee_email" in results[4].error
+    assert results[5].error == "id is required"
+    assert (await db.payments.find_one({"_id": created_id}))["payee_email"] == "grace@example.com"
+    assert (await db.payments.find_one({"_id": "p1"}))["payee_city"] == "Leeds"
+    assert await db.payments.find_one({"_id": "p2"}) is None
+    assert len(published) == 3
+
+
+async def test_repeated_updates_build_on_each_other(service, db):
+    results = await service.bulk_apply([
+        {"op": "update", "id": "p1", "data": {"payee_payment_status": "completed"}},
+        # Checked against the status the first update set, not the stored one
+        {"op": "update", "id": "p1", "data": {"payee_due_date": LAST_MONTH.strftime("%Y-%m-%dT%H:%M:%SZ")}},
+        {"op": "update", "id": "p2", "data": {"payee_due_date": LAST_MONTH.strftime("%Y-%m-%dT%H:%M:%SZ")}},
+        {"op": "update", "id": "p2", "data": {"payee_last_name": "Byron"}},
+    ])
+
+    assert [result.status for result in results] == [BulkItemStatus.UPDATED] * 4
+    first, second = await db.payments.find({"_id": {"$in": ["p1", "p2"]}}).sort("_id").to_list(2)
+    assert first["payee_payment_status"] == "completed"
+    assert (second["payee_payment_status"], second["payee_last_name"]) == ("overdue", "Byron")
+    # Search fields come from the whole payment as the chunk left it
+    assert "byron" in second["search_tokens"]
+
+
+async def test_operations_after_a_delete_of_the_same_id_are_not_found(service, db, published):
+    results = await service.bulk_apply([
+        {"op": "update", "id": "p1", "data": {"payee_city": "Leeds"}},
+        {"op": "delete", "id": "p1"},
+        {"op": "update", "id": "p1", "data": {"payee_city": "York"}},
+        {"op": "delete", "id": "p1"},
+    ])
+
+    assert statuses(results) == [
+        (BulkItemStatus.UPDATED, "p1"),
+        (BulkItemStatus.DELETED, "p1"),
+        (BulkItemStatus.NOT_FOUND, "p1"),
+        (BulkItemStatus.NOT_FOUND, "p1"),
+    ]
+    assert await db.payments.find_one({"_id": "p1"}) is None
+    # The update, then the delete of what it left; nothing for the operations that were not applied
+    assert [(before["payee_city"], after and after["payee_city"]) for before, after, _ in published] == [
+        ("London", "Leeds"), ("Leeds", None)
+    ]
@@ -0,0 +1,126 @@
+import csv
+from decimal import Decimal
+
+import pytest
+
+from app.db.indexes import INDEX_REGISTRY, reconcile_collection_indexes
+from app.utils.csv_load_service import DUPLICATE_KEY_ERROR, ingest_csv
+
+pytestmark = pytest.mark.anyio
+
+COLUMNS = [
+    "payee_first_name", "payee_last_name", "payee_payment_status", "payee_added_date_utc", "payee_due_date",
+    "payee_address_line_1", "payee_address_line_2", "payee_city", "payee_country", "payee_province_or_state",
+    "payee_postal_code", "payee_phone_number", "payee_email", "currency", "discount_percent", "tax_percent",
+    "due_amount",
+]
+
+
+def row(i: int, **fields) -> dict:
+    return {
+        "payee_first_name": "Ada", "payee_last_name": f"Lovelace{i}", "payee_payment_status": "pending",
+        "payee_added_date_utc": str(1700000000 + i), "payee_due_date": "2030-01-01",
+        "payee_address_line_1": f"{i} Main St", "payee_address_line_2": "", "payee_city": "London",
+        "payee_country": "GB", "payee_province_or_state": "", "payee_postal_code": "N1 9GU",
+        "payee_phone_number": "+442071234567", "payee_email": f"ada{i}@example.com", "currency": "GBP",
+        "discount_percent": "5", "tax_percent": "10", "due_amount": "100.00",
+        **fields,
+    }
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(rows, name="payments.csv") -> str:
+        path = tmp_path / name
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def writes(db, monkeypatch):
+    """Operations sent through bulk_write, update_one and update_many on any collection"""
+    collection_type = type(db.payments)
+    sent = []
+    for name in ("bulk_write", "update_one", "update_many"):
+        original = getattr(collection_type, name)
+
+        def record(self, *args, _name=name, _original=original, **kwargs):
+            sent.append((_name, args))
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(collection_type, name, record)
+    return sent
+
+
+async def sync(path, collection, tombstone=False):
+    return await ingest_csv(path, collection, sync=True, tombstone=tombstone)
+
+
+async def test_unchanged_rows_are_not_written(db, write_csv, writes):
+    path = write_csv([row(i) for i in range(5)])
+    first = await sync(path, db.payments, tombstone=True)
+    assert first.rows_inserted == 5
+    writes.clear()
+
+    second = await sync(path, db.payments, tombstone=True)
+    assert (second.rows_inserted, second.rows_updated, second.rows_unchanged, second.rows_tombstoned) == (0, 0, 5, 0)
+    assert writes == []
+
+
+async def test_changed_row_sets_only_fields_that_differ(db, write_csv, writes):
+    await sync(write_csv([row(0), row(1)]), db.payments)
+    key = {"payee_email": "ada0@example.com"}
+    # Edited through the API: a field the file does not carry, and one it will agree with
+    await db.payments.update_one(key, {"$set": {"evidence_file_url": "/evidence/1", "payee_city": "Leeds"}})
+    writes.clear()
+
+    report = await sync(write_csv([row(0, payee_city="Leeds", due_amount="250.00"), row(1)]), db.payments)
+
+    assert (report.rows_updated, report.rows_unchanged) == (1, 1)
+    [(_, (operations,))] = [write for write in writes if write[0] == "bulk_write"]
+    assert set(operations[0]._doc["$set"]) == {"due_amount", "content_hash"}
+    stored = await db.payments.find_one(key)
+    assert stored["due_amount"] == Decimal("250.00")
+    assert stored["evidence_file_url"] == "/evidence/1"
+
+
+async def test_repeated_natural_key_is_rejected(db, write_csv):
+    path = write_csv([row(0), row(1), row(0, payee_city="Leeds")])
+    report = await sync(path, db.payments)
+
+    assert (report.rows_inserted, report.rows_unchanged, report.rows_rejected) == (2, 0, 1)
+    assert (await db.payments.find_one({"payee_email": "ada0@example.com"}))["payee_city"] == "London"
+    with open(report.reject_file) as f:
+        [rejected] = list(csv.DictReader(f))
+    assert (rejected["payee_city"], rejected["error"]) == ("Leeds", DUPLICATE_KEY_ERROR)
+
+
+async def test_rows_missing_from_the_file_are_tombstoned_and_restored(db, write_csv):
+    await sync(write_csv([row(i) for i in range(4)]), db.payments, tombstone=True)
+
+    report = await sync(write_csv([row(0), row(1)], "smaller.csv"), db.payments, tombstone=True)
+    assert (report.rows_unchanged, report.rows_tombstoned) == (2, 2)
+    assert {p["payee_email"] async for p in db.payments.find({"is_deleted": True})} == {
+        "ada2@example.com", "ada3@example.com"
+    }
+
+    report = await sync(write_csv([row(i) for i in range(4)], "again.csv"), db.payments, tombstone=True)
+    assert (report.rows_updated, report.rows_unchanged, report.rows_tombstoned) == (2, 2, 0)
+    assert await db.payments.count_documents({"is_deleted": True}) == 0
+
+
+async def test_plain_load_rejects_a_repeated_natural_key(db, write_csv):
+    await reconcile_collection_indexes(db.payments, INDEX_REGISTRY["payments"])
+    path = write_csv([row(0), row(1), row(0, payee_city="Leeds"), row(2)])
+
+    report = await ingest_csv(path, db.payments)
+
+    assert (report.rows_inserted, report.rows_rejected) == (3, 1)
+    assert await db.payments.count_documents({}) == 3
+    with open(report.reject_file) as f:
+        [rejected] = list(csv.DictReader(f))
+    assert (rejected["payee_city"], rejected["error"]) == ("Leeds", DUPLICATE_KEY_ERROR)
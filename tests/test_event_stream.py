@@ -0,0 +1,120 @@
+import asyncio
+
+import orjson
+import pytest
+
+from app.services.payment_service import PaymentService, render_event
+from app.utils.event_hub import EventHub
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def hub(db, monkeypatch):
+    hub = EventHub(buffer_size=3, max_subscribers=2, heartbeat_seconds=0.05, render=render_event)
+    monkeypatch.setattr(PaymentService, "event_hub", hub)
+    return hub
+
+
+def publish(hub: EventHub, payment_id: str, status: str = "pending") -> str:
+    PaymentService.publish_change(None, {"_id": payment_id, "payee_payment_status": status}, payment_id)
+    return hub.event_id(hub.seq)
+
+
+def parse(chunk: bytes) -> list:
+    """(id, type, data) of each event in a chunk"""
+    events = []
+    for frame in chunk.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines() if line and not line.startswith((":", "retry")))
+        if lines:
+            events.append((lines["id"], lines["event"], orjson.loads(lines["data"])))
+    return events
+
+
+async def open_stream(hub: EventHub, last_event_id=None, **filters):
+    stream = PaymentService().stream_events(hub.subscribe(), last_event_id, **filters)
+    assert (await stream.__anext__()).startswith(b"retry: ")
+    return stream
+
+
+async def test_resume_sends_only_the_events_after_last_event_id(hub):
+    seen = publish(hub, "p1")
+    missed = [publish(hub, "p2"), publish(hub, "p3")]
+
+    stream = await open_stream(hub, seen)
+
+    events = parse(await stream.__anext__())
+    assert [(event_id, payload["payment_id"]) for event_id, _, payload in events] == list(zip(missed, ["p2", "p3"]))
+    assert events[0][1] == "created"
+    await stream.aclose()
+
+
+async def test_new_events_reach_a_waiting_stream(hub):
+    stream = await open_stream(hub)
+
+    next_frame = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    published = publish(hub, "p1")
+
+    assert [event_id for event_id, _, _ in parse(await next_frame)] == [published]
+    await stream.aclose()
+
+
+@pytest.mark.parametrize("last_event_id", ["another-hub-1", "not an id", "{hub}-99"])
+async def test_unknown_event_id_resets_the_stream(hub, last_event_id):
+    publish(hub, "p1")
+
+    stream = await open_stream(hub, last_event_id.format(hub=hub.id))
+
+    [(event_id, event_type, payload)] = parse(await stream.__anext__())
+    assert (event_type, payload["reason"]) == ("reset", "unknown_event_id")
+    # Resuming from the reset's id picks up what follows it
+    assert hub.position(event_id) == hub.seq
+    await stream.aclose()
+
+
+async def test_stream_that_falls_behind_the_buffer_is_reset(hub):
+    seen = publish(hub, "p1")
+    for payment_id in ("p2", "p3", "p4", "p5"):
+        publish(hub, payment_id)
+
+    stream = await open_stream(hub, seen)
+
+    [(event_id, event_type, payload)] = parse(await stream.__anext__())
+    assert (event_id, event_type, payload["reason"]) == (hub.event_id(5), "reset", "lagged")
+    await stream.aclose()
+
+
+async def test_streams_only_get_events_matching_their_filters(hub):
+    stream = await open_stream(hub, payee_payment_status="overdue")
+
+    next_frame = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    publish(hub, "p1", "pending")
+    publish(hub, "p2", "overdue")
+
+    assert [payload["payment_id"] for _, _, payload in parse(await next_frame)] == ["p2"]
+    # An idle stream gets a comment line once per heartbeat
+    assert await stream.__anext__() == b": keep-alive\n\n"
+    await stream.aclose()
+
+
+async def test_closed_stream_releases_its_slot(hub):
+    stream = await open_stream(hub)
+    assert hub.subscribers == 1
+
+    await stream.aclose()
+
+    assert hub.subscribers == 0
+
+
+async def test_streams_past_the_limit_are_refused(hub, client):
+    held = [hub.subscribe(), hub.subscribe()]
+
+    response = await client.get("/api/v1/payments/stream")
+
+    assert (response.status_code, response.headers["retry-after"]) == (503, "5")
+    held[0].release()
+    # Bad filters are rejected before the stream starts, and give their slot back
+    assert (await client.get("/api/v1/payments/stream", params={"due_from": "someday"})).status_code == 400
+    assert hub.subscribers == 1
@@ -0,0 +1,157 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from app.core.config import settings
+from app.services.payment_service import PaymentService
+
+pytestmark = pytest.mark.anyio
+
+# Not a multiple of the chunk size, so the last chunk is short
+CONTENT = bytes(range(256)) * 40 + b"tail"
+
+
+@pytest.fixture
+def small_chunks(db, monkeypatch):
+    evidence = settings.config.evidence.model_copy(update={"stream_chunk_bytes": 1000})
+    monkeypatch.setattr(settings, "_snapshot", settings.config.model_copy(update={"evidence": evidence}))
+
+
+class FakeGridOut:
+    """An opened GridFS file read from memory"""
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.length = len(content)
+        self.position = 0
+        self.reads = []
+
+    def seek(self, position: int) -> None:
+        self.position = position
+
+    async def read(self, size: int) -> bytes:
+        self.reads.append(size)
+        chunk = self.content[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+async def upload(client, payment_id: str, content: bytes, filename: str = "invoice.pdf") -> str:
+    response = await client.post(f"/api/v1/payment/{payment_id}/upload_evidence", files={"file": (filename, content)})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_upload_is_streamed_to_the_backend_and_read_back(small_chunks, client):
+    file_id = await upload(client, "p1", CONTENT)
+
+    response = await client.get(f"/api/v1/payment/download_evidence/{file_id}")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-length"] == str(len(CONTENT))
+    # Nothing is left behind in the staging directory
+    assert os.listdir(os.path.join(settings.config.evidence.local_path, "tmp")) == []
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=100-199", 100, 199),
+    ("bytes=10200-", 10200, len(CONTENT) - 1),
+    ("bytes=-4", len(CONTENT) - 4, len(CONTENT) - 1),
+])
+async def test_download_serves_byte_ranges(small_chunks, client, range_header, start, end):
+    file_id = await upload(client, "p1", CONTENT)
+
+    response = await client.get(f"/api/v1/payment/download_evidence/{file_id}", headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("range_header, expected", [
+    (None, None),
+    ("bytes=0-0", (0, 0)),
+    ("bytes=5-", (5, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    # Multipart and other units fall back to the whole file
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(range_header, expected):
+    assert PaymentService.parse_range(range_header, 100) == expected
+
+
+@pytest.mark.parametrize("range_header", ["bytes=100-", "bytes=20-10", "bytes=-"])
+def test_parse_range_rejects_unsatisfiable_ranges(range_header):
+    with pytest.raises(ValueError):
+        PaymentService.parse_range(range_header, 100)
+
+
+async def test_gridfs_ranges_are_streamed_in_chunks(small_chunks):
+    grid_out = FakeGridOut(CONTENT)
+
+    response = PaymentService().ranged_evidence_response(grid_out, "invoice.pdf", "application/pdf", "bytes=500-2999")
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 500-2999/{len(CONTENT)}"
+    assert response.headers["content-length"] == "2500"
+    assert body == CONTENT[500:3000]
+    # Never more than one chunk in memory, and nothing read past the range
+    assert grid_out.reads == [1000, 1000, 500]
+
+
+async def test_unsatisfiable_gridfs_range_is_a_416(small_chunks):
+    response = PaymentService().ranged_evidence_response(FakeGridOut(CONTENT), "invoice.pdf", "application/pdf", "bytes=99999-")
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def stored_files() -> list:
+    root = settings.config.evidence.local_path
+    return sorted(name for folder, _, names in os.walk(root) if not folder.endswith("tmp") for name in names)
+
+
+async def test_identical_uploads_are_stored_once_and_released_with_their_last_reference(db, client, summary_in_python):
+    await db.payments.insert_many([
+        {"_id": payment_id, "currency": "USD", "due_amount": Decimal("100.00"), "discount_percent": Decimal("0"), "tax_percent": Decimal("0")}
+        for payment_id in ("p1", "p2")
+    ])
+    first = await upload(client, "p1", CONTENT)
+    second = await upload(client, "p2", CONTENT, "copy.png")
+
+    assert first != second
+    assert len(stored_files()) == 1
+    assert (await db.evidence_blobs.find_one())["refcount"] == 2
+    # Each upload keeps its own filename and the content type resolved when it was written
+    copy = await db.evidence.find_one({"_id": second})
+    assert (copy["filename"], copy["content_type"]) == ("copy.png", "image/png")
+
+    await PaymentService().delete_payment("p1")
+    assert (await client.get(f"/api/v1/payment/download_evidence/{second}")).content == CONTENT
+    assert await db.evidence.find_one({"_id": first}) is None
+
+    await PaymentService().delete_payment("p2")
+    assert stored_files() == []
+    assert await db.evidence_blobs.count_documents({}) == 0
+
+
+async def test_download_carries_a_strong_etag_clients_can_revalidate(db, client):
+    file_id = await upload(client, "p1", CONTENT)
+    url = f"/api/v1/payment/download_evidence/{file_id}"
+
+    etag = (await client.get(url)).headers["etag"]
+
+    assert not etag.startswith("W/")
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = await client.get(url, headers={"If-None-Match": if_none_match})
+        assert (response.status_code, response.headers["etag"], response.content) == (304, etag, b"")
+    assert (await client.get(url, headers={"If-None-Match": '"other"'})).status_code == 200
+    # The same bytes uploaded again validate against the same tag
+    assert (await client.get(f"/api/v1/payment/download_evidence/{await upload(client, 'p2', CONTENT)}")).headers["etag"] == etag
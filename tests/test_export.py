@@ -0,0 +1,83 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.core.config import settings
+from app.services.payment_service import ExportFormat, PaymentService
+
+pytestmark = pytest.mark.anyio
+
+ADDED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def payment(index: int, **fields) -> dict:
+    return {
+        "_id": f"p{index:02d}",
+        "payee_first_name": "Ada",
+        "payee_last_name": f"Lovelace{index}",
+        "payee_payment_status": "pending",
+        "payee_added_date_utc": ADDED + timedelta(hours=index),
+        "payee_due_date": datetime(2030, 1, 1 + index, tzinfo=timezone.utc),
+        "payee_email": f"ada{index}@example.com",
+        "currency": "USD",
+        "due_amount": Decimal("100.00"),
+        "discount_percent": Decimal("10"),
+        "tax_percent": Decimal("5"),
+        **fields,
+    }
+
+
+@pytest.fixture
+async def payments(db):
+    await db.payments.insert_many([payment(i) for i in range(12)])
+    await db.payments.insert_one(payment(20, payee_payment_status="completed"))
+    await db.payments.insert_one(payment(21, is_deleted=True))
+    return db.payments
+
+
+FILTERS = {"payee_payment_status": "pending", "due_from": "2030-01-03", "due_to": "2030-01-09T00:00:00Z"}
+
+
+async def test_export_selects_what_the_list_shows(payments, client):
+    listed = (await client.get("/api/v1/payments", params={**FILTERS, "page_size": 100})).json()["items"]
+
+    response = await client.get("/api/v1/payments/export", params={**FILTERS, "format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["_id"] for row in rows] == [item["_id"] for item in listed] == [f"p{i:02d}" for i in range(7, 1, -1)]
+    assert rows[0]["payee_due_date"] == "2030-01-08T00:00:00Z"
+    assert rows[0]["total_due"] == "94.50"
+
+
+async def test_gzipped_ndjson_export(payments, client):
+    response = await client.get("/api/v1/payments/export", params={"format": "ndjson", "gzip": "true"})
+
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"] == "attachment; filename=payments.ndjson.gz"
+    lines = gzip.decompress(response.content).decode().splitlines()
+    exported = [json.loads(line) for line in lines]
+    assert len(exported) == 13
+    assert exported[0]["_id"] == "p20"
+    assert exported[0]["total_due"] == 94.5
+
+
+async def test_invalid_due_date_is_rejected_before_streaming(payments, client):
+    response = await client.get("/api/v1/payments/export", params={"due_from": "someday"})
+
+    assert response.status_code == 400
+
+
+async def test_export_is_written_in_chunks_of_flush_rows(payments, monkeypatch):
+    export = settings.config.export.model_copy(update={"flush_rows": 5, "batch_size": 4})
+    monkeypatch.setattr(settings, "_snapshot", settings.config.model_copy(update={"export": export}))
+
+    chunks = [chunk async for chunk in PaymentService().export_payments(ExportFormat.NDJSON)]
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [5, 5, 3]
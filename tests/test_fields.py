@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.services.payment_service import PaymentService
+
+pytestmark = pytest.mark.anyio
+
+ADDED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def payment(index: int, **fields) -> dict:
+    return {
+        "_id": f"p{index}",
+        "payee_first_name": "Ada",
+        "payee_last_name": f"Lovelace{index}",
+        "payee_payment_status": "pending",
+        "payee_added_date_utc": ADDED + timedelta(hours=index),
+        "payee_due_date": datetime(2030, 1, 1, tzinfo=timezone.utc),
+        "payee_email": f"ada{index}@example.com",
+        "currency": "USD",
+        "due_amount": Decimal("100.00"),
+        "discount_percent": Decimal("10"),
+        "tax_percent": Decimal("5"),
+        **fields,
+    }
+
+
+@pytest.fixture
+async def payments(db):
+    await db.payments.insert_many([payment(i) for i in range(5)])
+    return db.payments
+
+
+async def test_list_returns_only_the_requested_fields(payments, client):
+    response = await client.get("/api/v1/payments", params={"fields": "total_due,payee_first_name", "page_size": 2})
+
+    assert response.status_code == 200
+    items = response.json()["items"]
+    # Derived from fields that were read but not requested, which stay out of the response
+    assert items == [
+        {"_id": "p4", "payee_first_name": "Ada", "total_due": 94.5},
+        {"_id": "p3", "payee_first_name": "Ada", "total_due": 94.5},
+    ]
+
+
+async def test_cursor_pages_keep_the_projection(payments, client):
+    first = (await client.get("/api/v1/payments", params={"fields": "payee_last_name", "page_size": 3})).json()
+
+    second = (await client.get("/api/v1/payments", params={"fields": "payee_last_name", "page_size": 3, "cursor": first["next_cursor"]})).json()
+
+    # The added date behind the cursor is read but not returned
+    assert second["items"] == [{"_id": "p1", "payee_last_name": "Lovelace1"}, {"_id": "p0", "payee_last_name": "Lovelace0"}]
+
+
+async def test_single_payment_projection(payments, client):
+    partial = await client.get("/api/v1/payment/p2", params={"fields": "payee_payment_status"})
+    derived = await client.get("/api/v1/payment/p2", params={"fields": "total_due"})
+    full = await client.get("/api/v1/payment/p2")
+
+    assert partial.json() == {"_id": "p2", "payee_payment_status": "pending"}
+    assert derived.json() == {"_id": "p2", "total_due": 94.5}
+    assert {"payee_email", "due_amount", "total_due"} <= full.json().keys()
+    # Each projection is cached and validated on its own
+    assert len({partial.headers["etag"], derived.headers["etag"], full.headers["etag"]}) == 3
+
+
+async def test_unknown_fields_are_a_bad_request(payments, client):
+    for url in ("/api/v1/payments", "/api/v1/payment/p2"):
+        response = await client.get(url, params={"fields": "payee_first_name,password"})
+        assert (response.status_code, response.json()["detail"]) == (400, "Unknown fields: password")
+
+
+def test_derived_fields_are_read_through_their_inputs():
+    assert PaymentService.parse_fields(" total_due , payee_email,") == ["_id", "payee_email", "total_due"]
+    assert PaymentService.stored_projection(["_id", "total_due"]) == {
+        "_id": 1, "discount_percent": 1, "due_amount": 1, "tax_percent": 1
+    }
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from app.db.locks import DistributedLock, LockLost
+from app.db.migrations import MIGRATIONS, run_migrations
+from app.db.migrations.runner import LOCK_NAME
+
+pytestmark = pytest.mark.anyio
+
+
+def legacy_payment(index: int) -> dict:
+    return {
+        "_id": f"p{index:02d}",
+        "payee_added_date_utc": str(1700000000 + index),
+        "payee_due_date": "2030-01-01T00:00:00Z",
+        "due_amount": 100.1 + index,
+        "discount_percent": 5,
+        "tax_percent": 10.5,
+    }
+
+
+@pytest.fixture
+async def payments(db):
+    await db.payments.insert_many([legacy_payment(i) for i in range(10)])
+    # Already typed, so never selected; and unparseable, so selected but left alone and counted as skipped
+    await db.payments.insert_one({"_id": "typed", "payee_due_date": datetime(2030, 1, 1, tzinfo=timezone.utc)})
+    await db.payments.insert_one({"_id": "zbad", "payee_due_date": "not a date"})
+    return db.payments
+
+
+@pytest.fixture
+def batches(payments, monkeypatch):
+    """Counts bulk_writes on payments; set fail_at to the write that should fail"""
+    collection_type = type(payments)
+    bulk_write = collection_type.bulk_write
+    state = {"writes": 0, "fail_at": None}
+
+    def counting(self, *args, **kwargs):
+        if self.name == "payments":
+            state["writes"] += 1
+            if state["writes"] == state["fail_at"]:
+                raise AutoReconnect("connection reset")
+        return bulk_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "bulk_write", counting)
+    return state
+
+
+async def test_dates_and_amounts_are_typed(payments, db):
+    assert await run_migrations(MIGRATIONS, batch_size=4) == [1]
+
+    migrated = await payments.find_one({"_id": "p03"})
+    assert migrated["payee_added_date_utc"] == datetime.fromtimestamp(1700000003, timezone.utc)
+    assert migrated["payee_due_date"] == datetime(2030, 1, 1, tzinfo=timezone.utc)
+    assert (migrated["due_amount"], migrated["discount_percent"], migrated["tax_percent"]) == (
+        Decimal("103.1"), Decimal(5), Decimal("10.5")
+    )
+    assert (await payments.find_one({"_id": "zbad"}))["payee_due_date"] == "not a date"
+    state = await db.migrations.find_one({"_id": 1})
+    assert (state["status"], state["migrated"], state["skipped"]) == ("done", 10, 1)
+
+    assert await run_migrations(MIGRATIONS) == []
+
+
+async def test_interrupted_run_resumes_after_its_last_batch(payments, db, batches):
+    batches["fail_at"] = 2
+    with pytest.raises(AutoReconnect):
+        await run_migrations(MIGRATIONS, batch_size=4)
+    state = await db.migrations.find_one({"_id": 1})
+    assert (state["status"], state["last_id"], state["migrated"]) == ("running", "p03", 4)
+
+    batches["fail_at"] = None
+    assert await run_migrations(MIGRATIONS, batch_size=4) == [1]
+    state = await db.migrations.find_one({"_id": 1})
+    assert (state["status"], state["migrated"], state["skipped"]) == ("done", 10, 1)
+    # One failed write, then the remaining six payments in two batches
+    assert batches["writes"] == 4
+
+
+async def test_runner_stops_once_its_lease_is_taken_over(payments, db, batches, monkeypatch):
+    collection_type = type(db.migrations)
+    update_one = collection_type.update_one
+
+    async def take_over_after_first_batch(self, query, update, *args, **kwargs):
+        result = await update_one(self, query, update, *args, **kwargs)
+        if self.name == "migrations" and "last_id" in update.get("$set", {}):
+            await db.locks.update_one({"_id": LOCK_NAME}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+            assert await DistributedLock(LOCK_NAME, owner="other-runner").acquire()
+        return result
+
+    monkeypatch.setattr(collection_type, "update_one", take_over_after_first_batch)
+    with pytest.raises(LockLost):
+        await run_migrations(MIGRATIONS, batch_size=4)
+
+    assert batches["writes"] == 1
+    state = await db.migrations.find_one({"_id": 1})
+    assert (state["status"], state["last_id"]) == ("running", "p03")
+    assert (await db.locks.find_one({"_id": LOCK_NAME}))["owner"] == "other-runner"
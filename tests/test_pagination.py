@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.db.repositories.payment_repository import PaymentRepository
+from app.services.payment_service import PaymentService
+from app.utils.cursor import decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+ADDED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def payment(index: int, **fields) -> dict:
+    return {
+        "_id": f"p{index:03d}",
+        "payee_first_name": "Ada",
+        "payee_last_name": f"Lovelace{index}",
+        "payee_payment_status": "pending",
+        "payee_added_date_utc": ADDED + timedelta(minutes=index // 2),
+        "payee_due_date": ADDED + timedelta(days=30),
+        "payee_email": f"ada{index}@example.com",
+        "currency": "USD",
+        "due_amount": Decimal("100.00"),
+        "discount_percent": Decimal("0"),
+        "tax_percent": Decimal("10"),
+        **fields,
+    }
+
+
+@pytest.fixture
+async def payments(db):
+    # Pairs share an added date, so pages have to break ties on _id
+    await db.payments.insert_many([payment(i) for i in range(25)])
+    await db.payments.insert_one(payment(99, is_deleted=True))
+    PaymentRepository.total_count_cache.clear()
+    yield db.payments
+    PaymentRepository.total_count_cache.clear()
+
+
+@pytest.fixture
+def aggregations(payments, monkeypatch):
+    collection_type = type(payments)
+    aggregate = collection_type.aggregate
+    pipelines = []
+
+    def record(self, pipeline, *args, **kwargs):
+        pipelines.append(pipeline)
+        return aggregate(self, pipeline, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "aggregate", record)
+    return pipelines
+
+
+async def test_first_page_and_total_come_from_one_aggregation(payments, aggregations):
+    page = await PaymentService().get_payments(page=1, page_size=10)
+
+    assert len(aggregations) == 1
+    assert (page["total"], page["total_pages"], page["has_next"]) == (25, 3, True)
+    assert [item["_id"] for item in page["items"]] == [f"p{i:03d}" for i in range(24, 14, -1)]
+
+
+async def test_cached_total_skips_the_aggregation(payments, aggregations):
+    service = PaymentService()
+    await service.get_payments(page=1, page_size=10)
+    page = await service.get_payments(page=2, page_size=10)
+
+    assert len(aggregations) == 1
+    assert page["total"] == 25
+    assert page["items"][0]["_id"] == "p014"
+
+
+async def test_cursor_page_is_a_keyset_seek_without_an_aggregation(payments, aggregations):
+    service = PaymentService()
+    first = await service.get_payments(page=1, page_size=10)
+    PaymentRepository.total_count_cache.clear()
+    aggregations.clear()
+
+    second = await service.get_payments(page_size=10, cursor=first["next_cursor"])
+
+    assert aggregations == []
+    assert second["total"] == 25
+    assert [item["_id"] for item in second["items"]] == [f"p{i:03d}" for i in range(14, 4, -1)]
+
+
+async def test_totals_leave_out_tombstoned_rows(payments):
+    page = await PaymentService().get_payments(page=1, page_size=100)
+
+    assert page["total"] == 25
+    assert "p099" not in {item["_id"] for item in page["items"]}
+
+
+def test_cursor_round_trips_typed_sort_keys():
+    added = datetime(2024, 1, 1, 12, 30, 5, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor(added, "p001")) == (added, "p001")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+async def test_cursor_pages_walk_every_row_once_while_rows_are_inserted(payments):
+    service = PaymentService()
+    seen = []
+    page = await service.get_payments(page=1, page_size=7)
+    while True:
+        seen.extend(item["_id"] for item in page["items"])
+        if not page["next_cursor"]:
+            break
+        # Newer rows land ahead of the cursor and do not shift the pages after it
+        await payments.insert_one(payment(200 + len(seen), payee_added_date_utc=ADDED + timedelta(days=1)))
+        page = await service.get_payments(page_size=7, cursor=page["next_cursor"])
+
+    assert seen == [f"p{i:03d}" for i in range(24, -1, -1)]
+    assert page["has_previous"] and not page["has_next"]
+
+
+async def test_cursor_pages_keep_their_filter(payments):
+    await payments.update_many({"_id": {"$in": ["p003", "p010", "p020"]}}, {"$set": {"payee_payment_status": "overdue"}})
+    service = PaymentService()
+
+    first = await service.get_payments(page_size=2, payee_payment_status="overdue")
+    second = await service.get_payments(page_size=2, payee_payment_status="overdue", cursor=first["next_cursor"])
+
+    assert [item["_id"] for item in first["items"] + second["items"]] == ["p020", "p010", "p003"]
+    assert second["next_cursor"] is None
+
+
+async def test_malformed_cursor_is_a_bad_request(payments, client):
+    response = await client.get("/api/v1/payments", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
@@ -0,0 +1,92 @@
+import pytest
+
+from app.utils.payee_search import (
+    SearchMode,
+    backfill_search_fields,
+    build_search_fields,
+    build_search_query,
+    matches_search,
+)
+
+pytestmark = pytest.mark.anyio
+
+PAYEES = {
+    "ada": ("Ada", "Lovelace", "ada.lovelace@example.com"),
+    "grace": ("Grace", "Hopper", "grace@navy.mil"),
+    "alan": ("Alan", "Turing", "alan+work@example.com"),
+    "dotted": ("J.R.", "O'Neil (Jr)", "jr.oneil@example.org"),
+}
+
+
+@pytest.fixture
+async def payments(db):
+    documents = []
+    for payment_id, (first_name, last_name, email) in PAYEES.items():
+        document = {"_id": payment_id, "payee_first_name": first_name, "payee_last_name": last_name, "payee_email": email}
+        documents.append({**document, **build_search_fields(document)})
+    await db.payments.insert_many(documents)
+    return db.payments
+
+
+async def search(payments, term: str, mode: SearchMode) -> set:
+    found = {payment["_id"] async for payment in payments.find(build_search_query(term, mode))}
+    # The in-memory check used by event streams agrees with the query
+    assert found == {payment_id async for payment_id in in_memory(payments, term, mode)}
+    return found
+
+
+async def in_memory(payments, term, mode):
+    async for payment in payments.find():
+        if matches_search(payment, term, mode):
+            yield payment["_id"]
+
+
+@pytest.mark.parametrize("term, mode, expected", [
+    ("LOVE", SearchMode.SUBSTRING, {"ada"}),
+    ("ace", SearchMode.SUBSTRING, {"ada", "grace"}),
+    ("a", SearchMode.SUBSTRING, {"ada", "grace", "alan", "dotted"}),
+    ("example", SearchMode.SUBSTRING, {"ada", "alan", "dotted"}),
+    ("tur", SearchMode.PREFIX, {"alan"}),
+    ("ring", SearchMode.PREFIX, set()),
+    ("Grace@Navy.mil", SearchMode.EXACT_EMAIL, {"grace"}),
+    ("grace@navy", SearchMode.EXACT_EMAIL, set()),
+    ("   ", SearchMode.SUBSTRING, {"ada", "grace", "alan", "dotted"}),
+])
+async def test_search_modes(payments, term, mode, expected):
+    assert await search(payments, term, mode) == expected
+
+
+def test_fuzzy_match_tolerates_a_typo():
+    # mongomock has no $setIntersection, so the in-memory check stands in for the query
+    ada = {"payee_first_name": "Ada", "payee_last_name": "Lovelace"}
+
+    assert matches_search(ada, "lovelase", SearchMode.FUZZY)
+    assert not matches_search(ada, "hopper", SearchMode.FUZZY)
+    assert build_search_query("lovelase", SearchMode.FUZZY)["search_grams"]["$in"][0] == "as"
+
+
+@pytest.mark.parametrize("term, expected", [
+    # Regex metacharacters in the term match themselves
+    ("j.r", {"dotted"}),
+    ("'neil (jr", {"dotted"}),
+    ("alan+work", {"alan"}),
+    ("a.a", set()),
+    ("(", {"dotted"}),
+    ("*", set()),
+])
+async def test_search_terms_are_matched_literally(payments, term, expected):
+    assert await search(payments, term, SearchMode.SUBSTRING) == expected
+
+
+async def test_prefix_terms_are_matched_literally(payments):
+    assert await search(payments, "alan+", SearchMode.PREFIX) == {"alan"}
+    assert await search(payments, ".*", SearchMode.PREFIX) == set()
+
+
+async def test_backfill_adds_fields_to_older_documents(db):
+    await db.payments.insert_one({"_id": "old", "payee_first_name": "Ada", "payee_last_name": "Lovelace"})
+    await db.payments.insert_one({"_id": "new", "payee_first_name": "Grace", "search_tokens": ["grace"], "search_grams": ["g"]})
+
+    assert await backfill_search_fields(db.payments) == 1
+    assert (await db.payments.find_one({"_id": "old"}))["search_tokens"] == ["ada", "lovelace"]
+    assert await backfill_search_fields(db.payments) == 0
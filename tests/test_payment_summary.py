@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository, UNKNOWN_MONTH, summary_deltas
+from app.models.payment import Payment, to_decimal
+from app.services.payment_service import PaymentService
+
+pytestmark = pytest.mark.anyio
+
+NEXT_MONTH = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=30)
+
+
+def payment_data(**fields) -> dict:
+    return {
+        "payee_first_name": "Ada",
+        "payee_last_name": "Lovelace",
+        "payee_due_date": NEXT_MONTH.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "payee_address_line_1": "1 Main St",
+        "payee_city": "London",
+        "payee_country": "GB",
+        "payee_postal_code": "N1 9GU",
+        "payee_phone_number": "+442071234567",
+        "payee_email": "ada@example.com",
+        "currency": "GBP",
+        "due_amount": 100,
+        "tax_percent": 20,
+        **fields,
+    }
+
+
+async def summary_rows(db) -> dict:
+    return {
+        row["_id"]: (row["count"], to_decimal(row["due_amount"]), to_decimal(row["total_due"]))
+        async for row in db.payment_summary.find({"count": {"$ne": 0}})
+    }
+
+
+async def test_deltas_from_writes_match_a_rebuild(db, summary_in_python):
+    service = PaymentService()
+    first = await service.create_payment(Payment(**payment_data()))
+    second = await service.create_payment(Payment(**payment_data(currency="USD", due_amount=50)))
+    third = await service.create_payment(Payment(**payment_data(discount_percent=10)))
+
+    await service.update_payment(first, {"due_amount": Decimal("250.00")})
+    await service.update_payment(second, {"currency": "EUR"})
+    await service.update_payment(third, {"payee_payment_status": "completed"})
+    await service.delete_payment(second)
+    await service.bulk_apply([
+        {"op": "create", "data": payment_data(currency="USD")},
+        {"op": "update", "id": first, "data": {"tax_percent": 0}},
+        {"op": "update", "id": first, "data": {"due_amount": 10}},
+        {"op": "delete", "id": third},
+    ])
+
+    moved = await summary_rows(db)
+    assert await PaymentSummaryRepository().rebuild() == 2
+    assert moved == await summary_rows(db)
+    month = NEXT_MONTH.strftime("%Y-%m")
+    assert moved == {
+        f"pending|GBP|{month}": (1, Decimal("10"), Decimal("10.00")),
+        f"pending|USD|{month}": (1, Decimal("100"), Decimal("120.00")),
+    }
+
+
+async def test_summary_totals_each_currency(db, client, summary_in_python):
+    service = PaymentService()
+    for fields in ({}, {"due_amount": 30, "payee_payment_status": "completed"}, {"currency": "USD"}):
+        await service.create_payment(Payment(**payment_data(**fields)))
+
+    response = await client.get("/api/v1/payments/summary")
+
+    assert response.status_code == 200
+    totals = {total["currency"]: (total["count"], Decimal(str(total["total_due"]))) for total in response.json()["totals"]}
+    assert totals == {"GBP": (2, Decimal("156.00")), "USD": (1, Decimal("120.00"))}
+    filtered = (await client.get("/api/v1/payments/summary", params={"payee_payment_status": "completed"})).json()
+    assert [(group["status"], group["count"]) for group in filtered["groups"]] == [("completed", 1)]
+
+
+def test_deltas_skip_tombstones_and_cancel_out():
+    payment = {"payee_payment_status": "pending", "currency": "GBP", "payee_due_date": NEXT_MONTH, "due_amount": Decimal("100")}
+
+    # Fields the rollup does not depend on leave it untouched
+    assert summary_deltas(removed=[payment], added=[{**payment, "payee_city": "Paris"}]) == {}
+    assert summary_deltas(removed=[None], added=[{**payment, "is_deleted": True}]) == {}
+    # Due dates not migrated to dates yet are counted under their own month
+    assert summary_deltas(added=[{**payment, "payee_due_date": "2030-01-01"}]) == {
+        ("pending", "GBP", UNKNOWN_MONTH): [1, Decimal("100"), Decimal("100.00")]
+    }
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from app.services.payment_service import PaymentService
+from app.utils.response_cache import CachedResponse, GenerationMarker, ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Source:
+    """A loader over a mutable body that can be held mid-read"""
+
+    def __init__(self, body: bytes = b"v1"):
+        self.body = body
+        self.loads = 0
+        self.gate = None
+        self.reading = asyncio.Event()
+
+    async def __call__(self):
+        self.loads += 1
+        body = self.body
+        self.reading.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        return CachedResponse.from_body(body), ["payment:p1", "payments:list"]
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(ttl_seconds=60)
+
+
+async def test_concurrent_misses_share_one_load(cache):
+    source = Source()
+    source.gate = asyncio.Event()
+    waiting = [asyncio.ensure_future(cache.get_or_load("payment:p1", source)) for _ in range(5)]
+    await asyncio.sleep(0)
+    source.gate.set()
+
+    assert {response.body for response in await asyncio.gather(*waiting)} == {b"v1"}
+    assert source.loads == 1
+    assert (cache.misses, cache.collapsed) == (1, 4)
+    assert (await cache.get_or_load("payment:p1", source)).body == b"v1"
+    assert cache.hits == 1
+
+
+async def test_invalidating_a_tag_drops_the_entries_carrying_it(cache):
+    source = Source()
+    await cache.get_or_load("payments:[1]", source)
+    source.body = b"v2"
+
+    await cache.invalidate(tags=["payment:p1"])
+
+    assert (await cache.get_or_load("payments:[1]", source)).body == b"v2"
+    assert source.loads == 2
+
+
+async def test_reader_after_a_write_does_not_join_a_load_from_before_it(cache):
+    source = Source()
+    source.gate = asyncio.Event()
+    before = asyncio.ensure_future(cache.get_or_load("payment:p1", source))
+    await source.reading.wait()
+
+    # The write lands while the first load is still reading
+    source.body = b"v2"
+    await cache.invalidate(tags=["payment:p1"])
+    after = asyncio.ensure_future(cache.get_or_load("payment:p1", source))
+    await asyncio.sleep(0)
+    source.gate.set()
+
+    assert (await before).body == b"v1"
+    assert (await after).body == b"v2"
+    # Only the load started after the write is kept
+    assert (await cache.get_or_load("payment:p1", source)).body == b"v2"
+    assert source.loads == 2
+
+
+async def test_clear_detaches_loads_in_flight(cache):
+    source = Source()
+    source.gate = asyncio.Event()
+    before = asyncio.ensure_future(cache.get_or_load("payment:p1", source))
+    await source.reading.wait()
+
+    source.body = b"v2"
+    await cache.clear()
+    after = asyncio.ensure_future(cache.get_or_load("payment:p1", source))
+    await asyncio.sleep(0)
+    source.gate.set()
+
+    assert [(await before).body, (await after).body] == [b"v1", b"v2"]
+
+
+async def test_expired_entries_are_reloaded():
+    cache = ResponseCache(ttl_seconds=0.01)
+    source = Source()
+    await cache.get_or_load("payment:p1", source)
+    await asyncio.sleep(0.02)
+    source.body = b"v2"
+
+    assert (await cache.get_or_load("payment:p1", source)).body == b"v2"
+
+
+async def test_generation_bumped_elsewhere_is_seen_once(db):
+    worker = GenerationMarker("payments", check_seconds=0)
+    assert not await worker.changed()
+
+    await GenerationMarker("payments", check_seconds=0).bump()
+
+    assert await worker.changed()
+    assert not await worker.changed()
+
+
+async def test_bulk_change_in_another_process_reaches_cached_responses(db, monkeypatch):
+    monkeypatch.setattr(PaymentService, "response_cache", ResponseCache(ttl_seconds=60))
+    monkeypatch.setattr(PaymentService, "cache_generation", GenerationMarker("payments", check_seconds=0))
+    await db.payments.insert_one({"_id": "p1", "payee_first_name": "Ada"})
+    service = PaymentService()
+    assert b'"Ada"' in (await service.get_payment_response("p1")).body
+
+    # What a CSV load or status refresh does from its own process
+    await db.payments.update_one({"_id": "p1"}, {"$set": {"payee_first_name": "Grace"}})
+    await GenerationMarker("payments", check_seconds=0).bump()
+
+    assert b'"Grace"' in (await service.get_payment_response("p1")).body
@@ -0,0 +1,116 @@
+import os
+import shutil
+import signal
+import socket
+import time
+
+import pytest
+
+from app import server
+from app.core.logging import Logger
+from app.server import BOOT_BACKOFF_SECONDS, MAX_BOOT_BACKOFF_SECONDS, Master, exit_code
+
+
+@pytest.fixture(scope="module", autouse=True)
+def metrics_dir():
+    # Importing app.server gave prometheus_client a directory of its own
+    yield
+    if server.OWN_METRICS_DIR:
+        shutil.rmtree(os.environ.pop("PROMETHEUS_MULTIPROC_DIR"), ignore_errors=True)
+
+
+def fake_worker(app: str, sock: socket.socket, ready_fd: int, max_requests: int) -> int:
+    """Stands in for run_worker in the forked child; `app` names what the worker does"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if app == "broken":
+        os.close(ready_fd)
+        return 3
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+    if app == "crashing":
+        # Long enough for the master to read the ready message before it reaps the exit
+        time.sleep(0.2)
+        return 1
+    while True:
+        time.sleep(1)
+
+
+@pytest.fixture
+def master(monkeypatch):
+    monkeypatch.setattr(server, "run_worker", fake_worker)
+    # The child has no copy of the parent's logging thread to stop
+    monkeypatch.setattr(Logger, "listener", None)
+    masters = []
+
+    def create(app: str, workers: int = 1) -> Master:
+        masters.append(Master(app, socket.socket(), workers))
+        return masters[-1]
+
+    yield create
+    for created in masters:
+        created.stop()
+        for fd in (created.signal_read, created.signal_write):
+            os.close(fd)
+        created.sock.close()
+
+
+def run_until(master: Master, done, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < deadline, "timed out"
+        master.spawn_missing()
+        master.wait(0.05)
+
+
+def test_exit_code_reports_exits_and_signals():
+    for exit_with, expected in ((lambda: os._exit(3), 3), (lambda: os.kill(os.getpid(), signal.SIGKILL), -signal.SIGKILL)):
+        pid = os.fork()
+        if pid == 0:
+            exit_with()
+            os._exit(0)
+        assert exit_code(os.waitpid(pid, 0)[1]) == expected
+
+
+def test_worker_that_fails_to_start_is_retried_with_growing_backoff(master):
+    broken = master("broken")
+
+    delays = []
+    for _ in range(3):
+        worker = broken.spawn()
+        run_until(broken, lambda: worker.pid not in broken.workers)
+        delays.append(broken.boot_backoff)
+        # No replacement until the backoff has passed
+        broken.spawn_missing()
+        assert broken.workers == {}
+        broken.next_spawn_at = 0.0
+
+    assert delays == [BOOT_BACKOFF_SECONDS, 2 * BOOT_BACKOFF_SECONDS, 4 * BOOT_BACKOFF_SECONDS]
+    broken.boot_backoff = MAX_BOOT_BACKOFF_SECONDS
+    worker = broken.spawn()
+    run_until(broken, lambda: worker.pid not in broken.workers)
+    assert broken.boot_backoff == MAX_BOOT_BACKOFF_SECONDS
+
+
+def test_worker_that_exits_after_starting_is_replaced_at_once(master):
+    crashing = master("crashing")
+    crashing.boot_backoff = 4.0
+    first = crashing.spawn()
+
+    run_until(crashing, lambda: crashing.workers and first.pid not in crashing.workers)
+
+    # Being ready cleared the backoff, so the replacement was started straight away
+    assert crashing.boot_backoff == 0.0
+    assert len(crashing.workers) == 1
+
+
+def test_stop_waits_for_every_worker(master):
+    serving = master("serving", workers=2)
+    run_until(serving, lambda: len(serving.workers) == 2 and all(worker.ready for worker in serving.workers.values()))
+    pids = list(serving.workers)
+
+    serving.stop()
+
+    assert serving.workers == {} and serving.retiring == {}
+    for pid in pids:
+        with pytest.raises(ChildProcessError):
+            os.waitpid(pid, os.WNOHANG)
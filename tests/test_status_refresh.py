@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.db.locks import DistributedLock, LockLost
+from app.db.repositories.payment_summary_repository import PaymentSummaryRepository
+from app.jobs.status_refresh import LOCK_NAME, run_status_refresh
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2024, 6, 15, 12, tzinfo=timezone.utc)
+
+
+def payment(payment_id: str, status: str, due_in_days: int) -> dict:
+    return {
+        "_id": payment_id,
+        "payee_payment_status": status,
+        "payee_due_date": NOW + timedelta(days=due_in_days),
+        "currency": "USD",
+        "due_amount": Decimal("100.00"),
+        "discount_percent": Decimal("0"),
+        "tax_percent": Decimal("10"),
+    }
+
+
+@pytest.fixture
+async def payments(db, summary_in_python):
+    await db.payments.insert_many([
+        payment("late", "pending", -3),
+        payment("today", "overdue", 0),
+        payment("later", "due_now", 20),
+        payment("paid", "completed", -3),
+        payment("open", "pending", 20),
+    ])
+    await PaymentSummaryRepository().rebuild()
+    return db.payments
+
+
+async def stored_statuses(payments) -> dict:
+    return {payment["_id"]: payment["payee_payment_status"] async for payment in payments.find()}
+
+
+async def summary_rows(db) -> dict:
+    return {row["_id"]: (row["count"], row["total_due"]) async for row in db.payment_summary.find({"count": {"$ne": 0}})}
+
+
+async def test_refresh_moves_payments_and_is_idempotent(payments, db):
+    assert await run_status_refresh(NOW) == {"overdue": 1, "due_now": 1, "pending": 1}
+    assert await stored_statuses(payments) == {
+        "late": "overdue", "today": "due_now", "later": "pending", "paid": "completed", "open": "pending"
+    }
+    # The rollup was moved by deltas and agrees with one rebuilt from scratch
+    moved = await summary_rows(db)
+    await PaymentSummaryRepository().rebuild()
+    assert moved == await summary_rows(db)
+
+    assert await run_status_refresh(NOW) == {"overdue": 0, "due_now": 0, "pending": 0}
+    assert await summary_rows(db) == moved
+
+
+async def test_refresh_skips_while_another_worker_holds_the_lock(payments):
+    before = await stored_statuses(payments)
+    assert await DistributedLock(LOCK_NAME, owner="other-worker").acquire()
+
+    assert await run_status_refresh(NOW) is None
+    assert await stored_statuses(payments) == before
+
+
+async def test_refresh_stops_once_its_lease_is_taken_over(payments, db, monkeypatch):
+    collection_type = type(payments)
+    update_many = collection_type.update_many
+
+    async def slow_update_many(self, *args, **kwargs):
+        result = await update_many(self, *args, **kwargs)
+        if self.name == "payments":
+            # The lease runs out during the first pass and another worker takes the lock
+            await db.locks.update_one({"_id": LOCK_NAME}, {"$set": {"expires_at": NOW - timedelta(days=1)}})
+            assert await DistributedLock(LOCK_NAME, owner="other-worker").acquire()
+        return result
+
+    monkeypatch.setattr(collection_type, "update_many", slow_update_many)
+    with pytest.raises(LockLost):
+        await run_status_refresh(NOW)
+
+    # Only the pass made under the lease was applied, to the payments and to the rollup
+    assert await stored_statuses(payments) == {
+        "late": "overdue", "today": "overdue", "later": "due_now", "paid": "completed", "open": "pending"
+    }
+    moved = await summary_rows(db)
+    await PaymentSummaryRepository().rebuild()
+    assert moved == await summary_rows(db)
+    assert (await db.locks.find_one({"_id": LOCK_NAME}))["owner"] == "other-worker"
@@ -0,0 +1,161 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from pymongo.errors import BulkWriteError, WriteError
+
+from app.db.repositories.payment_summary_repository import summary_deltas
+from app.db.repositories.update_coalescer import COALESCED_CONFLICTS, UpdateCoalescer
+
+pytestmark = pytest.mark.anyio
+
+
+def payment(payment_id: str, **fields) -> dict:
+    return {
+        "_id": payment_id,
+        "payee_first_name": "Ada",
+        "payee_last_name": "Lovelace",
+        "payee_payment_status": "pending",
+        "payee_email": "ada@example.com",
+        "currency": "USD",
+        "due_amount": Decimal("100.00"),
+        "discount_percent": Decimal("0"),
+        "tax_percent": Decimal("10"),
+        **fields,
+    }
+
+
+def net(deltas: list) -> dict:
+    total = {}
+    for delta in deltas:
+        for key, values in delta.items():
+            row = total.setdefault(key, [0, Decimal(0), Decimal(0)])
+            for index, value in enumerate(values):
+                row[index] += value
+    return {key: row for key, row in total.items() if any(row)}
+
+
+@pytest.fixture
+async def payments(db):
+    await db.payments.insert_many([payment("p1"), payment("p2")])
+    return db.payments
+
+
+@pytest.fixture
+def coalescer():
+    return UpdateCoalescer(window_seconds=0.005, max_batch=100)
+
+
+def patch_bulk_write(monkeypatch, collection, before_write):
+    """Run before_write(operations) ahead of each bulk_write, e.g. to race it with another writer"""
+    collection_type = type(collection)
+    bulk_write = collection_type.bulk_write
+
+    async def patched(self, operations, *args, **kwargs):
+        return await before_write(lambda ops: bulk_write(self, ops, *args, **kwargs), operations)
+
+    monkeypatch.setattr(collection_type, "bulk_write", patched)
+
+
+async def test_updates_to_one_payment_are_merged_into_one_write(payments, coalescer, monkeypatch):
+    writes = []
+
+    async def count(write, operations):
+        writes.append(len(operations))
+        return await write(operations)
+
+    patch_bulk_write(monkeypatch, payments, count)
+    results = await asyncio.gather(
+        coalescer.update("p1", {"payee_city": "London"}),
+        coalescer.update("p1", {"due_amount": Decimal("150.00")}),
+        coalescer.update("p2", {"payee_payment_status": "completed"}),
+    )
+
+    assert writes == [2]
+    stored = await payments.find_one({"_id": "p1"})
+    assert stored["payee_city"] == "London"
+    assert stored["due_amount"] == Decimal("150.00")
+    # Each caller sees the document as it stood before its own update
+    assert "payee_city" not in results[0]
+    assert results[1]["payee_city"] == "London"
+    assert results[1]["due_amount"] == Decimal("100.00")
+    assert results[2]["payee_payment_status"] == "pending"
+
+
+async def test_pre_images_sum_to_the_net_change(payments, coalescer):
+    original = await payments.find_one({"_id": "p1"})
+    updates = [
+        {"due_amount": Decimal("150.00")},
+        {"payee_payment_status": "overdue"},
+        {"due_amount": Decimal("80.00"), "currency": "EUR"},
+    ]
+    previous = await asyncio.gather(*(coalescer.update("p1", update) for update in updates))
+    final = await payments.find_one({"_id": "p1"})
+
+    # What PaymentService applies to the summary per caller adds up to the whole change
+    per_caller = [summary_deltas([before], [{**before, **update}]) for before, update in zip(previous, updates)]
+    assert net(per_caller) == summary_deltas([original], [final])
+
+
+async def test_missing_payment_resolves_to_none_without_a_write(payments, coalescer, monkeypatch):
+    writes = []
+
+    async def count(write, operations):
+        writes.append(len(operations))
+        return await write(operations)
+
+    patch_bulk_write(monkeypatch, payments, count)
+    await payments.update_one({"_id": "p2"}, {"$set": {"is_deleted": True}})
+
+    assert await asyncio.gather(
+        coalescer.update("nope", {"payee_city": "London"}),
+        coalescer.update("p2", {"payee_city": "London"}),
+    ) == [None, None]
+    assert writes == []
+
+
+async def test_guard_miss_replays_updates_one_by_one(payments, coalescer, monkeypatch):
+    async def race(write, operations):
+        # Another writer changes a guarded field between the flush's read and its write
+        await payments.update_one({"_id": "p1"}, {"$set": {"due_amount": Decimal("120.00")}})
+        return await write(operations)
+
+    patch_bulk_write(monkeypatch, payments, race)
+    conflicts = COALESCED_CONFLICTS._value.get()
+    first, second = await asyncio.gather(
+        coalescer.update("p1", {"payee_city": "London"}),
+        coalescer.update("p1", {"payee_payment_status": "completed"}),
+    )
+
+    assert COALESCED_CONFLICTS._value.get() == conflicts + 1
+    # The replayed updates applied on top of the other writer's, and their pre-images show it
+    assert first["due_amount"] == Decimal("120.00")
+    assert "payee_city" not in first
+    assert second["payee_city"] == "London"
+    assert second["payee_payment_status"] == "pending"
+    stored = await payments.find_one({"_id": "p1"})
+    assert (stored["due_amount"], stored["payee_city"], stored["payee_payment_status"]) == (
+        Decimal("120.00"), "London", "completed"
+    )
+
+
+async def test_partial_bulk_write_error_fails_only_that_payment(payments, coalescer, monkeypatch):
+    async def fail_first(write, operations):
+        await write(operations[1:])
+        raise BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 121, "errmsg": "Document failed validation"}],
+            "nMatched": len(operations) - 1,
+        })
+
+    patch_bulk_write(monkeypatch, payments, fail_first)
+    results = await asyncio.gather(
+        coalescer.update("p1", {"payee_city": "London"}),
+        coalescer.update("p2", {"payee_city": "Paris"}),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], WriteError)
+    assert results[0].code == 121
+    assert results[1]["_id"] == "p2"
+    assert "payee_city" not in (await payments.find_one({"_id": "p1"}))
+    assert (await payments.find_one({"_id": "p2"}))["payee_city"] == "Paris"